@@ -1,55 +1,159 @@
+import logging
+import random
+import threading
 import time
+from urllib.parse import urlparse
 from DrissionPage import ChromiumPage
+from fetch.readiness import PageReadiness
+from report.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Checks the title and DOM markers that only Cloudflare interstitials have, in a single round trip
+CHALLENGE_CHECK_JS = """
+return document.title.toLowerCase().includes('just a moment')
+    || !!document.querySelector('#challenge-form, #challenge-running, #challenge-stage, #cf-challenge-running')
+    || typeof window._cf_chl_opt !== 'undefined';
+"""
+
+TURNSTILE_INPUT = 'css:input[type="hidden"][name*="turnstile"]'
+
+# Locator path of the verification button that worked last, per domain.
+# Either ('turnstile',) or ('shadow', path to the iframe host, path to the input in the iframe body).
+locator_paths = {}
+
+class BypassStats:
+    """Thread-safe count of the challenges met and the time spent solving them, per domain."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._domains = {}
+
+    def record(self, domain, attempts, solved, elapsed, cached_path_hits):
+        with self._lock:
+            stats = self._domains.setdefault(domain, {
+                'challenges': 0, 'solved': 0, 'attempts': 0, 'solve_time': 0.0, 'max_solve_time': 0.0,
+                'cached_path_hits': 0,
+            })
+            stats['challenges'] += 1
+            stats['solved'] += int(solved)
+            stats['attempts'] += attempts
+            stats['solve_time'] += elapsed
+            stats['max_solve_time'] = max(stats['max_solve_time'], elapsed)
+            stats['cached_path_hits'] += cached_path_hits
+
+    def summary(self):
+        with self._lock:
+            return {domain: dict(stats) for domain, stats in self._domains.items()}
+
+    def log_summary(self):
+        for domain, stats in sorted(self.summary().items()):
+            logger.info(f"Cloudflare on {domain}: {stats['challenges']} challenges, {stats['solved']} solved in "
+                        f"{stats['attempts']} attempts, {stats['solve_time']:.1f}s total "
+                        f"(max {stats['max_solve_time']:.1f}s), {stats['cached_path_hits']} cached button lookups")
+
+bypass_stats = BypassStats()
 
 class CloudflareBypasser:
-    def __init__(self, driver: ChromiumPage, max_retries=-1, log=True):
+    def __init__(self, driver: ChromiumPage, max_retries=-1, log=True, base_backoff=2, max_backoff=16):
         self.driver = driver
         self.max_retries = max_retries
         self.log = log
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.readiness = PageReadiness(driver)
+        self._cached_path_hits = 0
+
+    def _domain(self):
+        try:
+            return urlparse(self.driver.url).netloc or 'unknown'
+        except Exception:
+            return 'unknown'
 
-    def search_recursively_shadow_root_with_iframe(self,ele):
+    def _search_shadow_iframe(self, ele, path):
         if ele.shadow_root:
             if ele.shadow_root.child().tag == "iframe":
-                return ele.shadow_root.child()
+                return ele.shadow_root.child(), path
         else:
-            for child in ele.children():
-                result = self.search_recursively_shadow_root_with_iframe(child)
+            for index, child in enumerate(ele.children()):
+                result = self._search_shadow_iframe(child, path + [index])
                 if result:
                     return result
         return None
 
-    def search_recursively_shadow_root_with_cf_input(self,ele):
+    def _search_shadow_input(self, ele, path):
         if ele.shadow_root:
             if ele.shadow_root.ele("tag:input"):
-                return ele.shadow_root.ele("tag:input")
+                return ele.shadow_root.ele("tag:input"), path
         else:
-            for child in ele.children():
-                result = self.search_recursively_shadow_root_with_cf_input(child)
+            for index, child in enumerate(ele.children()):
+                result = self._search_shadow_input(child, path + [index])
                 if result:
                     return result
         return None
-    
+
+    def search_recursively_shadow_root_with_iframe(self, ele):
+        result = self._search_shadow_iframe(ele, [])
+        return result[0] if result else None
+
+    def search_recursively_shadow_root_with_cf_input(self, ele):
+        result = self._search_shadow_input(ele, [])
+        return result[0] if result else None
+
+    @staticmethod
+    def _follow_path(ele, path):
+        for index in path:
+            ele = ele.children()[index]
+        return ele
+
+    def _locate_turnstile_button(self):
+        turnstile = self.driver.ele(TURNSTILE_INPUT, timeout=0)
+        if turnstile:
+            return turnstile.parent().shadow_root.child()("tag:body").shadow_root("tag:input")
+        return None
+
+    def _locate_with_cached_path(self, cached):
+        if cached[0] == 'turnstile':
+            return self._locate_turnstile_button()
+        _, host_path, input_path = cached
+        host = self._follow_path(self.driver.ele("tag:body"), host_path)
+        iframe = host.shadow_root.child()
+        return self._follow_path(iframe("tag:body"), input_path).shadow_root.ele("tag:input")
+
     def locate_cf_button(self):
-        button = None
-        eles = self.driver.eles("tag:input")
-        for ele in eles:
-            if "name" in ele.attrs.keys() and "type" in ele.attrs.keys():
-                if "turnstile" in ele.attrs["name"] and ele.attrs["type"] == "hidden":
-                    button = ele.parent().shadow_root.child()("tag:body").shadow_root("tag:input")
-                    break
-            
+        domain = self._domain()
+        cached = locator_paths.get(domain)
+        if cached:
+            try:
+                button = self._locate_with_cached_path(cached)
+                if button:
+                    self._cached_path_hits += 1
+                    return button
+            except Exception:
+                pass
+            self.log_message("Cached button path failed. Searching again.")
+            locator_paths.pop(domain, None)
+
+        button = self._locate_turnstile_button()
         if button:
+            locator_paths[domain] = ('turnstile',)
             return button
-        else:
-            # If the button is not found, search it recursively
-            self.log_message("Basic search failed. Searching for button recursively.")
-            ele = self.driver.ele("tag:body")
-            iframe = self.search_recursively_shadow_root_with_iframe(ele)
-            if iframe:
-                button = self.search_recursively_shadow_root_with_cf_input(iframe("tag:body"))
-            else:
-                self.log_message("Iframe not found. Button search failed.")
-            return button
+
+        # If the button is not found, search it recursively
+        self.log_message("Basic search failed. Searching for button recursively.")
+        ele = self.driver.ele("tag:body")
+        found_iframe = self._search_shadow_iframe(ele, [])
+        if not found_iframe:
+            self.log_message("Iframe not found. Button search failed.")
+            return None
+
+        iframe, host_path = found_iframe
+        found_input = self._search_shadow_input(iframe("tag:body"), [])
+        if not found_input:
+            return None
+        button, input_path = found_input
+        locator_paths[domain] = ('shadow', host_path, input_path)
+        return button
 
     def log_message(self, message):
         if self.log:
@@ -67,16 +171,34 @@ class CloudflareBypasser:
         except Exception as e:
             self.log_message(f"Error clicking verification button: {e}")
 
+    def is_challenge_page(self):
+        try:
+            return bool(self.driver.run_js(CHALLENGE_CHECK_JS))
+        except Exception:
+            # The document can be replaced mid-check while the challenge redirects, fall back to the title
+            return "just a moment" in self.driver.title.lower()
+
     def is_bypassed(self):
         try:
-            title = self.driver.title.lower()
-            return "just a moment" not in title
+            return not self.is_challenge_page()
         except Exception as e:
             self.log_message(f"Error checking page title: {e}")
             return False
 
+    def backoff_delay(self, attempt):
+        """Exponential backoff with jitter, so parallel tabs do not retry in lockstep."""
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
     def bypass(self):
-        
+        started = time.perf_counter()
+        if self.is_bypassed():
+            metrics.record('cloudflare', self._domain(), time.perf_counter() - started)
+            self.log_message("\nBypass successful.")
+            return
+
+        domain = self._domain()
+        self._cached_path_hits = 0
         try_count = 0
 
         while not self.is_bypassed():
@@ -88,9 +210,15 @@ class CloudflareBypasser:
             self.click_verification_button()
 
             try_count += 1
-            time.sleep(2)
+            # Move on as soon as the challenge clears, or click again once the backoff delay runs out
+            self.readiness.until('challenge', self.is_bypassed, timeout=self.backoff_delay(try_count))
 
-        if self.is_bypassed():
+        solved = self.is_bypassed()
+        elapsed = time.perf_counter() - started
+        bypass_stats.record(domain, try_count, solved, elapsed, self._cached_path_hits)
+        metrics.record('cloudflare', domain, elapsed)
+        metrics.count('cloudflare_retries', domain, max(0, try_count - 1))
+        if solved:
             self.log_message("\nBypass successful.")
         else:
             self.log_message("\nBypass failed.")
@@ -1,45 +1,111 @@
 import os
 import sys
 import logging
-from DrissionPage import ChromiumPage
-from bs4 import BeautifulSoup
 import re
 from tqdm import tqdm
-from urllib.parse import urlparse, unquote
-from CloudflareBypasser import CloudflareBypasser
+from urllib.parse import urlparse
+from CloudflareBypasser import CloudflareBypasser, bypass_stats
 from source.translation_site import PenguinSquadSite, GenesistudioSite, ReadingPiaSite
 from source.penguin_squad_site import PaywallException
-from source.NU_getchapterlink import NovelUpdatesChapterRetriever
+from source.NU_getchapterlink import NovelUpdatesChapterRetriever, parse_novel_info, parse_post_id
 from cache.novel_cache import NovelCache
+from fetch.tab_pool import TabPool
+from fetch.browser_session import BrowserSession
+from fetch.readiness import set_default_timeouts, wait_stats
+from report.metrics import build_report, host_of, metrics, write_json_report, write_prometheus_textfile
+from batch.jobs import defaults_from_args, downloader_options, load_job_file, JobFileError, SITES
+from batch.scheduler import BatchScheduler
+from batch.watch import Watcher
+from cache.watch_state import WatchState
+from export.epub_book import build_epub_book
+from export.epub_stream import StreamingEpubWriter, chapter_file_name, with_placeholders
+from export.epub_update import AppendingEpubWriter, EpubUpdateError
+from replay.server import StandInServer, StandInError
+from fetch.assets import AssetFetcher
+from export.inline_images import DEFAULT_IMAGE_BUDGET, ImageStage
+from export.volumes import build_volumes, plan_volumes, volume_file_name, volume_title
+from export.images import DEFAULT_COVER_SIZE, DEFAULT_QUALITY, extension_for, fit_image, parse_size
 from ebooklib import epub
-import io
+import argparse
+import cProfile
+import pstats
+from functools import partial
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class NovelDownloader:
-    def __init__(self):
-        self.page = ChromiumPage()
+    def __init__(self, concurrency=1, http_fast_path=True, stream_epub=False, incremental_epub=False,
+                 parse_workers=None, lean=False, headless=False, chapter_list_ttl=3600, allow_missing=False,
+                 session=None, page=None, proxy=None, cover_size=DEFAULT_COVER_SIZE, image_quality=DEFAULT_QUALITY,
+                 image_workers=8, image_budget=DEFAULT_IMAGE_BUDGET, volume_chapters=None, volume_bytes=None,
+                 volume_workers=None):
+        """
+        :param allow_missing: export the novel with placeholders for chapters that failed to download,
+                              instead of refusing to export it
+        :param session: BrowserSession shared with other downloaders, as in batch mode. When omitted the
+                        downloader starts its own browser with http_fast_path, parse_workers, lean and headless.
+        :param page: tab of the session's browser to work in, defaults to its first tab
+        :param proxy: URL of a replay.server stand-in the browser started here goes through
+        :param cover_size: (width, height) the cover is downscaled to fit in, None keeps its size
+        :param image_quality: JPEG quality of recompressed images
+        :param image_workers: number of chapter images fetched at once while the EPUB is written,
+                              0 leaves chapter images as remote links
+        :param image_budget: size in bytes chapter images are recompressed to fit in
+        :param volume_chapters: split the novel into volumes of at most this many chapters
+        :param volume_bytes: split the novel into volumes of at most this many bytes of chapter text
+        :param volume_workers: processes building volumes at once, defaults to the number of cores
+        """
+        self.concurrency = max(1, concurrency)
+        self.session = session or BrowserSession(http_fast_path=http_fast_path, parse_workers=parse_workers,
+                                                 lean=lean, headless=headless, pool_size=max(10, self.concurrency),
+                                                 proxy=proxy)
+        self.page = page or self.session.browser
+        self.lean_profile = self.session.lean_profile
+        # Incremental updates work on books written by the streaming exporter
+        self.stream_epub = stream_epub or incremental_epub
+        self.incremental_epub = incremental_epub
         self.cf_bypasser = CloudflareBypasser(self.page)
+        self.http_session = self.session.http_session
+        self.fetch_engine = self.session.fetch_engine
+        self.postprocessor = self.session.postprocessor
         self.novel_info = {}
         self.novel_content = []
         self.total_chapters = 0
         self.cache = None
+        self.chapter_list_ttl = chapter_list_ttl
+        self.allow_missing = allow_missing
+        self.nu_post_id = None
         self.nu_retriever = NovelUpdatesChapterRetriever(self.page, self.cf_bypasser)
+        self.cover_size = cover_size
+        self.image_quality = image_quality
+        self.image_workers = image_workers
+        self.image_budget = image_budget
+        self.volume_chapters = volume_chapters
+        self.volume_bytes = volume_bytes
+        self.volume_workers = volume_workers
+        self.assets = None
 
     def login_to_novelupdates(self):
-        logger.info("Attempting to log in to NovelUpdates")
-        if self.nu_retriever.login():
-            logger.info("Successfully logged in to NovelUpdates")
-            return True
-        else:
-            logger.error("Failed to log in to NovelUpdates")
-            return False
+        # The login cookies are shared by every tab, so a session logs in only once
+        with self.session.login_lock:
+            if self.session.nu_logged_in:
+                self.nu_retriever.logged_in = True
+                return True
+            logger.info("Attempting to log in to NovelUpdates")
+            if self.nu_retriever.login():
+                logger.info("Successfully logged in to NovelUpdates")
+                self.session.nu_logged_in = True
+                return True
+            else:
+                logger.error("Failed to log in to NovelUpdates")
+                return False
 
     def get_novel_info(self, novelupdates_url):
         logger.info(f"Retrieving novel information from {novelupdates_url}")
-        self.page.get(novelupdates_url)
+        with metrics.span('navigation', host_of(novelupdates_url)):
+            self.page.get(novelupdates_url)
         self.cf_bypasser.bypass()
         html_content = self.page.html
         
@@ -47,58 +113,203 @@ class NovelDownloader:
             logger.error("Failed to retrieve novel information. Exiting.")
             sys.exit(1)
         
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
         try:
-            self.novel_info['title'] = soup.find('meta', property='og:title')['content']
-            self.novel_info['cover'] = soup.find('meta', property='og:image')['content']
-            self.novel_info['author'] = soup.find('a', id='authtag').text
-            self.novel_info['type'] = soup.find('a', class_='genre type').text
-            
-            associated_names = soup.find('div', id='editassociated').text.split('<br>')
-            self.novel_info['associated_names'] = [name.strip() for name in associated_names if name.strip()]
-            
-            self.novel_info['genre'] = ', '.join([tag.text.strip() for tag in soup.find('div', {'id': 'seriesgenre'}).find_all('a', {'class': 'genre'})])
-            self.novel_info['tags'] = ', '.join([tag.text.strip() for tag in soup.find('div', {'id': 'showtags'}).find_all('a', {'class': 'genre'})])
-            self.novel_info['description'] = soup.find('meta', property='og:description')['content']
-            
+            self.novel_info.update(parse_novel_info(html_content))
+            self.nu_post_id = parse_post_id(html_content)
             logger.info(f"Successfully retrieved information for novel: {self.novel_info['title']}")
         except Exception as e:
             logger.error(f"Error parsing novel information: {str(e)}")
             sys.exit(1)
 
-        self.cache = NovelCache(self.novel_info['title'])
+        self.cache = NovelCache(self.novel_info['title'], series_id=self.nu_post_id)
         self.cache.cache_novel_info(self.novel_info)
 
+    def load_cached_novel_info(self, title, post_id=None):
+        """
+        Reads the information of a novel downloaded before from its cache instead of its series page.
+        Returns False if the novel is not cached.
+        """
+        if not title:
+            return False
+        cache = NovelCache(title, series_id=post_id)
+        novel_info = cache.get_novel_info()
+        if not novel_info.get('title'):
+            cache.close()
+            return False
+        self.cache = cache
+        self.novel_info.update(novel_info)
+        self.nu_post_id = post_id
+        return True
+
+    def _get_chapter_links(self, source_url, fetch_links):
+        """
+        Returns the chapter list read from source_url, from the cache while it is younger than
+        chapter_list_ttl seconds, and otherwise from fetch_links(source_url).
+        """
+        chapter_links = self.cache.get_chapter_list(source_url, self.chapter_list_ttl)
+        if chapter_links is not None:
+            logger.info(f"Using the cached chapter list of {source_url} ({len(chapter_links)} chapters)")
+            return chapter_links
+
+        logger.info(f"Retrieving chapter links from {source_url}")
+        chapter_links = fetch_links(source_url)
+        if chapter_links:
+            new_chapters = self.cache.cache_chapter_list(source_url, chapter_links)
+            logger.info(f"{new_chapters} chapters were added since the chapter list was last retrieved")
+        return chapter_links
+
+    def _resolve_redirects(self, chapter_links):
+        """
+        Returns {link: final URL} for the redirect links in chapter_links. Redirects come from
+        the cache, and the others are resolved in parallel over the HTTP fast path, without
+        loading any page. Links left out are followed in the browser and recorded then.
+        """
+        redirects = self.cache.get_redirects(chapter_links)
+        pending = [link for link in chapter_links if link not in redirects]
+        if pending and self.http_session:
+            self.http_session.harvest(self.page)
+            logger.info(f"Resolving {len(pending)} chapter redirects")
+            resolved = self.http_session.resolve_redirects(pending, workers=max(4, self.concurrency))
+            self.cache.cache_redirects(resolved.items())
+            redirects.update(resolved)
+        logger.info(f"{len(redirects)} of {len(chapter_links)} chapters go straight to the translator page")
+        return redirects
+
+    def check_for_new_chapters(self, translation_site, novelupdates_url, translation_site_url=None, known=None):
+        """
+        Checks whether chapters were released since the last check, using the cheapest signal available.
+        The chapter list page of the translator is first probed with a conditional HEAD request, and when
+        the server says it has not been modified nothing else is requested. Otherwise the chapter list is
+        fetched, cached for the download that follows, and compared with the known size and newest link.
+        :param known: what the previous check observed, see cache.watch_state
+        Returns what this check observed, with 'changed' telling whether there is anything to download.
+        """
+        known = known or {}
+        observed = {'title': self.novel_info['title'], 'post_id': self.nu_post_id}
+        if translation_site == 'Genesistudio':
+            source_url = novelupdates_url
+            if not self.login_to_novelupdates():
+                raise Exception("Failed to log in to NovelUpdates")
+            genesistudio = GenesistudioSite(self.page, self.cf_bypasser, self.nu_retriever)
+            fetch_links = lambda url: genesistudio.get_chapter_links(url, self.nu_post_id)
+        else:
+            source_url = translation_site_url
+            site_class = PenguinSquadSite if translation_site == 'PenguinSquad' else ReadingPiaSite
+            fetch_links = site_class(self.page, self.cf_bypasser, http_session=self.http_session,
+                                     fetch_engine=self.fetch_engine).get_chapter_links
+            if self.http_session:
+                if not self.http_session.ready:
+                    self.http_session.harvest(self.page)
+                probe = self.http_session.probe(source_url, known.get('etag'), known.get('last_modified'))
+                if probe:
+                    modified, observed['etag'], observed['last_modified'] = probe
+                    if not modified and known.get('chapter_count') is not None:
+                        logger.info(f"Chapter list of '{self.novel_info['title']}' not modified since the last check")
+                        return dict(observed, changed=False)
+
+        chapter_links = fetch_links(source_url)
+        if not chapter_links:
+            raise Exception(f"No chapters found at {source_url}")
+        new_chapters = self.cache.cache_chapter_list(source_url, chapter_links)
+        changed = len(chapter_links) != known.get('chapter_count') or chapter_links[-1] != known.get('last_link')
+        if changed:
+            logger.info(f"'{self.novel_info['title']}' has {new_chapters} new chapters ({len(chapter_links)} in total)")
+        observed.update(chapter_count=len(chapter_links), last_link=chapter_links[-1], changed=changed)
+        return observed
+
     def check_cache(self):
-        cached_chapters = self.cache.get_all_cached_chapters()
+        cached_chapters = self.cache.count_cached_chapters()
         if cached_chapters:
-            logger.info(f"Found {len(cached_chapters)} cached chapters for '{self.novel_info['title']}'")
+            logger.info(f"Found {cached_chapters} cached chapters for '{self.novel_info['title']}'")
             return True
         return False
 
+    def _download_chapters(self, site_class, chapter_links, finish_chapter, use_cache=False, skip_failed=True):
+        """
+        Downloads chapter_links over a pool of browser tabs and appends them to novel_content in order,
+        as (title, content, url) so relative image links can be resolved at export.
+        Tabs only fetch the raw pages; parsing and cleanup run in the post-processing pool, so a tab is
+        free for the next chapter as soon as its page has loaded.
+        Progress is kept in the work queue of the cache, so a download that dies is resumed where it stopped.
+        finish_chapter(i, title, content) returns the (title, content) to keep, or None if the chapter failed.
+        With skip_failed, a chapter that fails to download or parse is recorded as failed and the download
+        goes on, otherwise the error stops the download. A PaywallException stops the download at the
+        chapter that raised it.
+        """
+        to_fetch = self.cache.start_work(chapter_links, refetch=not use_cache)
+        fetch_positions = {i for i, link in to_fetch}
+
+        def fetch(site, item):
+            i, link = item
+            self.cache.mark_in_flight(link)
+            try:
+                html = site.fetch_chapter_html(link)
+            except Exception as e:
+                self.cache.mark_failed(link, e)
+                if not skip_failed:
+                    raise
+                logger.warning(f"Error downloading chapter {i+1}: {str(e)}")
+                return None
+            if not html:
+                self.cache.mark_failed(link, "empty page")
+                return None
+            return self.postprocessor.submit(site.parse_chapter_html, html, host_of(link))
+
+        with TabPool(self.page, self.cf_bypasser, self.concurrency, site_class, setup=self.session.setup_tab,
+                     browser=self.session.browser) as pool:
+            fetched = pool.map(fetch, to_fetch)
+            try:
+                for i, link in enumerate(tqdm(chapter_links, desc="Downloading chapters", unit="chapter")):
+                    if i not in fetch_positions:
+                        chapter = self.cache.get_cached_chapter(link)
+                    else:
+                        chapter = None
+                        try:
+                            parsed = next(fetched)
+                            if parsed:
+                                chapter = finish_chapter(i, *parsed.result())
+                                if not chapter:
+                                    self.cache.mark_failed(link, "no chapter content")
+                        except PaywallException as e:
+                            logger.warning(f"{str(e)}")
+                            self.total_chapters = i
+                            break
+                        except Exception as e:
+                            self.cache.mark_failed(link, e)
+                            if not skip_failed:
+                                raise
+                            logger.warning(f"Error downloading chapter {i+1}: {str(e)}")
+                        if chapter:
+                            self.cache.queue_chapter(link, i, *chapter)
+                        else:
+                            # Keep the version cached by an earlier download, if there is one
+                            chapter = self.cache.get_cached_chapter(link)
+                            if not chapter and not self.stream_epub:
+                                chapter = placeholder_chapter(i)
+
+                    # Streaming export reads chapters back from the cache, so they are not kept in memory
+                    if chapter and not self.stream_epub:
+                        self.novel_content.append((*chapter, link))
+            finally:
+                self.cache.flush()
+
+        summary = self.cache.work_summary()
+        if summary.get('failed') or summary.get('pending') or summary.get('in_flight'):
+            logger.warning(f"Download left chapters unfinished: {summary}")
+
     def download_novel_penguin_squad(self, translation_site_url, use_cache=False):
         try:
-            translation_site = PenguinSquadSite(self.page, self.cf_bypasser)
-            logger.info(f"Retrieving chapter links from {translation_site_url}")
-            chapter_links = translation_site.get_chapter_links(translation_site_url)
+            site_class = partial(PenguinSquadSite, http_session=self.http_session, fetch_engine=self.fetch_engine)
+            translation_site = site_class(self.page, self.cf_bypasser)
+            chapter_links = self._get_chapter_links(translation_site_url, translation_site.get_chapter_links)
             self.total_chapters = len(chapter_links)
             
             logger.info(f"Found {self.total_chapters} chapters. Starting download...")
-            for i, link in enumerate(tqdm(chapter_links, desc="Downloading chapters", unit="chapter")):
-                cached_chapter = self.cache.get_cached_chapter(i)
-                if use_cache and cached_chapter:
-                    chapter_title, chapter_content = cached_chapter
-                else:
-                    try:
-                        chapter_title, chapter_content = translation_site.get_chapter_content(link)
-                        self.cache.cache_chapter(i, chapter_title, chapter_content)
-                    except PaywallException as e:
-                        logger.warning(f"{str(e)}")
-                        self.total_chapters = i
-                        break
-                
-                self.novel_content.append((chapter_title, chapter_content))
+
+            def finish_chapter(i, chapter_title, chapter_content):
+                return chapter_title, chapter_content
+
+            self._download_chapters(site_class, chapter_links, finish_chapter, use_cache, skip_failed=False)
             
             logger.info(f"Novel '{self.novel_info['title']}' has been downloaded. Total chapters: {self.total_chapters}")
         except Exception as e:
@@ -111,29 +322,26 @@ class NovelDownloader:
                 logger.error("Failed to log in to NovelUpdates. Cannot proceed with download.")
                 return
 
-            translation_site = GenesistudioSite(self.page, self.cf_bypasser)
-            logger.info(f"Retrieving chapter links from NovelUpdates: {novelupdates_url}")
-            chapter_links = translation_site.get_chapter_links(novelupdates_url)
+            translation_site = GenesistudioSite(self.page, self.cf_bypasser, self.nu_retriever)
+            chapter_links = self._get_chapter_links(
+                novelupdates_url, lambda url: translation_site.get_chapter_links(url, self.nu_post_id))
             self.total_chapters = len(chapter_links)
             
             logger.info(f"Found {self.total_chapters} chapters. Starting download...")
-            for i, link in enumerate(tqdm(chapter_links, desc="Downloading chapters", unit="chapter")):
-                cached_chapter = self.cache.get_cached_chapter(i)
-                if use_cache and cached_chapter:
-                    chapter_title, chapter_content = cached_chapter
-                else:
-                    try:
-                        chapter_title, chapter_content = translation_site.get_chapter_content(link)
-                        if chapter_title and chapter_content:
-                            self.cache.cache_chapter(i, chapter_title, chapter_content)
-                        else:
-                            logger.warning(f"Failed to retrieve content for chapter {i+1}")
-                            continue
-                    except Exception as e:
-                        logger.warning(f"Error downloading chapter {i+1}: {str(e)}")
-                        continue
-                
-                self.novel_content.append((chapter_title, chapter_content))
+
+            def finish_chapter(i, chapter_title, chapter_content):
+                if chapter_title and chapter_content:
+                    return chapter_title, chapter_content
+                logger.warning(f"Failed to retrieve content for chapter {i+1}")
+                return None
+
+            redirects = self._resolve_redirects(chapter_links)
+            site_class = partial(GenesistudioSite, redirects=redirects)
+            try:
+                self._download_chapters(site_class, chapter_links, finish_chapter, use_cache)
+            finally:
+                # Keep the redirects followed while downloading for the next run
+                self.cache.cache_redirects(list(redirects.items()))
             
             logger.info(f"Novel '{self.novel_info['title']}' has been downloaded. Total chapters: {self.total_chapters}")
         except Exception as e:
@@ -142,110 +350,125 @@ class NovelDownloader:
 
     def download_novel_readingpia(self, translation_site_url, use_cache=False):
         try:
-            translation_site = ReadingPiaSite(self.page, self.cf_bypasser)
-            logger.info(f"Retrieving chapter links from {translation_site_url}")
-            chapter_links = translation_site.get_chapter_links(translation_site_url)
+            site_class = partial(ReadingPiaSite, http_session=self.http_session, fetch_engine=self.fetch_engine)
+            translation_site = site_class(self.page, self.cf_bypasser)
+            chapter_links = self._get_chapter_links(translation_site_url, translation_site.get_chapter_links)
             self.total_chapters = len(chapter_links)
             
             logger.info(f"Found {self.total_chapters} chapters. Starting download...")
-            for i, link in enumerate(tqdm(chapter_links, desc="Downloading chapters", unit="chapter")):
-                cached_chapter = self.cache.get_cached_chapter(i)
-                if use_cache and cached_chapter:
-                    chapter_title, chapter_content = cached_chapter
-                else:
-                    try:
-                        chapter_title, chapter_content = translation_site.get_chapter_content(link)
-                        if not chapter_title:
-                            chapter_title = f"Chapter {i+1}"
-                        self.cache.cache_chapter(i, chapter_title, chapter_content)
-                    except Exception as e:
-                        logger.warning(f"Error downloading chapter {i+1}: {str(e)}")
-                        continue
-                
-                self.novel_content.append((chapter_title, chapter_content))
+
+            def finish_chapter(i, chapter_title, chapter_content):
+                if not chapter_title:
+                    chapter_title = f"Chapter {i+1}"
+                return chapter_title, chapter_content or ""
+
+            self._download_chapters(site_class, chapter_links, finish_chapter, use_cache)
             
             logger.info(f"Novel '{self.novel_info['title']}' has been downloaded. Total chapters: {self.total_chapters}")
         except Exception as e:
             logger.error(f"Error downloading novel from ReadingPia: {str(e)}")
             sys.exit(1)
 
+    def download(self, translation_site, novelupdates_url, translation_site_url=None, use_cache=False):
+        """Downloads the chapters of the novel from translation_site, one of batch.jobs.SITES."""
+        if translation_site == 'PenguinSquad':
+            self.download_novel_penguin_squad(translation_site_url, use_cache)
+        elif translation_site == 'Genesistudio':
+            self.download_novel_genesistudio(novelupdates_url, use_cache)
+        else:  # ReadingPia
+            self.download_novel_readingpia(translation_site_url, use_cache)
+
+    def _check_missing_chapters(self):
+        """
+        Returns {position: placeholder (title, content)} for the chapters that could not be downloaded.
+        Stops the export when there are any and missing chapters are not allowed, so an EPUB never
+        silently lacks chapters.
+        """
+        missing = self.cache.missing_chapters(max_position=self.total_chapters)
+        for position, url, attempts, last_error in missing:
+            logger.warning(f"Chapter {position + 1} is missing after {attempts} attempt(s): {url} ({last_error})")
+        if missing and not self.allow_missing:
+            logger.error(f"{len(missing)} chapters could not be downloaded. Run the download again to retry them, "
+                         f"or use --allow-missing to export the novel with placeholder chapters.")
+            sys.exit(1)
+        return {position: placeholder_chapter(position) for position, *_ in missing}
+
+    def _epub_filename(self):
+        filename = f"{self.novel_info['title']} - {self.total_chapters} chapters.epub"
+        return re.sub(r'[^\w\-_\. ]', '_', filename)  # Replace invalid filename characters
+
+    def _asset_fetcher(self):
+        if self.assets is None or self.assets.cache is not self.cache:
+            self.assets = AssetFetcher(self.cache, http_session=self.http_session, page=self.page,
+                                       cf_bypasser=self.cf_bypasser, lean_profile=self.lean_profile)
+        return self.assets
+
+    def _get_cover(self):
+        """
+        Returns (data, file_name, media_type) of the cover, fitted to cover_size, or None if there is
+        no cover or it could not be fetched. The original file is cached, so re-exports stay offline.
+        """
+        cover_url = self.novel_info.get('cover')
+        if not cover_url:
+            return None
+        try:
+            logger.info("Getting cover image")
+            with metrics.span('cover', host_of(cover_url)):
+                cover = self._asset_fetcher().get(cover_url)
+            if not cover:
+                logger.warning("Failed to download the cover image. Continuing without cover image.")
+                return None
+            original, _ = cover
+            data, media_type = fit_image(original, max_size=self.cover_size, quality=self.image_quality)
+            if len(data) < len(original):
+                logger.info(f"Cover recompressed from {len(original) // 1024} KB to {len(data) // 1024} KB")
+            if not media_type:
+                logger.warning("The cover is not an image format EPUB readers support. Continuing without cover image.")
+                return None
+            return data, f"cover.{extension_for(media_type)}", media_type
+        except Exception as e:
+            logger.warning(f"Failed to download or process cover image. Error: {str(e)}")
+            logger.info("Continuing without cover image.")
+            return None
+
+    def _embed_images(self, chapters):
+        """
+        Runs (title, content, href, url) chapters through an ImageStage, which yields them as
+        (title, content, href, images) with their images fetched ahead and src attributes rewritten.
+        With image_workers 0 the chapters are passed through with no images.
+        """
+        if not self.image_workers:
+            return ((title, content, href, []) for title, content, href, _ in chapters)
+        stage = ImageStage(self._asset_fetcher(), workers=self.image_workers, max_size=self.cover_size,
+                           quality=self.image_quality, max_bytes=self.image_budget)
+        return stage.embed(chapters)
+
     def save_novel_as_epub(self):
+        with metrics.span('epub_build'):
+            if self.volume_chapters or self.volume_bytes:
+                self.save_novel_as_volumes()
+            elif self.stream_epub:
+                self.save_novel_as_epub_streaming()
+            else:
+                self._save_novel_as_epub_in_memory()
+
+    def _save_novel_as_epub_in_memory(self):
+        self._check_missing_chapters()
         try:
             logger.info(f"Creating EPUB for novel: {self.novel_info['title']}")
-            book = epub.EpubBook()
-            
-            # Set metadata
-            book.set_identifier(self.novel_info['title'])
-            book.set_title(self.novel_info['title'])
-            book.set_language('en')
-            book.add_author(self.novel_info['author'])
-            
-            # Add cover
-            try:
-                logger.info("Downloading cover image")
-                self.page.get(self.novel_info['cover'])
-                self.cf_bypasser.bypass()
-                
-                # Download the image and get the file path from DrissionPage
-                self.page.download(self.novel_info['cover'])
-                cover_path = os.path.join(os.getcwd(), os.path.basename(self.novel_info['cover']))
-                
-                logger.info(f"Cover image downloaded to: {cover_path}")
-                
-                # Read the content of the downloaded file
-                with open(cover_path, 'rb') as cover_file:
-                    cover_content = cover_file.read()
-                
-                if cover_content:
-                    book.set_cover("cover.jpg", cover_content)
-                    logger.info("Cover image successfully added to EPUB")
-                else:
-                    logger.warning("Failed to read cover image content.")
-                
-                # Delete the downloaded file
-                os.remove(cover_path)
-                logger.info("Downloaded cover file deleted")
-                
-            except Exception as e:
-                logger.warning(f"Failed to download or process cover image. Error: {str(e)}")
-                logger.info("Continuing without cover image.")
-            
-            # Add info chapter
-            logger.info("Adding novel information chapter")
-            info_content = f"<h1>{self.novel_info['title']}</h1>"
-            info_content += f"<p><strong>Author:</strong> {self.novel_info['author']}</p>"
-            info_content += f"<p><strong>Type:</strong> {self.novel_info['type']}</p>"
-            info_content += f"<p><strong>Genre:</strong> {self.novel_info['genre']}</p>"
-            info_content += f"<p><strong>Tags:</strong> {self.novel_info['tags']}</p>"
-            info_content += f"<p><strong>Description:</strong> {self.novel_info['description']}</p>"
-            
-            info_chapter = epub.EpubHtml(title='Novel Information', file_name='info.xhtml', lang='en')
-            info_chapter.content = info_content
-            book.add_item(info_chapter)
-            
-            # Add chapters
-            logger.info("Adding novel chapters")
-            chapters = []
-            for i, (title, content) in enumerate(self.novel_content):
-                chapter = epub.EpubHtml(title=title, file_name=f'chapter_{i+1}.xhtml', lang='en')
-                chapter.content = f"<h1>{title}</h1>{content}"
-                book.add_item(chapter)
-                chapters.append(chapter)
-            
-            # Define Table of Contents
-            book.toc = [epub.Link('info.xhtml', 'Novel Information', 'intro')]
-            book.toc.extend(chapters)
-            
-            # Add default NCX and Nav file
-            book.add_item(epub.EpubNcx())
-            book.add_item(epub.EpubNav())
-            
-            # Define spine
-            book.spine = ['nav', info_chapter] + chapters
+            cover = self._get_cover()
+            chapters, images = [], []
+            embedded = self._embed_images((title, content, None, url) for title, content, url in self.novel_content)
+            for title, content, _, chapter_images in embedded:
+                chapters.append((title, content))
+                images.extend(chapter_images)
+            if cover:
+                book = build_epub_book(self.novel_info, chapters, cover[0], cover_file_name=cover[1], images=images)
+            else:
+                book = build_epub_book(self.novel_info, chapters, images=images)
             
             # Create filename
-            filename = f"{self.novel_info['title']} - {self.total_chapters} chapters.epub"
-            filename = re.sub(r'[^\w\-_\. ]', '_', filename)  # Replace invalid filename characters
+            filename = self._epub_filename()
             
             # Write EPUB file
             logger.info(f"Writing EPUB file: {filename}")
@@ -256,6 +479,128 @@ class NovelDownloader:
             logger.error(f"Error saving novel as EPUB: {str(e)}")
             sys.exit(1)
 
+    def save_novel_as_epub_streaming(self):
+        """
+        Writes the EPUB straight from the cache, one chapter at a time, so memory use
+        does not grow with the length of the novel.
+        """
+        placeholders = self._check_missing_chapters()
+        try:
+            filename = self._epub_filename()
+            # Placeholders need their place in the spine, so a book with missing chapters is rebuilt
+            if self.incremental_epub and not placeholders:
+                existing = self._find_existing_epub()
+                if existing and self._update_epub(existing, filename):
+                    return
+
+            logger.info(f"Creating EPUB for novel from cache: {self.novel_info['title']}")
+            cover = self._get_cover()
+
+            with StreamingEpubWriter(filename, self.novel_info) as writer:
+                if cover:
+                    writer.add_cover(cover[0], file_name=cover[1], media_type=cover[2])
+                    logger.info("Cover image successfully added to EPUB")
+                writer.add_info_page()
+
+                logger.info("Adding novel chapters")
+                chapters = with_placeholders(self.cache.iter_chapters(max_position=self.total_chapters), placeholders)
+                for title, content, href, images in tqdm(self._embed_images(chapters), total=self.total_chapters,
+                                                         desc="Writing chapters", unit="chapter"):
+                    for image_href, data, media_type in images:
+                        writer.add_item(image_href, data, media_type)
+                    writer.add_chapter(title, content, href)
+
+                logger.info(f"Writing EPUB file: {filename}")
+
+            logger.info(f"Novel '{self.novel_info['title']}' has been saved as '{filename}'.")
+        except Exception as e:
+            logger.error(f"Error saving novel as EPUB: {str(e)}")
+            sys.exit(1)
+
+    def save_novel_as_volumes(self):
+        """
+        Splits the novel into volumes of volume_chapters chapters or volume_bytes of text and
+        builds them from the cache in parallel worker processes, each with its own TOC.
+        """
+        placeholders = self._check_missing_chapters()
+        try:
+            if self.incremental_epub:
+                logger.info("Volumes are always rebuilt, --incremental-epub only applies to single EPUBs")
+            title = self.novel_info['title']
+            volumes = plan_volumes(self.total_chapters, self.cache.chapter_sizes(max_position=self.total_chapters),
+                                   self.volume_chapters, self.volume_bytes)
+            logger.info(f"Splitting '{title}' into {len(volumes)} volumes")
+            cover = self._get_cover()
+            http_state = self.http_session.export_state() if self.http_session else None
+
+            jobs = []
+            for number, (start, end) in enumerate(volumes, start=1):
+                jobs.append({
+                    'title': self.cache.title, 'cache_dir': self.cache.cache_dir, 'series_id': self.nu_post_id,
+                    'novel_info': self.novel_info, 'volume_title': volume_title(title, number, len(volumes)),
+                    'path': volume_file_name(title, number, len(volumes), start, end), 'start': start, 'end': end,
+                    'placeholders': {position: chapter for position, chapter in placeholders.items()
+                                     if start <= position < end},
+                    'cover': cover, 'image_workers': self.image_workers, 'image_size': self.cover_size,
+                    'image_quality': self.image_quality, 'image_budget': self.image_budget,
+                    'http_state': http_state,
+                })
+
+            for path, chapters, elapsed in tqdm(build_volumes(jobs, self.volume_workers), total=len(jobs),
+                                                desc="Writing volumes", unit="volume"):
+                metrics.record('epub_volume', None, elapsed)
+                logger.info(f"Volume saved as '{path}' ({chapters} chapters, {elapsed:.1f}s)")
+
+            logger.info(f"Novel '{title}' has been saved as {len(jobs)} volumes.")
+        except Exception as e:
+            logger.error(f"Error saving novel as EPUB volumes: {str(e)}")
+            sys.exit(1)
+
+    def _find_existing_epub(self):
+        """Returns the most recently written EPUB of this novel in the working directory, if any."""
+        prefix = re.sub(r'[^\w\-_\. ]', '_', f"{self.novel_info['title']} - ")
+        pattern = re.compile(re.escape(prefix) + r'\d+ chapters\.epub')
+        candidates = [name for name in os.listdir('.') if pattern.fullmatch(name)]
+        return max(candidates, key=os.path.getmtime) if candidates else None
+
+    def _update_epub(self, existing, filename):
+        """
+        Appends chapters missing from an existing EPUB and rewrites its TOC files.
+        Returns False if the book cannot be updated in place and has to be rebuilt.
+        """
+        try:
+            writer = AppendingEpubWriter(existing, self.novel_info)
+        except EpubUpdateError as e:
+            logger.info(f"Rebuilding EPUB instead of updating it: {str(e)}")
+            return False
+
+        logger.info(f"Updating existing EPUB: {existing}")
+        def chapters():
+            # Only new chapters are read, and only their images fetched
+            for position, url, title in self.cache.iter_chapter_index(max_position=self.total_chapters):
+                href = chapter_file_name(url)
+                content = None if writer.has_chapter(href) else self.cache.get_cached_chapter(url)[1]
+                yield title, content, href, url
+
+        with writer:
+            for title, content, href, images in self._embed_images(chapters()):
+                if content is None:
+                    writer.add_existing_chapter(title, href)
+                    continue
+                for image_href, data, media_type in images:
+                    writer.add_item(image_href, data, media_type)
+                writer.add_chapter(title, content, href)
+
+        if existing != filename:
+            os.replace(existing, filename)
+        logger.info(f"Added {writer.added} new chapters. Novel '{self.novel_info['title']}' has been saved as '{filename}'.")
+        return True
+
+def placeholder_chapter(position):
+    """Returns the (title, content) standing in for a chapter that could not be downloaded."""
+    return (f"Chapter {position + 1} (missing)",
+            "<p>This chapter could not be downloaded. Run the download again to retry it.</p>")
+
 def validate_url(url):
     try:
         result = urlparse(url)
@@ -267,49 +612,265 @@ def get_translation_site():
     while True:
         choice = input("Select translation site (1 for PenguinSquad, 2 for Genesistudio, 3 for ReadingPia): ").strip()
         if choice in ['1', '2', '3']:
-            return 'PenguinSquad' if choice == '1' else 'Genesistudio' if choice == '2' else 'ReadingPia'
+            return SITES[int(choice) - 1]
         print("Invalid choice. Please enter 1, 2, or 3.")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download web novels and save them as EPUB files.")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="Number of browser tabs used to download chapters in parallel (default: 1)")
+    parser.add_argument('--update', action='store_true',
+                        help="Reuse the cache without asking and only fetch chapters that are new or missing")
+    parser.add_argument('--stream-epub', action='store_true',
+                        help="Write the EPUB straight from the cache, one chapter at a time, to keep memory bounded")
+    parser.add_argument('--incremental-epub', action='store_true',
+                        help="Append new chapters to the existing EPUB instead of rebuilding it (implies --stream-epub)")
+    parser.add_argument('--browser-only', action='store_true',
+                        help="Fetch every page through the browser instead of the HTTP fast path")
+    parser.add_argument('--wait-timeout', type=float, default=None,
+                        help="Longest time in seconds to wait for a page, redirect or element to be ready (default: 15)")
+    parser.add_argument('--chapter-list-ttl', type=float, default=3600,
+                        help="Seconds a cached chapter list is reused before it is retrieved again, 0 always retrieves it (default: 3600)")
+    parser.add_argument('--lean', action='store_true',
+                        help="Block images, fonts, stylesheets and trackers while fetching pages (Cloudflare challenges and the cover still load)")
+    parser.add_argument('--headless', action='store_true',
+                        help="Run the browser without a window")
+    parser.add_argument('--allow-missing', action='store_true',
+                        help="Export the novel with placeholder chapters when some chapters failed to download")
+    parser.add_argument('--batch', metavar='FILE', default=None,
+                        help="Download every novel listed in a JSON or YAML job file without prompting")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="Number of novels downloaded at once in batch mode, overrides the job file's workers")
+    parser.add_argument('--watch', metavar='FILE', default=None,
+                        help="Keep checking the novels listed in a job file and download new chapters as they come out")
+    parser.add_argument('--watch-interval', type=float, default=900,
+                        help="Shortest time in seconds between two checks of a watched novel (default: 900)")
+    parser.add_argument('--watch-max-interval', type=float, default=86400,
+                        help="Longest time in seconds between two checks of a watched novel (default: 86400)")
+    parser.add_argument('--report', metavar='FILE', default=None,
+                        help="Write the timings, bytes fetched and retries of the run to a JSON file")
+    parser.add_argument('--prometheus', metavar='FILE', default=None,
+                        help="Also write the run metrics in the Prometheus textfile format")
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                        help="Run under cProfile and save the statistics to FILE (readable with pstats or snakeviz)")
+    parser.add_argument('--parse-workers', type=int, default=None,
+                        help="Number of processes that parse and clean up chapter pages (default: number of cores, 0 parses inline)")
+    parser.add_argument('--cover-size', type=parse_size, default='1264x1680', metavar='WIDTHxHEIGHT',
+                        help="Downscale the cover to fit in this size and recompress it, 0 keeps the original (default: 1264x1680, needs Pillow)")
+    parser.add_argument('--image-quality', type=int, default=DEFAULT_QUALITY,
+                        help=f"JPEG quality of recompressed images (default: {DEFAULT_QUALITY})")
+    parser.add_argument('--image-workers', type=int, default=8,
+                        help="Number of chapter images downloaded at once while the EPUB is written, 0 leaves them as remote links (default: 8)")
+    parser.add_argument('--image-budget', type=int, default=DEFAULT_IMAGE_BUDGET // 1024, metavar='KB',
+                        help=f"Size in KB chapter images are recompressed to fit in (default: {DEFAULT_IMAGE_BUDGET // 1024}, needs Pillow)")
+    volumes = parser.add_mutually_exclusive_group()
+    volumes.add_argument('--volume-chapters', type=int, default=None, metavar='N',
+                         help="Split the novel into EPUB volumes of at most N chapters")
+    volumes.add_argument('--volume-size', type=float, default=None, metavar='MB',
+                         help="Split the novel into EPUB volumes of at most this many MB of chapter text")
+    parser.add_argument('--volume-workers', type=int, default=None,
+                        help="Number of processes building volumes at once (default: number of cores)")
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument('--record', metavar='ARCHIVE', default=None,
+                        help="Record every response of the run to an archive that --replay can serve later")
+    replay.add_argument('--replay', metavar='ARCHIVE', default=None,
+                        help="Serve every request from a recorded archive through a local stand-in, without network access")
+    parser.add_argument('--replay-latency', type=float, default=0,
+                        help="Seconds the stand-in waits before every replayed response (default: 0)")
+    parser.add_argument('--replay-jitter', type=float, default=0,
+                        help="Up to this many seconds added at random to the replay latency (default: 0)")
+    parser.add_argument('--replay-challenge-rate', type=float, default=0,
+                        help="Share of replayed page loads answered with a stand-in Cloudflare challenge (default: 0)")
+    parser.add_argument('--replay-challenge-delay', type=float, default=2,
+                        help="Seconds a stand-in Cloudflare challenge takes to clear (default: 2)")
+    return parser.parse_args()
+
+def run_batch_job(session, job, tab):
+    """Downloads one job of a batch file in tab and saves its EPUB."""
+    downloader = NovelDownloader(session=session, page=tab, **downloader_options(job))
+    try:
+        downloader.get_novel_info(job['novelupdates_url'])
+        downloader.download(job['site'], job['novelupdates_url'], job['translation_url'], job['update'])
+        downloader.save_novel_as_epub()
+    finally:
+        if downloader.cache:
+            downloader.cache.close()
+
+def run_watch_check(session, watch_state, job, tab):
+    """Checks one followed novel for new chapters, and downloads and exports them if there are any."""
+    known = watch_state.get(job['novelupdates_url'])
+    downloader = NovelDownloader(session=session, page=tab, **downloader_options(job))
+    try:
+        # The series page is only read on the first check, later checks start from the cache
+        if not downloader.load_cached_novel_info(known.get('title'), known.get('post_id')):
+            downloader.get_novel_info(job['novelupdates_url'])
+        observed = downloader.check_for_new_chapters(job['site'], job['novelupdates_url'],
+                                                     job['translation_url'], known)
+        if observed['changed']:
+            downloader.download(job['site'], job['novelupdates_url'], job['translation_url'], use_cache=True)
+            downloader.save_novel_as_epub()
+        return observed
+    finally:
+        if downloader.cache:
+            downloader.cache.close()
+
+def load_jobs(path, defaults=None):
+    try:
+        return load_job_file(path, defaults)
+    except JobFileError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+def open_worker_tabs(session, workers):
+    """Returns one tab per worker in the shared browser, the first worker uses the initial tab."""
+    return [session.browser] + [session.open_tab() for _ in range(workers - 1)]
+
+def run_batch(args, session):
+    batch = load_jobs(args.batch, defaults=defaults_from_args(args))
+    workers = min(args.jobs or batch['workers'], len(batch['jobs'])) or 1
+    tabs = open_worker_tabs(session, workers)
+    try:
+        scheduler = BatchScheduler(batch['jobs'], partial(run_batch_job, session), tabs, batch['site_limits'])
+        results = scheduler.run()
+    finally:
+        for tab in tabs[1:]:
+            session.close_tab(tab)
+
+    for result in results:
+        if not result['ok']:
+            logger.error(f"Failed: {result['job']['name']} ({result['error']})")
+    if not all(result['ok'] for result in results):
+        sys.exit(1)
+
+def run_watch(args, session):
+    # Appending new chapters is much cheaper than rebuilding a book every time a chapter comes out
+    batch = load_jobs(args.watch, defaults={'incremental_epub': True, **defaults_from_args(args)})
+    workers = min(args.jobs or batch['workers'], len(batch['jobs'])) or 1
+    tabs = open_worker_tabs(session, workers)
+    watch_state = WatchState()
+    watcher = Watcher(batch['jobs'], partial(run_watch_check, session, watch_state), tabs, watch_state,
+                      batch['site_limits'], args.watch_interval, args.watch_max_interval)
+    try:
+        logger.info(f"Watching {len(batch['jobs'])} novels for new chapters. Press Ctrl+C to stop.")
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+    finally:
+        for tab in tabs[1:]:
+            session.close_tab(tab)
+        watch_state.close()
+
+def start_stand_in(args):
+    """Starts the record or replay stand-in the arguments ask for, and returns it, or None."""
+    if not (args.record or args.replay):
+        return None
+    try:
+        return StandInServer(args.record or args.replay, record=bool(args.record), latency=args.replay_latency,
+                             jitter=args.replay_jitter, challenge_rate=args.replay_challenge_rate,
+                             challenge_delay=args.replay_challenge_delay).start()
+    except (StandInError, OSError) as e:
+        logger.error(f"Failed to start the stand-in proxy: {str(e)}")
+        sys.exit(1)
+
+def write_run_report(args, stand_in=None):
+    if not args.report and not args.prometheus:
+        return
+    extra = {'argv': sys.argv[1:]}
+    if stand_in:
+        extra['stand_in'] = stand_in.summary()
+    report = build_report(wait_stats, bypass_stats, extra=extra)
+    try:
+        if args.report:
+            write_json_report(args.report, report)
+        if args.prometheus:
+            write_prometheus_textfile(args.prometheus, report)
+    except OSError as e:
+        logger.warning(f"Failed to write the run report: {str(e)}")
+
 def main():
-    downloader = NovelDownloader()
-    
-    translation_site = get_translation_site()
-    
-    while True:
-        novelupdates_url = input("Enter NovelUpdates URL: ")
-        if validate_url(novelupdates_url):
-            break
-        logger.warning("Invalid URL. Please enter a valid URL.")
+    args = parse_args()
+    profiler = cProfile.Profile() if args.profile else None
+    stand_in = start_stand_in(args)
+    proxy = stand_in.proxy_url if stand_in else None
+    try:
+        if profiler:
+            profiler.runcall(run, args, proxy)
+        else:
+            run(args, proxy)
+    finally:
+        if profiler:
+            profiler.dump_stats(args.profile)
+            logger.info(f"Profile written to {args.profile}")
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+        if stand_in:
+            stand_in.log_summary()
+            stand_in.stop()
+        write_run_report(args, stand_in)
 
-    downloader.get_novel_info(novelupdates_url)
+def run(args, proxy=None):
+    if args.wait_timeout is not None:
+        set_default_timeouts(dom_ready=args.wait_timeout, element=args.wait_timeout, url=args.wait_timeout,
+                             network_idle=args.wait_timeout)
 
-    use_cache = False
-    if downloader.check_cache():
-        while True:
-            choice = input("Cache found. Do you want to use the existing cache? (y/n): ").strip().lower()
-            if choice in ['y', 'n']:
-                use_cache = (choice == 'y')
-                break
-            print("Invalid choice. Please enter 'y' or 'n'.")
+    if args.batch or args.watch:
+        session = BrowserSession(http_fast_path=not args.browser_only, parse_workers=args.parse_workers,
+                                 lean=args.lean, headless=args.headless, pool_size=max(10, args.concurrency),
+                                 proxy=proxy)
+        try:
+            if args.watch:
+                run_watch(args, session)
+            else:
+                run_batch(args, session)
+        finally:
+            session.log_summary()
+            session.close()
+        return
+
+    downloader = NovelDownloader(concurrency=args.concurrency, http_fast_path=not args.browser_only,
+                                 stream_epub=args.stream_epub, incremental_epub=args.incremental_epub,
+                                 parse_workers=args.parse_workers, lean=args.lean, headless=args.headless,
+                                 chapter_list_ttl=args.chapter_list_ttl, allow_missing=args.allow_missing,
+                                 proxy=proxy, cover_size=args.cover_size, image_quality=args.image_quality,
+                                 image_workers=args.image_workers, image_budget=args.image_budget * 1024,
+                                 volume_chapters=args.volume_chapters,
+                                 volume_bytes=int(args.volume_size * 2 ** 20) if args.volume_size else None,
+                                 volume_workers=args.volume_workers)
+    
+    # The browser is quit however the run ends, even when it stops before the export
+    try:
+        translation_site = get_translation_site()
 
-    if translation_site == 'PenguinSquad':
-        while True:
-            translation_site_url = input("Enter PenguinSquad URL: ")
-            if validate_url(translation_site_url):
-                break
-            logger.warning("Invalid URL. Please enter a valid URL.")
-        downloader.download_novel_penguin_squad(translation_site_url, use_cache)
-    elif translation_site == 'Genesistudio':
-        downloader.download_novel_genesistudio(novelupdates_url, use_cache)
-    else:  # ReadingPia
         while True:
-            translation_site_url = input("Enter ReadingPia URL: ")
-            if validate_url(translation_site_url):
+            novelupdates_url = input("Enter NovelUpdates URL: ")
+            if validate_url(novelupdates_url):
                 break
             logger.warning("Invalid URL. Please enter a valid URL.")
-        downloader.download_novel_readingpia(translation_site_url, use_cache)
 
-    downloader.save_novel_as_epub()
+        downloader.get_novel_info(novelupdates_url)
+
+        use_cache = args.update
+        if not use_cache and downloader.check_cache():
+            while True:
+                choice = input("Cache found. Do you want to use the existing cache? (y/n): ").strip().lower()
+                if choice in ['y', 'n']:
+                    use_cache = (choice == 'y')
+                    break
+                print("Invalid choice. Please enter 'y' or 'n'.")
+
+        translation_site_url = None
+        if translation_site != 'Genesistudio':
+            while True:
+                translation_site_url = input(f"Enter {translation_site} URL: ")
+                if validate_url(translation_site_url):
+                    break
+                logger.warning("Invalid URL. Please enter a valid URL.")
+        downloader.download(translation_site, novelupdates_url, translation_site_url, use_cache)
+
+        downloader.postprocessor.close()
+        downloader.save_novel_as_epub()
+    finally:
+        downloader.session.log_summary()
+        downloader.session.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,171 @@
+"""
+jobs.py
+
+This module reads the job file of batch mode, which lists the novels to download
+and the site each one is translated on, so many novels can be mirrored without
+answering any prompt. The file is JSON, or YAML when PyYAML is installed:
+
+    {
+        "workers": 3,
+        "sites": {"Genesistudio": {"max_jobs": 1, "concurrency": 2}},
+        "defaults": {"update": true, "stream_epub": true},
+        "jobs": [
+            {"site": "PenguinSquad", "novelupdates_url": "...", "translation_url": "..."},
+            {"site": "Genesistudio", "novelupdates_url": "..."}
+        ]
+    }
+
+A job takes its settings from the job itself, then from its site, then from defaults,
+and the image and volume settings finally from the command line options of the same name.
+"""
+
+import json
+import logging
+import os
+from urllib.parse import urlparse
+
+from export.images import DEFAULT_COVER_SIZE, DEFAULT_QUALITY, parse_size
+from export.inline_images import DEFAULT_IMAGE_BUDGET
+
+logger = logging.getLogger(__name__)
+
+SITES = ('PenguinSquad', 'Genesistudio', 'ReadingPia')
+
+# Sites whose chapter list is read from NovelUpdates, so they need no translator URL
+NOVELUPDATES_ONLY_SITES = ('Genesistudio',)
+
+JOB_DEFAULTS = {
+    'translation_url': None,
+    'update': True,
+    'concurrency': 1,
+    'stream_epub': False,
+    'incremental_epub': False,
+    'chapter_list_ttl': 3600,
+    'allow_missing': False,
+    # In the units of the command line options: cover_size as WIDTHxHEIGHT, image_budget in KB, volume_size in MB
+    'cover_size': DEFAULT_COVER_SIZE,
+    'image_quality': DEFAULT_QUALITY,
+    'image_workers': 8,
+    'image_budget': DEFAULT_IMAGE_BUDGET // 1024,
+    'volume_chapters': None,
+    'volume_size': None,
+    'volume_workers': None,
+}
+
+# Settings a job falls back to the command line for, when neither the job file nor its defaults set them
+ARGUMENT_SETTINGS = ('allow_missing', 'cover_size', 'image_quality', 'image_workers', 'image_budget',
+                     'volume_chapters', 'volume_size', 'volume_workers')
+
+class JobFileError(Exception):
+    pass
+
+def _is_url(url):
+    try:
+        result = urlparse(url)
+        return all([result.scheme, result.netloc])
+    except (ValueError, AttributeError):
+        return False
+
+def _site_name(name):
+    for site in SITES:
+        if str(name).lower() == site.lower():
+            return site
+    raise JobFileError(f"Unknown site '{name}', expected one of {', '.join(SITES)}")
+
+def _cover_size(value, index):
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    try:
+        return parse_size(str(value)) if value else None
+    except ValueError as e:
+        raise JobFileError(f"Job {index}: {str(e)}")
+
+def _read(path):
+    with open(path, encoding='utf-8') as file:
+        text = file.read()
+    if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise JobFileError("Reading a YAML job file requires PyYAML (pip install pyyaml), or use JSON")
+        try:
+            return yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise JobFileError(f"Invalid YAML in {path}: {str(e)}")
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise JobFileError(f"Invalid JSON in {path}: {str(e)}")
+
+def parse_jobs(data, defaults=None):
+    """
+    Validates the content of a job file and returns {'workers', 'site_limits', 'jobs'}.
+    data is either the full mapping described in the module docstring or just the list of jobs.
+    defaults replace some of JOB_DEFAULTS, and the defaults of the file take precedence over them.
+    """
+    if isinstance(data, list):
+        data = {'jobs': data}
+    if not isinstance(data, dict) or not isinstance(data.get('jobs'), list):
+        raise JobFileError("A job file must contain a list of jobs")
+
+    defaults = {**JOB_DEFAULTS, **(defaults or {}), **(data.get('defaults') or {})}
+    site_settings = {}
+    site_limits = {}
+    for name, settings in (data.get('sites') or {}).items():
+        site = _site_name(name)
+        settings = dict(settings or {})
+        max_jobs = settings.pop('max_jobs', None)
+        if max_jobs is not None:
+            if not isinstance(max_jobs, int) or max_jobs < 1:
+                raise JobFileError(f"max_jobs of {site} must be a positive integer")
+            site_limits[site] = max_jobs
+        site_settings[site] = settings
+
+    jobs = []
+    for index, entry in enumerate(data['jobs'], 1):
+        if not isinstance(entry, dict) or 'site' not in entry:
+            raise JobFileError(f"Job {index} must be a mapping with a site")
+        site = _site_name(entry['site'])
+        job = {**defaults, **site_settings.get(site, {}), **entry}
+        job['site'] = site
+        if not _is_url(job.get('novelupdates_url')):
+            raise JobFileError(f"Job {index} needs a valid novelupdates_url")
+        if site not in NOVELUPDATES_ONLY_SITES and not _is_url(job.get('translation_url')):
+            raise JobFileError(f"Job {index} on {site} needs a valid translation_url")
+        job['cover_size'] = _cover_size(job['cover_size'], index)
+        job.setdefault('name', job['novelupdates_url'])
+        jobs.append(job)
+
+    workers = data.get('workers', 1)
+    if not isinstance(workers, int) or workers < 1:
+        raise JobFileError("workers must be a positive integer")
+    return {'workers': workers, 'site_limits': site_limits, 'jobs': jobs}
+
+def defaults_from_args(args):
+    """Returns the settings of ARGUMENT_SETTINGS taken from the parsed command line, as parse_jobs defaults."""
+    return {key: getattr(args, key) for key in ARGUMENT_SETTINGS}
+
+def downloader_options(job):
+    """Returns the NovelDownloader keyword arguments of a job, in the units NovelDownloader takes."""
+    return {
+        'concurrency': job['concurrency'],
+        'stream_epub': job['stream_epub'],
+        'incremental_epub': job['incremental_epub'],
+        'chapter_list_ttl': job['chapter_list_ttl'],
+        'allow_missing': job['allow_missing'],
+        'cover_size': job['cover_size'],
+        'image_quality': job['image_quality'],
+        'image_workers': job['image_workers'],
+        'image_budget': job['image_budget'] * 1024,
+        'volume_chapters': job['volume_chapters'],
+        'volume_bytes': int(job['volume_size'] * 2 ** 20) if job['volume_size'] else None,
+        'volume_workers': job['volume_workers'],
+    }
+
+def load_job_file(path, defaults=None):
+    """Reads and validates a job file, see parse_jobs."""
+    if not os.path.exists(path):
+        raise JobFileError(f"Job file not found: {path}")
+    batch = parse_jobs(_read(path), defaults)
+    logger.info(f"Loaded {len(batch['jobs'])} jobs from {path}")
+    return batch
@@ -0,0 +1,92 @@
+"""
+scheduler.py
+
+This module runs the jobs of batch mode on a fixed set of worker slots, one browser
+tab each, that all belong to the same warm browser. A worker takes the first pending
+job whose site is below its cap of concurrent jobs, so a site with a low cap does not
+hold back jobs queued behind it on other sites. A failing job is logged and recorded
+without stopping the batch.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class BatchScheduler:
+    def __init__(self, jobs, run_job, slots, site_limits=None):
+        """
+        :param jobs: job dicts with at least 'site' and 'name', see batch.jobs
+        :param run_job: callable(job, slot) running one job and returning its result value.
+                        An exception or SystemExit marks the job failed.
+        :param slots: one slot per worker, e.g. a browser tab, handed to run_job
+        :param site_limits: {site: most jobs of that site running at once}, unlisted sites are not capped
+        """
+        self.run_job = run_job
+        self.slots = list(slots)
+        self.site_limits = site_limits or {}
+        self._pending = list(enumerate(jobs))
+        self._running = {}
+        self._results = [None] * len(self._pending)
+        self._condition = threading.Condition()
+
+    def _take(self):
+        with self._condition:
+            while self._pending:
+                for index, (position, job) in enumerate(self._pending):
+                    site = job['site']
+                    limit = self.site_limits.get(site)
+                    if limit is None or self._running.get(site, 0) < limit:
+                        del self._pending[index]
+                        self._running[site] = self._running.get(site, 0) + 1
+                        return position, job
+                # Every pending job is on a site at its cap. Wait for one to finish.
+                self._condition.wait()
+            return None
+
+    def _release(self, job):
+        with self._condition:
+            self._running[job['site']] -= 1
+            self._condition.notify_all()
+
+    def _work(self, slot):
+        while True:
+            taken = self._take()
+            if taken is None:
+                return
+            position, job = taken
+            logger.info(f"Starting job {position + 1}: {job['name']} ({job['site']})")
+            started = time.perf_counter()
+            error = None
+            value = None
+            try:
+                value = self.run_job(job, slot)
+            except SystemExit:
+                # The downloader exits on errors it has already logged
+                error = "download failed"
+            except Exception as e:
+                error = str(e)
+            finally:
+                self._release(job)
+            elapsed = time.perf_counter() - started
+            if error:
+                logger.error(f"Job {position + 1} failed after {elapsed:.1f}s: {job['name']} ({error})")
+            else:
+                logger.info(f"Job {position + 1} finished in {elapsed:.1f}s: {job['name']}")
+            self._results[position] = {
+                'job': job, 'ok': error is None, 'error': error, 'value': value, 'elapsed': elapsed,
+            }
+
+    def run(self):
+        """Runs every job and returns their results in job order, as {job, ok, error, value, elapsed} dicts."""
+        threads = [threading.Thread(target=self._work, args=(slot,), name=f"job-{index}")
+                   for index, slot in enumerate(self.slots)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        failed = sum(1 for result in self._results if not result['ok'])
+        logger.info(f"Batch finished: {len(self._results) - failed} of {len(self._results)} jobs succeeded")
+        return self._results
@@ -0,0 +1,114 @@
+"""
+watch.py
+
+This module keeps checking a list of followed novels for new chapters. Each
+novel has its own polling interval: it grows while nothing is released, so
+dormant series cost fewer and fewer requests, and it drops to a fraction of the
+mean gap between releases when a chapter appears. The novels that are due are
+checked through a BatchScheduler, so watch mode shares the browser tabs and the
+per-site caps of batch mode.
+"""
+
+import logging
+import time
+
+from .scheduler import BatchScheduler
+
+logger = logging.getLogger(__name__)
+
+# Growth of the interval after a check that found nothing new
+BACKOFF = 1.5
+# Checks per mean gap between releases, once that gap is known
+CHECKS_PER_RELEASE = 4
+# Weight of the latest gap in the moving average of gaps between releases
+GAP_WEIGHT = 0.3
+
+def next_interval(interval, changed, now, last_changed, mean_gap, min_interval, max_interval):
+    """
+    Returns the (interval, mean_gap) to use after a check, with times in seconds.
+    :param interval: interval used before this check
+    :param changed: whether the check found new chapters
+    :param last_changed: time the previous new chapters were found, or None
+    :param mean_gap: moving average of the gaps between releases so far, or None
+    """
+    if changed:
+        if last_changed:
+            gap = now - last_changed
+            mean_gap = gap if mean_gap is None else (1 - GAP_WEIGHT) * mean_gap + GAP_WEIGHT * gap
+        interval = mean_gap / CHECKS_PER_RELEASE if mean_gap else interval / 2
+    else:
+        interval = interval * BACKOFF
+    return min(max_interval, max(min_interval, interval)), mean_gap
+
+class Watcher:
+    def __init__(self, jobs, check_job, slots, state, site_limits=None, min_interval=900, max_interval=86400,
+                 clock=time.time, sleep=time.sleep):
+        """
+        :param jobs: followed novels, as batch.jobs job dicts
+        :param check_job: callable(job, slot) checking a novel and returning what it observed as a dict
+                          of cache.watch_state fields, with 'changed' telling whether new chapters were found
+        :param slots: browser tabs the checks run in, see BatchScheduler
+        :param state: cache.watch_state.WatchState keeping the schedule between runs
+        :param min_interval: shortest time in seconds between two checks of a novel
+        :param max_interval: longest time in seconds between two checks of a novel
+        """
+        self.jobs = jobs
+        self.check_job = check_job
+        self.slots = slots
+        self.state = state
+        self.site_limits = site_limits
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.clock = clock
+        self.sleep = sleep
+
+    def due_jobs(self, now):
+        return [job for job in self.jobs
+                if (self.state.get(job['novelupdates_url']).get('next_check') or 0) <= now]
+
+    def record(self, job, ok, observed, now):
+        """Stores what a check observed and schedules the next check of the novel."""
+        url = job['novelupdates_url']
+        known = self.state.get(url)
+        interval = known.get('interval') or self.min_interval
+        if not ok:
+            # Try again after the same interval, the failure says nothing about releases
+            self.state.update(url, last_checked=now, next_check=now + interval)
+            return
+
+        # The first check only takes a baseline, it does not tell when a chapter was released
+        changed = bool(observed.get('changed')) and bool(known.get('last_checked'))
+        interval, mean_gap = next_interval(interval, changed, now, known.get('last_changed'),
+                                           known.get('mean_gap'), self.min_interval, self.max_interval)
+        fields = {name: value for name, value in observed.items() if name != 'changed' and value is not None}
+        fields.update(interval=interval, mean_gap=mean_gap, last_checked=now, next_check=now + interval)
+        if changed:
+            fields['last_changed'] = now
+        self.state.update(url, **fields)
+        logger.info(f"{job['name']}: {'new chapters' if observed.get('changed') else 'no new chapters'}, "
+                    f"next check in {interval / 60:.0f} min")
+
+    def run_once(self):
+        """Checks the novels that are due and returns the scheduler results, empty when none is due."""
+        due = self.due_jobs(self.clock())
+        if not due:
+            return []
+        logger.info(f"Checking {len(due)} of {len(self.jobs)} followed novels for new chapters")
+        results = BatchScheduler(due, self.check_job, self.slots, self.site_limits).run()
+        now = self.clock()
+        for result in results:
+            self.record(result['job'], result['ok'], result['value'] or {}, now)
+        return results
+
+    def run(self, cycles=None):
+        """Checks the novels whenever one is due, forever or for the given number of cycles."""
+        cycle = 0
+        while cycles is None or cycle < cycles:
+            self.run_once()
+            cycle += 1
+            next_checks = [self.state.get(job['novelupdates_url']).get('next_check') or 0 for job in self.jobs]
+            next_check = min(next_checks, default=self.clock() + self.max_interval)
+            delay = max(1, next_check - self.clock())
+            if cycles is None or cycle < cycles:
+                logger.info(f"Next check in {delay / 60:.1f} min")
+                self.sleep(delay)
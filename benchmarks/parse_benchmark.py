@@ -0,0 +1,74 @@
+"""
+parse_benchmark.py
+
+Times the per-site HTML parsing on saved pages with every installed parser backend.
+
+Usage:
+    python benchmarks/parse_benchmark.py [--repeat N] [--page SITE=PATH ...]
+
+Sites are readingpia (chapter page), penguin-squad (chapter page),
+novelupdates (series page) and novelupdates-chapters (chapter list).
+test_output.html is used for readingpia when no page is given for it.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from source import html_parser
+from source.cleanup import clean_readingpia_chapter, parse_penguin_squad_chapter
+from source.NU_getchapterlink import parse_novel_info, parse_chapter_list
+
+SITE_PARSERS = {
+    'readingpia': clean_readingpia_chapter,
+    'penguin-squad': parse_penguin_squad_chapter,
+    'novelupdates': parse_novel_info,
+    'novelupdates-chapters': parse_chapter_list,
+}
+
+DEFAULT_PAGES = {
+    'readingpia': os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_output.html'),
+}
+
+def time_parse(parse, html, repeat):
+    """Returns the best time of repeat runs, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(html)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare HTML parser backends on saved pages.")
+    parser.add_argument('--repeat', type=int, default=50, help="Runs per site and backend (default: 50)")
+    parser.add_argument('--page', action='append', default=[], metavar='SITE=PATH',
+                        help=f"Saved page to parse, where SITE is one of: {', '.join(SITE_PARSERS)}")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    pages = dict(DEFAULT_PAGES)
+    for page in args.page:
+        site, _, path = page.partition('=')
+        if site not in SITE_PARSERS:
+            sys.exit(f"Unknown site '{site}'")
+        pages[site] = path
+
+    backends = html_parser.available_backends()
+    print(f"{'site':<24}{'size':>10}" + ''.join(f"{backend:>14}" for backend in backends))
+    for site, path in pages.items():
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+
+        timings = []
+        for backend in backends:
+            html_parser.set_backend(backend)
+            timings.append(time_parse(SITE_PARSERS[site], html, args.repeat))
+        print(f"{site:<24}{len(html):>10}" + ''.join(f"{timing:>11.3f} ms" for timing in timings))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+run_benchmarks.py
+
+Runs the offline benchmark suite and stores its results, so that performance can
+be compared between commits without a browser or network access.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--repeat N] [--sizes 100,1000,10000]
+                                        [--page SITE=PATH ...] [--output PATH]
+                                        [--compare BASELINE] [--threshold PCT]
+
+The suite measures:
+- parse throughput of each site's extraction on the saved pages in
+  benchmarks/fixtures (test_output.html for ReadingPia), in pages per second
+- NovelUpdates series page and chapter list parsing
+- NovelCache write and read throughput, in chapters per second
+- EPUB build time and peak RSS for synthetic novels of each size, with the
+  in-memory (ebooklib) and the streaming exporter, each in a fresh process
+
+The fixtures are trimmed stand-ins with the structure the parsers rely on; pass
+--page to benchmark a page saved from the live site instead. Results are written
+to benchmarks/results/<commit>.json. With --compare, every metric is compared
+with a previous results file and the command exits with status 1 when one got
+worse by more than the threshold.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from cache.novel_cache import NovelCache
+from export.epub_book import build_epub_book
+from export.epub_stream import StreamingEpubWriter, chapter_file_name
+from source.cleanup import clean_readingpia_chapter, extract_genesistudio_chapter, parse_penguin_squad_chapter
+from source.NU_getchapterlink import parse_chapter_list, parse_novel_info
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is then not reported
+    resource = None
+
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+RESULTS = os.path.join(ROOT, 'benchmarks', 'results')
+
+SITE_PARSERS = {
+    'genesistudio': extract_genesistudio_chapter,
+    'readingpia': clean_readingpia_chapter,
+    'penguin-squad': parse_penguin_squad_chapter,
+    'novelupdates': parse_novel_info,
+    'novelupdates-chapters': parse_chapter_list,
+}
+
+DEFAULT_PAGES = {
+    'genesistudio': os.path.join(FIXTURES, 'genesistudio_chapter.html'),
+    'readingpia': os.path.join(ROOT, 'test_output.html'),
+    'penguin-squad': os.path.join(FIXTURES, 'penguin_squad_chapter.html'),
+    'novelupdates': os.path.join(FIXTURES, 'novelupdates_series.html'),
+    'novelupdates-chapters': os.path.join(FIXTURES, 'novelupdates_chapter_list.html'),
+}
+
+# Metrics where a higher value is better, every other metric is a time or a size
+HIGHER_IS_BETTER = ('pages_per_second', 'chapters_per_second')
+
+NOVEL_INFO = {
+    'title': 'Benchmark Novel',
+    'author': 'Benchmark Author',
+    'type': 'Web Novel',
+    'genre': 'Action, Fantasy',
+    'tags': 'Benchmark',
+    'description': 'A synthetic novel used to benchmark the exporters.',
+}
+
+def synthetic_chapter(index, paragraphs=40):
+    """Returns the (title, content) of a synthetic chapter of about 12 KB."""
+    text = (f"Paragraph of chapter {index}. The disciple crossed the ninth gate and looked back at the sect, "
+            f"where the elders were still arguing about the breakthrough. ") * 3
+    return f"Chapter {index}", ''.join(f"<p>{text}</p>" for _ in range(paragraphs))
+
+def best_time(function, repeat):
+    """Returns the best time of repeat calls of function, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_parsers(pages, repeat):
+    results = {}
+    for site, path in pages.items():
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        parse = SITE_PARSERS[site]
+        elapsed = best_time(lambda: parse(html), repeat)
+        results[site] = {
+            'page_bytes': len(html.encode('utf-8')),
+            'seconds': elapsed,
+            'pages_per_second': 1 / elapsed,
+        }
+        print(f"parse {site:<24}{elapsed * 1000:>10.3f} ms{1 / elapsed:>12.1f} pages/s")
+    return results
+
+def bench_cache(chapters=2000):
+    chapter_links = [f"https://example.com/chapter-{i}" for i in range(chapters)]
+    with tempfile.TemporaryDirectory() as directory:
+        cache = NovelCache('benchmark', cache_dir=directory)
+        cache.cache_novel_info(NOVEL_INFO)
+        cache.start_work(chapter_links)
+
+        start = time.perf_counter()
+        for i, url in enumerate(chapter_links):
+            title, content = synthetic_chapter(i)
+            cache.queue_chapter(url, i, title, content)
+        cache.flush()
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        read = sum(1 for _ in cache.iter_chapters())
+        read_time = time.perf_counter() - start
+        cache.close()
+
+    results = {
+        'write': {'chapters': chapters, 'seconds': write_time, 'chapters_per_second': chapters / write_time},
+        'read': {'chapters': read, 'seconds': read_time, 'chapters_per_second': read / read_time},
+    }
+    for name, stats in results.items():
+        print(f"cache {name:<24}{stats['seconds'] * 1000:>10.1f} ms{stats['chapters_per_second']:>12.1f} chapters/s")
+    return results
+
+def peak_rss():
+    """Returns the peak resident set size of this process in bytes, or None where it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def build_epub(exporter, chapters, path):
+    """Builds a synthetic EPUB in the calling process and returns (seconds, peak RSS in bytes, file size)."""
+    from ebooklib import epub
+
+    start = time.perf_counter()
+    if exporter == 'streaming':
+        with StreamingEpubWriter(path, NOVEL_INFO) as writer:
+            writer.add_info_page()
+            for i in range(chapters):
+                title, content = synthetic_chapter(i)
+                writer.add_chapter(title, content, chapter_file_name(f"https://example.com/chapter-{i}"))
+    else:
+        book = build_epub_book(NOVEL_INFO, (synthetic_chapter(i) for i in range(chapters)))
+        epub.write_epub(path, book)
+    return time.perf_counter() - start, peak_rss(), os.path.getsize(path)
+
+def bench_epub(sizes):
+    results = {}
+    # A fresh process per build, so the peak RSS belongs to that build alone
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        for exporter in ('in_memory', 'streaming'):
+            for chapters in sizes:
+                path = os.path.join(directory, f"{exporter}_{chapters}.epub")
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    elapsed, rss, size = executor.submit(build_epub, exporter, chapters, path).result()
+                results[f"{exporter}_{chapters}"] = {'seconds': elapsed, 'peak_rss_bytes': rss, 'file_bytes': size}
+                rss_text = f"{rss / 2 ** 20:>9.1f} MB" if rss else f"{'n/a':>12}"
+                print(f"epub {exporter:<10}{chapters:>7} chapters{elapsed:>10.2f} s{rss_text}")
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def flatten(results, prefix=''):
+    """Returns the numeric leaves of a results dict keyed by their dotted path."""
+    values = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+def compare(baseline, current, threshold):
+    """
+    Prints the change of every metric from baseline to current and returns the regressions.
+    :param threshold: relative change, e.g. 0.1 for 10%, beyond which a worse value is a regression
+    """
+    before = flatten(baseline['results'])
+    after = flatten(current['results'])
+    regressions = []
+    print(f"\nCompared with {baseline['commit']} ({baseline['timestamp']}):")
+    for name in sorted(before.keys() & after.keys()):
+        # Sizes of the inputs are not measurements
+        if name.endswith(('page_bytes', '.chapters')) or not before[name]:
+            continue
+        change = (after[name] - before[name]) / before[name]
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ''
+        if worse > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"  {name:<52}{before[name]:>14.4g}{after[name]:>14.4g}{change:>+9.1%}{flag}")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite and store its results.")
+    parser.add_argument('--repeat', type=int, default=20, help="Runs per parser, the best one is kept (default: 20)")
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help="Chapter counts of the synthetic novels exported (default: 100,1000,10000)")
+    parser.add_argument('--cache-chapters', type=int, default=2000,
+                        help="Chapters written to and read from the cache (default: 2000)")
+    parser.add_argument('--page', action='append', default=[], metavar='SITE=PATH',
+                        help=f"Saved page to parse, where SITE is one of: {', '.join(SITE_PARSERS)}")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', metavar='BASELINE', help="Results file of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=10,
+                        help="Percentage a metric may get worse before it counts as a regression (default: 10)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    pages = dict(DEFAULT_PAGES)
+    for page in args.page:
+        site, _, path = page.partition('=')
+        if site not in SITE_PARSERS:
+            sys.exit(f"Unknown site '{site}'")
+        pages[site] = path
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': {
+            'parse': bench_parsers(pages, args.repeat),
+            'cache': bench_cache(args.cache_chapters),
+            'epub': bench_epub(sizes),
+        },
+    }
+
+    output = args.output or os.path.join(RESULTS, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold / 100)
+        if regressions:
+            print(f"{len(regressions)} metrics got worse by more than {args.threshold:g}%")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+compression.py
+
+This module compresses chapter bodies for the SQLite cache.
+Chapters are stored with zstd when the zstandard package is installed, using a
+dictionary trained per site once enough chapters are cached, and with zlib
+otherwise. Every blob starts with a one-byte codec marker so rows written with
+different codecs can live in the same table.
+"""
+
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZLIB = b'z'
+ZSTD = b's'
+ZSTD_DICT = b'd'
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+# Chapters needed before a site gets its own dictionary, and the dictionary size
+DICT_MIN_SAMPLES = 64
+DICT_SIZE = 64 * 1024
+
+def compress(text, dictionary=None):
+    """
+    Returns text compressed into a blob.
+    :param dictionary: optional (dict_id, zstandard.ZstdCompressionDict) to compress with
+    """
+    data = text.encode('utf-8')
+    if zstandard is None:
+        return ZLIB + zlib.compress(data, ZLIB_LEVEL)
+    if dictionary:
+        dict_id, zstd_dict = dictionary
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zstd_dict)
+        return ZSTD_DICT + struct.pack('<I', dict_id) + compressor.compress(data)
+    return ZSTD + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+def decompress(blob, get_dictionary=None):
+    """
+    Returns the text stored in blob. Plain strings from uncompressed caches are returned unchanged.
+    :param get_dictionary: callable(dict_id) returning the zstandard.ZstdCompressionDict with that id
+    """
+    if blob is None or isinstance(blob, str):
+        return blob
+
+    codec, payload = bytes(blob[:1]), bytes(blob[1:])
+    if codec == ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if zstandard is None:
+        raise RuntimeError("This chapter was stored with zstd. Install the zstandard package to read it.")
+    if codec == ZSTD:
+        return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+    if codec == ZSTD_DICT:
+        dict_id = struct.unpack('<I', payload[:4])[0]
+        decompressor = zstandard.ZstdDecompressor(dict_data=get_dictionary(dict_id))
+        return decompressor.decompress(payload[4:]).decode('utf-8')
+    raise ValueError(f"Unknown chapter codec: {codec!r}")
+
+def train_dictionary(samples):
+    """Trains a zstd dictionary from sample chapter texts. Returns raw dictionary bytes, or None without zstd."""
+    if zstandard is None or len(samples) < DICT_MIN_SAMPLES:
+        return None
+    return zstandard.train_dictionary(DICT_SIZE, [sample.encode('utf-8') for sample in samples]).as_bytes()
+
+def load_dictionary(data):
+    return zstandard.ZstdCompressionDict(data)
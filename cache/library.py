@@ -0,0 +1,107 @@
+"""
+library.py
+
+This module answers questions about the whole cache library at once: which
+novels are cached, how far their downloads got and how much space the shared
+blob storage saves. Listing reads the counts NovelCache keeps on each novel,
+so it takes milliseconds even for a library of hundreds of novels.
+
+Usage:
+    python -m cache.library [--cache-dir DIR] [--prune]
+"""
+
+import argparse
+import logging
+
+from .novel_cache import WORK_STATES, connect_library, default_cache_dir, import_legacy_databases
+
+logger = logging.getLogger(__name__)
+
+class Library:
+    def __init__(self, cache_dir=None, import_legacy=True):
+        """
+        :param cache_dir: directory holding the library database, defaults to cache/db
+        :param import_legacy: first import the per-title databases left in cache_dir
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        if import_legacy:
+            import_legacy_databases(self.cache_dir)
+        self.connection = connect_library(self.cache_dir)
+
+    def novels(self):
+        """
+        Returns one dict per cached novel, by title: novel_id, title, series_id, updated_at,
+        chapters (in the current chapter list), cached (chapters stored, listed or not)
+        and the number of work items in each of WORK_STATES.
+        """
+        return self._select()
+
+    def _select(self, where='', params=()):
+        # NovelCache keeps the counts on the novels rows, so no chapter or work item is read
+        columns = ('novel_id', 'title', 'series_id', 'updated_at', 'chapters', 'cached') + WORK_STATES
+        rows = self.connection.execute(f"SELECT {', '.join(columns)} FROM novels {where} ORDER BY title", params)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def find(self, title=None, series_id=None):
+        """Returns the novels() entry of the novel with series_id, or else with title, or None."""
+        if series_id:
+            novels = self._select("WHERE series_id = ?", (str(series_id),))
+            if novels:
+                return novels[0]
+        novels = self._select("WHERE title = ?", (title,))
+        return novels[0] if novels else None
+
+    def storage(self):
+        """
+        Returns the blob storage figures: blobs stored, their stored and original sizes,
+        and the original size of all chapters and assets that refer to them.
+        """
+        blobs, stored_bytes, original_bytes = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length(data)), 0), COALESCE(SUM(size), 0) FROM blobs"
+        ).fetchone()
+        referenced_bytes = self.connection.execute(
+            "SELECT COALESCE(SUM(b.size), 0) FROM chapters c JOIN blobs b ON b.hash = c.content_hash"
+        ).fetchone()[0] + self.connection.execute(
+            "SELECT COALESCE(SUM(b.size), 0) FROM assets a JOIN blobs b ON b.hash = a.hash"
+        ).fetchone()[0]
+        return {'blobs': blobs, 'stored_bytes': stored_bytes, 'original_bytes': original_bytes,
+                'referenced_bytes': referenced_bytes}
+
+    def prune_blobs(self):
+        """Deletes the blobs no chapter or asset refers to anymore, e.g. after chapters were fetched again."""
+        with self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM blobs WHERE NOT EXISTS (SELECT 1 FROM chapters c WHERE c.content_hash = blobs.hash) "
+                "AND NOT EXISTS (SELECT 1 FROM assets a WHERE a.hash = blobs.hash)"
+            )
+        logger.info(f"Pruned {cursor.rowcount} unreferenced blobs")
+        return cursor.rowcount
+
+    def close(self):
+        self.connection.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="List the novels of the cache library.")
+    parser.add_argument('--cache-dir', default=None, help="Directory holding library.db (default: cache/db)")
+    parser.add_argument('--prune', action='store_true', help="Delete blobs nothing refers to anymore")
+    return parser.parse_args()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    library = Library(args.cache_dir)
+    try:
+        if args.prune:
+            library.prune_blobs()
+        print(f"{'title':<50}{'chapters':>10}{'pending':>9}{'failed':>8}")
+        for novel in library.novels():
+            unfinished = novel['pending'] + novel['in_flight']
+            print(f"{novel['title'][:49]:<50}{novel['chapters']:>10}{unfinished:>9}{novel['failed']:>8}")
+        storage = library.storage()
+        print(f"\n{storage['blobs']} blobs, {storage['stored_bytes'] / 2 ** 20:.1f} MB stored for "
+              f"{storage['referenced_bytes'] / 2 ** 20:.1f} MB of chapters and assets")
+    finally:
+        library.close()
+
+if __name__ == "__main__":
+    main()
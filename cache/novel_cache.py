@@ -2,63 +2,844 @@
 novel_cache.py
 
 This module provides caching functionality for the NovelDownloader.
-It uses SQLite to store novel information and chapter content.
+Every novel is cached in one SQLite library database, cache/db/library.db,
+indexed by NovelUpdates series id and title. Chapter bodies and other assets
+such as covers are stored once per content hash in a shared blob table, so
+identical chapters fetched from mirror sites and identical covers take the
+space of one. Caches from before the library, one database per title, are
+imported when their novel is next opened, or all at once by cache.library.
 """
 
 import sqlite3
 import os
+import glob
+import hashlib
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from . import compression
+from report.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LIBRARY_DB = "library.db"
+# Databases of the cache directory that are not per-title caches
+SHARED_DATABASES = (LIBRARY_DB, "watch_state.db")
+
+# Bumped whenever existing rows need a one-time migration
+SCHEMA_VERSION = 1
+
+WORK_STATES = ('pending', 'in_flight', 'done', 'failed')
+
+# Rows written per statement while importing a per-title cache
+IMPORT_BATCH = 500
+
+# Only one thread imports the per-title caches at a time
+_import_lock = threading.Lock()
+
+def content_hash(content):
+    return hashlib.sha1((content or "").encode('utf-8')).hexdigest()
+
+def asset_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+def site_of(url):
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith('www.') else host
+
+def _site_filter(column, site):
+    """Returns a WHERE clause matching the URLs of site in column, and its parameters."""
+    escaped = site.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    patterns = [f"{scheme}://{prefix}{escaped}/%" for scheme in ('http', 'https') for prefix in ('', 'www.')]
+    clause = ' OR '.join(f"{column} LIKE ? ESCAPE '\\'" for _ in patterns)
+    return f"({clause})", patterns
+
+def default_cache_dir():
+    return os.path.join(os.path.dirname(__file__), 'db')
+
+def legacy_db_name(cache_dir, novel_title):
+    """Returns the path of the per-title database the novel was cached in before the library."""
+    return os.path.join(cache_dir, f"{novel_title}.db".replace(" ", "_"))
+
+def connect_library(cache_dir=None):
+    """Opens the library database of cache_dir, creating its tables if needed."""
+    cache_dir = cache_dir or default_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(cache_dir, LIBRARY_DB), timeout=30, check_same_thread=False)
+    cursor = connection.cursor()
+    # WAL lets readers run alongside the writer, and NORMAL sync only fsyncs at checkpoints
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-16000")
+    _init_tables(cursor)
+    connection.commit()
+    return connection
+
+def _init_tables(cursor):
+    # The series id is the NovelUpdates post id. Novels cached before it was known only have a title.
+    # The counts are kept up to date by NovelCache, so listing the library reads this table alone:
+    # chapters in the current chapter list, chapters stored, and work items in each of WORK_STATES.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS novels
+        (novel_id INTEGER PRIMARY KEY, title TEXT UNIQUE, series_id TEXT, created_at REAL, updated_at REAL,
+         chapters INTEGER DEFAULT 0, cached INTEGER DEFAULT 0, pending INTEGER DEFAULT 0,
+         in_flight INTEGER DEFAULT 0, done INTEGER DEFAULT 0, failed INTEGER DEFAULT 0)
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_novels_series ON novels (series_id) "
+                   "WHERE series_id IS NOT NULL")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS novel_info
+        (novel_id INTEGER, key TEXT, value TEXT, PRIMARY KEY (novel_id, key))
+    ''')
+
+    # Content-addressed storage. Chapter bodies are compressed text (see compression),
+    # assets such as covers are stored as they were downloaded.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS blobs
+        (hash TEXT PRIMARY KEY, data BLOB, size INTEGER, compressed INTEGER)
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chapters
+        (novel_id INTEGER, url TEXT, position INTEGER, title TEXT, content_hash TEXT, updated_at REAL,
+         PRIMARY KEY (novel_id, url))
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chapters_position ON chapters (novel_id, position)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chapters_hash ON chapters (content_hash)")
+
+    # Chapters of caches from before chapters were keyed by URL, until adopt_legacy_chapters
+    # can match their list index to a URL
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS legacy_chapters
+        (novel_id INTEGER, chapter_number INTEGER, title TEXT, content TEXT,
+         PRIMARY KEY (novel_id, chapter_number))
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS compression_dictionaries
+        (dict_id INTEGER PRIMARY KEY, site TEXT UNIQUE, data BLOB)
+    ''')
+
+    # Chapter lists by the URL they were read from, with the newest link seen at fetch time
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chapter_lists
+        (novel_id INTEGER, source_url TEXT, links TEXT, fetched_at REAL, last_seen_link TEXT,
+         PRIMARY KEY (novel_id, source_url))
+    ''')
+
+    # Final translator URL of redirect links such as NovelUpdates extnu links, shared by all novels
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS redirects
+        (source_url TEXT PRIMARY KEY, target_url TEXT, resolved_at REAL)
+    ''')
+
+    # Downloaded files such as covers, by URL
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS assets
+        (url TEXT PRIMARY KEY, hash TEXT, media_type TEXT, fetched_at REAL)
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_assets_hash ON assets (hash)")
+
+    # Chapters of the current download of each novel, see start_work. state is one of WORK_STATES.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS work_items
+        (novel_id INTEGER, url TEXT, position INTEGER, state TEXT, attempts INTEGER DEFAULT 0,
+         last_error TEXT, updated_at REAL, PRIMARY KEY (novel_id, url))
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_work_items_state ON work_items (novel_id, state)")
+
+    cursor.execute("PRAGMA user_version")
+    if cursor.fetchone()[0] < SCHEMA_VERSION:
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def legacy_databases(cache_dir):
+    """Returns the paths of the per-title databases in cache_dir that have not been imported yet."""
+    return sorted(path for path in glob.glob(os.path.join(glob.escape(cache_dir), "*.db"))
+                  if os.path.basename(path) not in SHARED_DATABASES)
+
+def import_legacy_databases(cache_dir=None):
+    """Imports every per-title database of cache_dir into the library. Returns the titles imported."""
+    cache_dir = cache_dir or default_cache_dir()
+    titles = []
+    for path in legacy_databases(cache_dir):
+        cache = NovelCache(None, cache_dir=cache_dir, _legacy_path=path)
+        if cache.title:
+            titles.append(cache.title)
+        cache.close()
+    return titles
 
 class NovelCache:
-    def __init__(self, novel_title):
-        cache_dir = os.path.join(os.path.dirname(__file__), 'db')
-        os.makedirs(cache_dir, exist_ok=True)
-        self.db_name = os.path.join(cache_dir, f"{novel_title}.db".replace(" ", "_"))
-        self.connection = sqlite3.connect(self.db_name)
+    def __init__(self, novel_title, cache_dir=None, batch_size=50, flush_interval=5.0, series_id=None,
+                 _legacy_path=None):
+        """
+        :param novel_title: title of the novel
+        :param cache_dir: directory holding the library database, defaults to cache/db
+        :param batch_size: number of queued chapters written per transaction
+        :param flush_interval: seconds after which queued chapters are written even if the batch is not full
+        :param series_id: NovelUpdates post id of the novel. When given, it identifies the novel even if
+                          its title changed.
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.connection = connect_library(self.cache_dir)
+        self.db_name = os.path.join(self.cache_dir, LIBRARY_DB)
         self.cursor = self.connection.cursor()
-        self._init_tables()
-
-    def _init_tables(self):
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS novel_info
-            (key TEXT PRIMARY KEY, value TEXT)
-        ''')
-        
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chapters
-            (chapter_number INTEGER PRIMARY KEY, title TEXT, content TEXT)
-        ''')
-        
-        self.connection.commit()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Chapters and work item state changes waiting for the next batch write. Fetch workers only
+        # take the queue lock to add to them, never the connection lock.
+        self._pending = {}
+        self._transitions = []
+        self._last_flush = time.monotonic()
+        self._queue_lock = threading.Lock()
+        # One connection is shared by every fetch worker, so all access goes through this lock
+        self._lock = threading.RLock()
+        # Trained zstd dictionaries by id, and the (id, dictionary) used for new chapters of each site
+        self._dictionaries = {}
+        self._site_dictionaries = {}
+        self._training_attempted = set()
+        # Sites chapters were written for, whose dictionaries are trained when the cache is closed
+        self._written_sites = set()
+        self._load_dictionaries()
+
+        if _legacy_path:
+            self.title = self._import_legacy(_legacy_path)
+            return
+        self.title = novel_title
+        legacy_path = legacy_db_name(self.cache_dir, novel_title)
+        if os.path.basename(legacy_path) not in SHARED_DATABASES and os.path.exists(legacy_path):
+            self._import_legacy(legacy_path, novel_title)
+        self.novel_id = self._novel_id(novel_title, series_id)
+
+    def _novel_id(self, title, series_id=None):
+        """Returns the id of the novel with series_id, or else with title, adding it to the library if needed."""
+        series_id = str(series_id) if series_id else None
+        now = time.time()
+        with self._lock, self.connection:
+            row = None
+            if series_id:
+                self.cursor.execute("SELECT novel_id, title FROM novels WHERE series_id = ?", (series_id,))
+                row = self.cursor.fetchone()
+                if row and row[1] != title:
+                    logger.info(f"Novel '{row[1]}' is now titled '{title}'")
+                    self.cursor.execute("DELETE FROM novels WHERE title = ? AND series_id IS NULL", (title,))
+                    self.cursor.execute("UPDATE novels SET title = ? WHERE novel_id = ?", (title, row[0]))
+            if row is None:
+                self.cursor.execute("SELECT novel_id FROM novels WHERE title = ?", (title,))
+                row = self.cursor.fetchone()
+                if row and series_id:
+                    self.cursor.execute("UPDATE novels SET series_id = ? WHERE novel_id = ?", (series_id, row[0]))
+            if row is None:
+                self.cursor.execute("INSERT INTO novels (title, series_id, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                                    (title, series_id, now, now))
+                return self.cursor.lastrowid
+            return row[0]
+
+    def _refresh_counts(self):
+        """Recounts the chapters and work items of the novel. The caller holds the lock and a transaction."""
+        state_counts = ', '.join(
+            f"{state} = (SELECT COUNT(*) FROM work_items WHERE novel_id = :id AND state = '{state}')"
+            for state in WORK_STATES
+        )
+        self.cursor.execute(
+            "UPDATE novels SET "
+            "chapters = (SELECT COUNT(position) FROM chapters WHERE novel_id = :id), "
+            f"cached = (SELECT COUNT(*) FROM chapters WHERE novel_id = :id), {state_counts} "
+            "WHERE novel_id = :id",
+            {'id': self.novel_id}
+        )
+
+    def _import_legacy(self, path, title=None):
+        """
+        Copies a per-title database into the library and renames it to <name>.db.migrated.
+        Chapters are decompressed with the dictionaries of that database and stored again as
+        library blobs. Returns the title the novel was imported under.
+        """
+        with _import_lock:
+            if not os.path.exists(path):
+                return title
+            legacy = sqlite3.connect(path, timeout=30)
+            try:
+                tables = {row[0] for row in legacy.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                info = dict(legacy.execute("SELECT key, value FROM novel_info")) if 'novel_info' in tables else {}
+                title = title or info.get('title') or os.path.basename(path)[:-len(".db")].replace("_", " ")
+                self.novel_id = self._novel_id(title)
+                count = self._copy_legacy(legacy, tables, info)
+            finally:
+                legacy.close()
+            os.replace(path, f"{path}.migrated")
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        logger.info(f"Imported {count} cached chapters of '{title}' from {path} into the library")
+        return title
+
+    def _copy_legacy(self, legacy, tables, info):
+        dictionaries = {}
+        if 'compression_dictionaries' in tables:
+            for dict_id, data in legacy.execute("SELECT dict_id, data FROM compression_dictionaries"):
+                dictionaries[dict_id] = data
+        loaded = {}
+
+        def get_dictionary(dict_id):
+            if dict_id not in loaded:
+                loaded[dict_id] = compression.load_dictionary(dictionaries[dict_id])
+            return loaded[dict_id]
+
+        columns = [row[1] for row in legacy.execute("PRAGMA table_info(chapters)")] if 'chapters' in tables else []
+        index_keyed = [name for name in ('chapters_legacy', 'chapters') if name in tables
+                       and 'url' not in [row[1] for row in legacy.execute(f"PRAGMA table_info({name})")]]
+
+        count = 0
+        with self._lock, self.connection:
+            if info:
+                self.cursor.executemany(
+                    "INSERT OR REPLACE INTO novel_info (novel_id, key, value) VALUES (?, ?, ?)",
+                    [(self.novel_id, key, value) for key, value in info.items()]
+                )
+            if 'url' in columns:
+                rows = legacy.execute("SELECT url, position, title, content, updated_at FROM chapters")
+                while True:
+                    batch = rows.fetchmany(IMPORT_BATCH)
+                    if not batch:
+                        break
+                    self._write_chapters([(url, position, title, compression.decompress(content, get_dictionary),
+                                           updated_at) for url, position, title, content, updated_at in batch])
+                    count += len(batch)
+            for name in index_keyed:
+                legacy_rows = legacy.execute(f"SELECT chapter_number, title, content FROM {name}").fetchall()
+                self.cursor.executemany(
+                    "INSERT OR REPLACE INTO legacy_chapters (novel_id, chapter_number, title, content) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(self.novel_id, number, title, content) for number, title, content in legacy_rows]
+                )
+                count += len(legacy_rows)
+            if 'chapter_lists' in tables:
+                self.cursor.executemany(
+                    "INSERT OR REPLACE INTO chapter_lists (novel_id, source_url, links, fetched_at, last_seen_link) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(self.novel_id, *row) for row in
+                     legacy.execute("SELECT source_url, links, fetched_at, last_seen_link FROM chapter_lists")]
+                )
+            if 'redirects' in tables:
+                self.cursor.executemany(
+                    "INSERT OR IGNORE INTO redirects (source_url, target_url, resolved_at) VALUES (?, ?, ?)",
+                    legacy.execute("SELECT source_url, target_url, resolved_at FROM redirects")
+                )
+            if 'work_items' in tables:
+                self.cursor.executemany(
+                    "INSERT OR REPLACE INTO work_items (novel_id, url, position, state, attempts, last_error, "
+                    "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(self.novel_id, *row) for row in legacy.execute(
+                        "SELECT url, position, state, attempts, last_error, updated_at FROM work_items")]
+                )
+            self._refresh_counts()
+        return count
+
+    def _load_dictionaries(self):
+        if compression.zstandard is None:
+            return
+        with self._lock:
+            self.cursor.execute("SELECT dict_id, site, data FROM compression_dictionaries")
+            for dict_id, site, data in self.cursor.fetchall():
+                self._dictionaries[dict_id] = compression.load_dictionary(data)
+                self._site_dictionaries[site] = (dict_id, self._dictionaries[dict_id])
+
+    def _get_dictionary(self, dict_id):
+        if dict_id not in self._dictionaries:
+            # Trained by another novel of the library since this cache was opened
+            self._load_dictionaries()
+        return self._dictionaries[dict_id]
+
+    def _compress(self, url, content):
+        return compression.compress(content or "", self._site_dictionaries.get(site_of(url)))
+
+    def _decompress(self, blob, compressed=1):
+        if not compressed:
+            return bytes(blob).decode('utf-8')
+        return compression.decompress(blob, self._get_dictionary)
+
+    def train_dictionaries(self):
+        """
+        Trains a zstd dictionary for every site chapters were written for that has none yet and enough
+        cached chapters across the library. Runs off the write path, when the cache is closed, and
+        tries each site once per cache; chapters written afterwards are compressed with the dictionary.
+        """
+        if compression.zstandard is None:
+            return
+        sites = self._written_sites - set(self._site_dictionaries) - self._training_attempted
+        for site in sorted(sites):
+            self._training_attempted.add(site)
+            where, patterns = _site_filter('c.url', site)
+            with self._lock:
+                # Counting URLs first keeps sites without enough chapters from reading any blob
+                self.cursor.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM chapters c WHERE {where} LIMIT ?)",
+                                    patterns + [compression.DICT_MIN_SAMPLES])
+                if self.cursor.fetchone()[0] < compression.DICT_MIN_SAMPLES:
+                    continue
+                self.cursor.execute(
+                    "SELECT b.data, b.compressed FROM chapters c JOIN blobs b ON b.hash = c.content_hash "
+                    f"WHERE {where} ORDER BY c.updated_at DESC LIMIT 1000",
+                    patterns
+                )
+                samples = [self._decompress(data, compressed) for data, compressed in self.cursor.fetchall()]
+
+            try:
+                data = compression.train_dictionary(samples)
+            except Exception as e:
+                logger.warning(f"Failed to train compression dictionary for {site}: {str(e)}")
+                continue
+            if not data:
+                continue
+
+            # Another novel of the library may have trained one for the site in the meantime
+            with self._lock, self.connection:
+                self.cursor.execute("INSERT OR IGNORE INTO compression_dictionaries (site, data) VALUES (?, ?)",
+                                    (site, data))
+            self._load_dictionaries()
+            logger.info(f"Trained compression dictionary for {site} from {len(samples)} chapters")
+
+    def _put_blobs(self, rows):
+        """Stores (hash, data, size, compressed) rows, skipping content the library already has."""
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO blobs (hash, data, size, compressed) VALUES (?, ?, ?, ?)",
+            rows
+        )
+
+    def _write_chapters(self, chapters):
+        """Writes (url, position, title, content, updated_at) rows. The caller holds the lock and a transaction."""
+        hashes = [content_hash(content) for _, _, _, content, _ in chapters]
+        stored = set()
+        for start in range(0, len(hashes), IMPORT_BATCH):
+            batch = hashes[start:start + IMPORT_BATCH]
+            self.cursor.execute(f"SELECT hash FROM blobs WHERE hash IN ({','.join('?' * len(batch))})", batch)
+            stored.update(row[0] for row in self.cursor.fetchall())
+        blobs = {}
+        for (url, _, _, content, _), digest in zip(chapters, hashes):
+            if digest not in stored and digest not in blobs:
+                blobs[digest] = (digest, self._compress(url, content), len((content or "").encode('utf-8')), 1)
+        self._put_blobs(blobs.values())
+        self.cursor.executemany(
+            "INSERT OR REPLACE INTO chapters (novel_id, url, position, title, content_hash, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.novel_id, url, position, title, digest, updated_at)
+             for (url, position, title, _, updated_at), digest in zip(chapters, hashes)]
+        )
 
     def cache_novel_info(self, novel_info):
-        for key, value in novel_info.items():
-            self.cursor.execute(
-                "INSERT OR REPLACE INTO novel_info (key, value) VALUES (?, ?)",
-                (key, str(value))
+        with self._lock, self.connection:
+            self.cursor.executemany(
+                "INSERT OR REPLACE INTO novel_info (novel_id, key, value) VALUES (?, ?, ?)",
+                [(self.novel_id, key, str(value)) for key, value in novel_info.items()]
             )
-        self.connection.commit()
 
     def get_novel_info(self):
-        self.cursor.execute("SELECT key, value FROM novel_info")
-        return dict(self.cursor.fetchall())
+        with self._lock:
+            self.cursor.execute("SELECT key, value FROM novel_info WHERE novel_id = ?", (self.novel_id,))
+            return dict(self.cursor.fetchall())
 
-    def cache_chapter(self, chapter_number, title, content):
-        self.cursor.execute(
-            "INSERT OR REPLACE INTO chapters (chapter_number, title, content) VALUES (?, ?, ?)",
-            (chapter_number, title, content)
-        )
-        self.connection.commit()
+    def cache_chapter(self, url, position, title, content):
+        self.cache_chapters([(url, position, title, content)])
+
+    def cache_chapters(self, chapters):
+        """Writes (url, position, title, content) rows in a single transaction."""
+        with self._lock:
+            # Queued transitions happened before these chapters were written, so they go first
+            with self._queue_lock:
+                transitions, self._transitions = self._transitions, []
+            self._write_batch(chapters, transitions)
+
+    def _write_batch(self, chapters, transitions):
+        """
+        Writes chapters and the queued (url, state, error, time) work item transitions in one
+        transaction. Written chapters are done; a chapter only counts as done once it is on disk.
+        """
+        now = time.time()
+        with self._lock, metrics.span('cache_write'):
+            with self.connection:
+                if chapters:
+                    self._store_chapters(chapters, now)
+                self._move_work_items(transitions + [(url, 'done', None, now) for url, _, _, _ in chapters])
+            self._written_sites.update(site_of(url) for url, _, _, _ in chapters)
 
-    def get_cached_chapter(self, chapter_number):
+    def _select_by_url(self, query, urls):
+        """Runs query, whose last parameter list is the URLs, in batches and returns {url: value}."""
+        found = {}
+        for start in range(0, len(urls), IMPORT_BATCH):
+            batch = urls[start:start + IMPORT_BATCH]
+            self.cursor.execute(query.format(','.join('?' * len(batch))), [self.novel_id] + batch)
+            found.update(self.cursor.fetchall())
+        return found
+
+    def _store_chapters(self, chapters, now):
+        """Writes chapters and moves the counts of the novels row by what they add. The caller holds a transaction."""
+        rows = {url: (url, position, title, content, now) for url, position, title, content in chapters}
+        previous = self._select_by_url("SELECT url, position FROM chapters WHERE novel_id = ? AND url IN ({})",
+                                       list(rows))
+        self._write_chapters(list(rows.values()))
+        cached = sum(1 for url in rows if url not in previous)
+        listed = sum((rows[url][1] is not None) - (previous.get(url) is not None) for url in rows)
+        self.cursor.execute("UPDATE novels SET chapters = chapters + ?, cached = cached + ?, updated_at = ? "
+                            "WHERE novel_id = ?", (listed, cached, now, self.novel_id))
+
+    def _move_work_items(self, transitions):
+        """
+        Applies (url, state, error, time) transitions in order, moving the per-state counts of the
+        novels row along with them. URLs outside the work queue are ignored. The caller holds a transaction.
+        """
+        if not transitions:
+            return
+        states = self._select_by_url("SELECT url, state FROM work_items WHERE novel_id = ? AND url IN ({})",
+                                     list({url for url, _, _, _ in transitions}))
+        deltas = dict.fromkeys(WORK_STATES, 0)
+        rows = []
+        for url, state, error, at in transitions:
+            if url not in states:
+                continue
+            deltas[states[url]] -= 1
+            deltas[state] += 1
+            states[url] = state
+            rows.append((state, int(state == 'in_flight'), state, None if error is None else str(error), at,
+                         self.novel_id, url))
+        self.cursor.executemany(
+            "UPDATE work_items SET state = ?, attempts = attempts + ?, "
+            "last_error = CASE ? WHEN 'failed' THEN ? WHEN 'done' THEN NULL ELSE last_error END, updated_at = ? "
+            "WHERE novel_id = ? AND url = ?",
+            rows
+        )
         self.cursor.execute(
-            "SELECT title, content FROM chapters WHERE chapter_number = ?",
-            (chapter_number,)
+            f"UPDATE novels SET {', '.join(f'{state} = {state} + ?' for state in WORK_STATES)} WHERE novel_id = ?",
+            [deltas[state] for state in WORK_STATES] + [self.novel_id]
         )
-        return self.cursor.fetchone()
+
+    def queue_chapter(self, url, position, title, content):
+        """
+        Buffers a chapter and writes the buffer once batch_size chapters are queued
+        or flush_interval seconds have passed since the last write.
+        """
+        with self._queue_lock:
+            self._pending[url] = (url, position, title, content)
+            due = self._flush_due()
+        if due:
+            self.flush()
+
+    def _flush_due(self):
+        return (len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval)
+
+    def flush(self):
+        with self._lock:
+            with self._queue_lock:
+                chapters, self._pending = list(self._pending.values()), {}
+                transitions, self._transitions = self._transitions, []
+                self._last_flush = time.monotonic()
+            if chapters or transitions:
+                self._write_batch(chapters, transitions)
+
+    def cache_asset(self, url, data, media_type=None):
+        """Stores a downloaded file such as a cover under its URL. Identical files are stored once."""
+        digest = asset_hash(data)
+        with self._lock, self.connection:
+            self._put_blobs([(digest, data, len(data), 0)])
+            self.cursor.execute(
+                "INSERT OR REPLACE INTO assets (url, hash, media_type, fetched_at) VALUES (?, ?, ?, ?)",
+                (url, digest, media_type, time.time())
+            )
+
+    def get_asset(self, url):
+        """Returns (data, media_type) of a file stored with cache_asset, or None."""
+        with self._lock:
+            self.cursor.execute(
+                "SELECT b.data, a.media_type FROM assets a JOIN blobs b ON b.hash = a.hash WHERE a.url = ?", (url,)
+            )
+            row = self.cursor.fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def adopt_legacy_chapters(self, chapter_links):
+        """
+        Moves chapters from an index-keyed cache into the URL-keyed table, matching
+        each old index to the URL at that position of chapter_links.
+        """
+        with self._lock:
+            self.cursor.execute(
+                "SELECT chapter_number, title, content FROM legacy_chapters WHERE novel_id = ?", (self.novel_id,)
+            )
+            legacy_rows = self.cursor.fetchall()
+            if not legacy_rows:
+                return 0
+
+            rows = [(chapter_links[number], number, title, content)
+                    for number, title, content in legacy_rows
+                    if 0 <= number < len(chapter_links)]
+            self.cache_chapters(rows)
+            with self.connection:
+                self.cursor.execute("DELETE FROM legacy_chapters WHERE novel_id = ?", (self.novel_id,))
+            logger.info(f"Migrated {len(rows)} index-keyed chapters to URL keys")
+            return len(rows)
+
+    def sync_chapter_list(self, chapter_links, recount=True):
+        """
+        Records the current position of every cached chapter in chapter_links and returns
+        the set of URLs with cached content. Chapters no longer listed lose their position.
+        :param recount: recount the chapters of the novels row, which start_work does itself
+        """
+        self.adopt_legacy_chapters(chapter_links)
+        with self._lock:
+            self.flush()
+            self.cursor.execute("SELECT url FROM chapters WHERE novel_id = ? AND content_hash != ?",
+                                (self.novel_id, content_hash("")))
+            cached_urls = {row[0] for row in self.cursor.fetchall()}
+            with self.connection:
+                self.cursor.execute("UPDATE chapters SET position = NULL WHERE novel_id = ?", (self.novel_id,))
+                self.cursor.executemany(
+                    "UPDATE chapters SET position = ? WHERE novel_id = ? AND url = ?",
+                    [(i, self.novel_id, link) for i, link in enumerate(chapter_links) if link in cached_urls]
+                )
+                if recount:
+                    self._refresh_counts()
+        return cached_urls
+
+    def start_work(self, chapter_links, refetch=False):
+        """
+        Fills the work queue for a download of chapter_links and returns the (position, url) pairs to fetch.
+        When the previous download left work unfinished, e.g. because the process died, it is resumed:
+        done chapters are kept and in-flight and failed ones are fetched again. Otherwise every chapter is
+        fetched with refetch, and only those without cached content without it.
+        """
+        cached_urls = self.sync_chapter_list(chapter_links, recount=False)
+        now = time.time()
+        with self._lock:
+            self.cursor.execute("SELECT url, state, attempts FROM work_items WHERE novel_id = ?", (self.novel_id,))
+            previous = {url: (state, attempts) for url, state, attempts in self.cursor.fetchall()}
+            resuming = any(state != 'done' for state, _ in previous.values())
+            if resuming:
+                logger.info(f"Resuming an unfinished download: {self._describe_work(previous)}")
+
+            rows = []
+            to_fetch = []
+            for i, link in enumerate(chapter_links):
+                state, attempts = previous.get(link, (None, 0))
+                if link in cached_urls and (not refetch or (resuming and state == 'done')):
+                    rows.append((self.novel_id, link, i, 'done', attempts, now))
+                else:
+                    rows.append((self.novel_id, link, i, 'pending', attempts, now))
+                    to_fetch.append((i, link))
+
+            with self.connection:
+                self.cursor.execute("DELETE FROM work_items WHERE novel_id = ?", (self.novel_id,))
+                self.cursor.executemany(
+                    "INSERT INTO work_items (novel_id, url, position, state, attempts, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                # The one full recount of a download; from here on every write moves the counts itself
+                self._refresh_counts()
+        logger.info(f"Work queue: {len(to_fetch)} chapters to fetch, {len(chapter_links) - len(to_fetch)} done")
+        return to_fetch
+
+    @staticmethod
+    def _describe_work(items):
+        counts = {}
+        for state, _ in items.values():
+            counts[state] = counts.get(state, 0) + 1
+        return ', '.join(f"{counts[state]} {state}" for state in WORK_STATES if state in counts)
+
+    def mark_in_flight(self, url):
+        """Queues the start of an attempt at url. It is written with the next batch of chapters."""
+        self._queue_transition(url, 'in_flight', None)
+
+    def mark_failed(self, url, error):
+        """Queues the failure of url with error. It is written with the next batch of chapters."""
+        self._queue_transition(url, 'failed', error)
+
+    def _queue_transition(self, url, state, error):
+        with self._queue_lock:
+            self._transitions.append((url, state, error, time.time()))
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def work_summary(self):
+        """Returns {state: number of chapters} for the current work queue."""
+        with self._lock:
+            self.flush()
+            self.cursor.execute("SELECT state, COUNT(*) FROM work_items WHERE novel_id = ? GROUP BY state",
+                                (self.novel_id,))
+            return dict(self.cursor.fetchall())
+
+    def missing_chapters(self, max_position=None):
+        """
+        Returns (position, url, attempts, last_error) for the chapters of the work queue that are
+        not done and have no cached content to fall back on, in order.
+        """
+        query = ("SELECT w.position, w.url, w.attempts, w.last_error FROM work_items w "
+                 "LEFT JOIN chapters c ON c.novel_id = w.novel_id AND c.url = w.url "
+                 "WHERE w.novel_id = ? AND w.state != 'done' AND (c.url IS NULL OR c.content_hash = ?)")
+        params = [self.novel_id, content_hash("")]
+        if max_position is not None:
+            query += " AND w.position < ?"
+            params.append(max_position)
+        with self._lock:
+            self.flush()
+            self.cursor.execute(query + " ORDER BY w.position", params)
+            return self.cursor.fetchall()
+
+    def get_chapter_list(self, source_url, ttl):
+        """Returns the chapter links read from source_url less than ttl seconds ago, or None."""
+        with self._lock:
+            self.cursor.execute("SELECT links, fetched_at FROM chapter_lists WHERE novel_id = ? AND source_url = ?",
+                                (self.novel_id, source_url))
+            row = self.cursor.fetchone()
+        if not row or time.time() - row[1] >= ttl:
+            return None
+        return json.loads(row[0])
+
+    def cache_chapter_list(self, source_url, chapter_links):
+        """
+        Stores a freshly fetched chapter list and returns how many chapters come after
+        the newest link seen by the previous fetch (all of them on the first fetch).
+        """
+        with self._lock:
+            self.cursor.execute("SELECT last_seen_link FROM chapter_lists WHERE novel_id = ? AND source_url = ?",
+                                (self.novel_id, source_url))
+            row = self.cursor.fetchone()
+            with self.connection:
+                self.cursor.execute(
+                    "INSERT OR REPLACE INTO chapter_lists (novel_id, source_url, links, fetched_at, last_seen_link) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (self.novel_id, source_url, json.dumps(chapter_links), time.time(),
+                     chapter_links[-1] if chapter_links else None)
+                )
+
+        last_seen_link = row[0] if row else None
+        if last_seen_link in chapter_links:
+            return len(chapter_links) - chapter_links.index(last_seen_link) - 1
+        return len(chapter_links)
+
+    def get_redirects(self, urls=None):
+        """Returns {source_url: target_url} for the given URLs, or for every cached redirect."""
+        with self._lock:
+            if urls is None:
+                self.cursor.execute("SELECT source_url, target_url FROM redirects")
+                return dict(self.cursor.fetchall())
+            urls = list(urls)
+            redirects = {}
+            # Looked up by key, the redirects of the whole library can be many
+            for start in range(0, len(urls), IMPORT_BATCH):
+                batch = urls[start:start + IMPORT_BATCH]
+                self.cursor.execute(
+                    f"SELECT source_url, target_url FROM redirects WHERE source_url IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                redirects.update(self.cursor.fetchall())
+        return {url: redirects[url] for url in urls if url in redirects}
+
+    def cache_redirects(self, redirects):
+        """Stores (source_url, target_url) pairs. A target_url of None forgets a stale redirect."""
+        redirects = list(redirects)
+        now = time.time()
+        with self._lock, self.connection:
+            self.cursor.executemany(
+                "INSERT OR REPLACE INTO redirects (source_url, target_url, resolved_at) VALUES (?, ?, ?)",
+                [(source_url, target_url, now) for source_url, target_url in redirects if target_url]
+            )
+            self.cursor.executemany(
+                "DELETE FROM redirects WHERE source_url = ?",
+                [(source_url,) for source_url, target_url in redirects if not target_url]
+            )
+
+    def count_cached_chapters(self):
+        with self._lock:
+            self.cursor.execute("SELECT COUNT(*) FROM chapters WHERE novel_id = ?", (self.novel_id,))
+            count = self.cursor.fetchone()[0]
+            self.cursor.execute("SELECT COUNT(*) FROM legacy_chapters WHERE novel_id = ?", (self.novel_id,))
+            count += self.cursor.fetchone()[0]
+            return count + len(self._pending)
+
+    def get_cached_chapter(self, url):
+        with self._queue_lock:
+            pending = self._pending.get(url)
+        if pending:
+            return pending[2:]
+        with self._lock:
+            self.cursor.execute(
+                "SELECT c.title, b.data, b.compressed FROM chapters c JOIN blobs b ON b.hash = c.content_hash "
+                "WHERE c.novel_id = ? AND c.url = ?",
+                (self.novel_id, url)
+            )
+            row = self.cursor.fetchone()
+            return (row[0], self._decompress(row[1], row[2])) if row else None
 
     def get_all_cached_chapters(self):
-        self.cursor.execute("SELECT chapter_number, title, content FROM chapters ORDER BY chapter_number")
-        return self.cursor.fetchall()
+        """Returns (position, title, content) for the chapters in the current chapter list, in order."""
+        with self._lock:
+            self.flush()
+            self.cursor.execute(
+                "SELECT c.position, c.title, b.data, b.compressed FROM chapters c "
+                "JOIN blobs b ON b.hash = c.content_hash "
+                "WHERE c.novel_id = ? AND c.position IS NOT NULL ORDER BY c.position",
+                (self.novel_id,)
+            )
+            return [(position, title, self._decompress(data, compressed))
+                    for position, title, data, compressed in self.cursor.fetchall()]
+
+    def iter_chapters(self, max_position=None, min_position=None):
+        """
+        Yields (position, url, title, content) for the chapters in the current chapter list, in order,
+        reading them from the database one at a time through a separate read connection.
+        :param max_position: first position not yielded
+        :param min_position: first position yielded
+        """
+        self.flush()
+        connection = sqlite3.connect(self.db_name, timeout=30)
+        try:
+            query = ("SELECT c.position, c.url, c.title, b.data, b.compressed FROM chapters c "
+                     "JOIN blobs b ON b.hash = c.content_hash WHERE c.novel_id = ? AND c.position IS NOT NULL")
+            params = (self.novel_id,)
+            if max_position is not None:
+                query += " AND c.position < ?"
+                params += (max_position,)
+            if min_position is not None:
+                query += " AND c.position >= ?"
+                params += (min_position,)
+            for position, url, title, data, compressed in connection.execute(query + " ORDER BY c.position", params):
+                yield position, url, title, self._decompress(data, compressed)
+        finally:
+            connection.close()
+
+    def iter_chapter_index(self, max_position=None):
+        """Like iter_chapters, but yields (position, url, title) without reading chapter content."""
+        self.flush()
+        connection = sqlite3.connect(self.db_name, timeout=30)
+        try:
+            query = "SELECT position, url, title FROM chapters WHERE novel_id = ? AND position IS NOT NULL"
+            params = (self.novel_id,)
+            if max_position is not None:
+                query += " AND position < ?"
+                params += (max_position,)
+            yield from connection.execute(query + " ORDER BY position", params)
+        finally:
+            connection.close()
+
+    def chapter_sizes(self, max_position=None):
+        """Returns {position: uncompressed size in bytes} of the chapters in the current chapter list."""
+        self.flush()
+        with self._lock:
+            query = ("SELECT c.position, b.size FROM chapters c JOIN blobs b ON b.hash = c.content_hash "
+                     "WHERE c.novel_id = ? AND c.position IS NOT NULL")
+            params = (self.novel_id,)
+            if max_position is not None:
+                query += " AND c.position < ?"
+                params += (max_position,)
+            return dict(self.cursor.execute(query, params).fetchall())
 
     def close(self):
-        self.connection.close()
\ No newline at end of file
+        with self._lock:
+            self.flush()
+            self.train_dictionaries()
+            self.connection.close()
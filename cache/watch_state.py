@@ -0,0 +1,75 @@
+"""
+watch_state.py
+
+This module stores what watch mode knows about each followed novel between
+checks: the title and post id needed to skip the series page, the size and
+newest link of the chapter list, the HTTP validators of the chapter list page
+and the adaptive polling schedule. It lives in its own SQLite database, keyed
+by NovelUpdates URL, since the cache library knows novels by title and post id,
+which are only known once the series page has been read.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('title', 'post_id', 'chapter_count', 'last_link', 'etag', 'last_modified',
+          'interval', 'next_check', 'last_checked', 'last_changed', 'mean_gap')
+
+class WatchState:
+    def __init__(self, cache_dir=None):
+        """
+        :param cache_dir: directory holding the database, defaults to cache/db like NovelCache
+        """
+        cache_dir = cache_dir or os.path.join(os.path.dirname(__file__), 'db')
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_name = os.path.join(cache_dir, "watch_state.db")
+        self.connection = sqlite3.connect(self.db_name, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS watched (
+                    novelupdates_url TEXT PRIMARY KEY,
+                    title TEXT,
+                    post_id TEXT,
+                    chapter_count INTEGER,
+                    last_link TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    interval REAL,
+                    next_check REAL,
+                    last_checked REAL,
+                    last_changed REAL,
+                    mean_gap REAL
+                )
+            ''')
+
+    def get(self, novelupdates_url):
+        """Returns the stored fields of a novel as a dict, empty for a novel never checked."""
+        with self._lock:
+            row = self.connection.execute(
+                f"SELECT {', '.join(FIELDS)} FROM watched WHERE novelupdates_url = ?", (novelupdates_url,)
+            ).fetchone()
+        return dict(zip(FIELDS, row)) if row else {}
+
+    def update(self, novelupdates_url, **fields):
+        """Stores fields of a novel, leaving the others as they are."""
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown watch state fields: {', '.join(sorted(unknown))}")
+        if not fields:
+            return
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO watched (novelupdates_url) VALUES (?)", (novelupdates_url,))
+            self.connection.execute(
+                f"UPDATE watched SET {', '.join(f'{name} = ?' for name in fields)} WHERE novelupdates_url = ?",
+                (*fields.values(), novelupdates_url)
+            )
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
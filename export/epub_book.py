@@ -0,0 +1,69 @@
+"""
+epub_book.py
+
+This module builds an EPUB in memory with ebooklib, with the novel information
+page first and the chapters in order. It is the default exporter; novels too
+long to hold in memory are written by epub_stream instead.
+"""
+
+import logging
+
+from ebooklib import epub
+
+logger = logging.getLogger(__name__)
+
+def info_page_content(novel_info):
+    content = f"<h1>{novel_info['title']}</h1>"
+    content += f"<p><strong>Author:</strong> {novel_info['author']}</p>"
+    content += f"<p><strong>Type:</strong> {novel_info['type']}</p>"
+    content += f"<p><strong>Genre:</strong> {novel_info['genre']}</p>"
+    content += f"<p><strong>Tags:</strong> {novel_info['tags']}</p>"
+    content += f"<p><strong>Description:</strong> {novel_info['description']}</p>"
+    return content
+
+def build_epub_book(novel_info, chapters, cover_content=None, cover_file_name="cover.jpg", images=None):
+    """
+    Returns an EpubBook of the novel, ready for epub.write_epub.
+    :param chapters: (title, content) pairs in reading order
+    :param cover_content: cover image bytes, if any
+    :param cover_file_name: file name of the cover, whose extension gives its media type
+    :param images: (href, data, media_type) of the images the chapters show
+    """
+    book = epub.EpubBook()
+
+    # Set metadata
+    book.set_identifier(novel_info['title'])
+    book.set_title(novel_info['title'])
+    book.set_language('en')
+    book.add_author(novel_info['author'])
+
+    if cover_content:
+        book.set_cover(cover_file_name, cover_content)
+        logger.info("Cover image successfully added to EPUB")
+
+    for i, (href, data, media_type) in enumerate(images or []):
+        book.add_item(epub.EpubItem(uid=f"image_{i}", file_name=href, media_type=media_type, content=data))
+
+    logger.info("Adding novel information chapter")
+    info_chapter = epub.EpubHtml(title='Novel Information', file_name='info.xhtml', lang='en')
+    info_chapter.content = info_page_content(novel_info)
+    book.add_item(info_chapter)
+
+    logger.info("Adding novel chapters")
+    items = []
+    for i, (title, content) in enumerate(chapters):
+        chapter = epub.EpubHtml(title=title, file_name=f'chapter_{i+1}.xhtml', lang='en')
+        chapter.content = f"<h1>{title}</h1>{content}"
+        book.add_item(chapter)
+        items.append(chapter)
+
+    # Define Table of Contents
+    book.toc = [epub.Link('info.xhtml', 'Novel Information', 'intro')]
+    book.toc.extend(items)
+
+    # Add default NCX and Nav file
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+
+    book.spine = ['nav', info_chapter] + items
+    return book
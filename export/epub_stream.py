@@ -0,0 +1,189 @@
+"""
+epub_stream.py
+
+This module writes EPUB files one chapter at a time.
+Each chapter is converted to XHTML and written to the zip as soon as it is
+added, so only the table of contents is kept in memory. The package document,
+NCX and navigation files are written last, at the tail of the archive.
+"""
+
+import hashlib
+import logging
+import zipfile
+from datetime import datetime, timezone
+from html import escape
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+CONTAINER_XML = '''<?xml version="1.0" encoding="utf-8"?>
+<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container" version="1.0">
+  <rootfiles>
+    <rootfile full-path="EPUB/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+'''
+
+XHTML_TEMPLATE = '''<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="{lang}" xml:lang="{lang}">
+<head>
+  <title>{title}</title>
+</head>
+<body>
+{body}
+</body>
+</html>
+'''
+
+# Files rewritten whenever the chapter list changes. They are always the last entries of the archive.
+MANIFEST_FILES = ('EPUB/content.opf', 'EPUB/toc.ncx', 'EPUB/nav.xhtml')
+# Ids of the pages in front of the chapters, written by add_cover and add_info_page
+FRONT_MATTER_IDS = ('cover', 'intro')
+
+def chapter_file_name(url):
+    """Returns a file name that stays the same for a chapter URL, wherever the chapter moves in the list."""
+    return f"chapter_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]}.xhtml"
+
+def with_placeholders(chapters, placeholders):
+    """
+    Yields (title, content, href, url) for the cached (position, url, title, content) chapters, with the
+    placeholders of {position: (title, content)} inserted at their positions with a None url.
+    """
+    pending = sorted(placeholders.items())
+    for position, url, title, content in chapters:
+        while pending and pending[0][0] < position:
+            missing_position, (missing_title, missing_content) = pending.pop(0)
+            yield missing_title, missing_content, f"missing_{missing_position + 1}.xhtml", None
+        yield title, content, chapter_file_name(url), url
+    for missing_position, (missing_title, missing_content) in pending:
+        yield missing_title, missing_content, f"missing_{missing_position + 1}.xhtml", None
+
+def to_xhtml_body(html):
+    """Converts an HTML fragment (or plain text) into well-formed XHTML."""
+    return BeautifulSoup(html or "", 'html.parser').decode(formatter='minimal')
+
+def info_page_body(novel_info):
+    body = f"<h1>{escape(novel_info['title'])}</h1>"
+    for label, key in (('Author', 'author'), ('Type', 'type'), ('Genre', 'genre'), ('Tags', 'tags'),
+                       ('Description', 'description')):
+        body += f"<p><strong>{label}:</strong> {escape(str(novel_info.get(key, '')))}</p>"
+    return body
+
+class StreamingEpubWriter:
+    def __init__(self, path, novel_info, language='en'):
+        self.path = path
+        self.novel_info = novel_info
+        self.language = language
+        # (id, href, media_type, properties) for the manifest, and (id, href, title) for the spine and TOC
+        self.items = []
+        self.chapters = []
+        self.cover_href = None
+        self.zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._write_raw('mimetype', 'application/epub+zip', zipfile.ZIP_STORED)
+        self._write_raw('META-INF/container.xml', CONTAINER_XML)
+
+    def _write_raw(self, name, data, compress_type=zipfile.ZIP_DEFLATED):
+        info = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+        info.compress_type = compress_type
+        self.zip.writestr(info, data)
+
+    def add_item(self, href, data, media_type, item_id=None, properties=None):
+        """Writes a file (image, stylesheet, ...) under EPUB/ and lists it in the manifest."""
+        item_id = item_id or f"item_{len(self.items)}"
+        self._write_raw(f"EPUB/{href}", data)
+        self.items.append((item_id, href, media_type, properties))
+        return item_id
+
+    def add_cover(self, data, file_name='cover.jpg', media_type='image/jpeg'):
+        self.add_item(file_name, data, media_type, item_id='cover-img', properties='cover-image')
+        self.cover_href = file_name
+        body = f'<img src="{file_name}" alt="Cover"/>'
+        self._add_page('cover', 'cover.xhtml', 'Cover', body, in_toc=False)
+
+    def add_info_page(self):
+        self._add_page('intro', 'info.xhtml', 'Novel Information', info_page_body(self.novel_info))
+
+    def add_chapter(self, title, content, href):
+        """Converts a chapter to XHTML and writes it to the archive right away."""
+        body = f"<h1>{escape(title)}</h1>{to_xhtml_body(content)}"
+        self._add_page(href.rsplit('.', 1)[0], href, title, body)
+
+    def _add_page(self, item_id, href, title, body, in_toc=True):
+        page = XHTML_TEMPLATE.format(lang=self.language, title=escape(title), body=body)
+        self._write_raw(f"EPUB/{href}", page)
+        self.items.append((item_id, href, 'application/xhtml+xml', None))
+        self.chapters.append((item_id, href, title if in_toc else None))
+
+    def _content_opf(self):
+        modified = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        metadata = [
+            f'<dc:identifier id="id">{escape(self.novel_info["title"])}</dc:identifier>',
+            f'<dc:title>{escape(self.novel_info["title"])}</dc:title>',
+            f'<dc:language>{self.language}</dc:language>',
+            f'<dc:creator id="creator">{escape(self.novel_info.get("author", ""))}</dc:creator>',
+            f'<meta property="dcterms:modified">{modified}</meta>',
+        ]
+        if self.cover_href:
+            metadata.append('<meta name="cover" content="cover-img"/>')
+
+        manifest = [
+            '<item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>',
+            '<item href="nav.xhtml" id="nav" media-type="application/xhtml+xml" properties="nav"/>',
+        ]
+        for item_id, href, media_type, properties in self.items:
+            extra = f' properties="{properties}"' if properties else ''
+            manifest.append(f'<item href="{escape(href)}" id="{item_id}" media-type="{media_type}"{extra}/>')
+
+        spine = ['<itemref idref="nav"/>'] + [f'<itemref idref="{item_id}"/>' for item_id, _, _ in self.chapters]
+
+        return (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" unique-identifier="id" version="3.0">\n'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">\n'
+            + '\n'.join(metadata) +
+            '\n</metadata>\n<manifest>\n' + '\n'.join(manifest) +
+            '\n</manifest>\n<spine toc="ncx">\n' + '\n'.join(spine) +
+            '\n</spine>\n</package>\n'
+        )
+
+    def _toc_ncx(self):
+        nav_points = []
+        for order, (item_id, href, title) in enumerate(self.toc_entries(), start=1):
+            nav_points.append(
+                f'<navPoint id="{item_id}" playOrder="{order}"><navLabel><text>{escape(title)}</text></navLabel>'
+                f'<content src="{escape(href)}"/></navPoint>'
+            )
+        return (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">\n'
+            f'<head><meta content="{escape(self.novel_info["title"])}" name="dtb:uid"/></head>\n'
+            f'<docTitle><text>{escape(self.novel_info["title"])}</text></docTitle>\n'
+            '<navMap>\n' + '\n'.join(nav_points) + '\n</navMap>\n</ncx>\n'
+        )
+
+    def _nav_xhtml(self):
+        entries = [f'<li><a href="{escape(href)}">{escape(title)}</a></li>' for _, href, title in self.toc_entries()]
+        body = f'<nav epub:type="toc" id="toc" role="doc-toc"><h2>{escape(self.novel_info["title"])}</h2><ol>\n' \
+               + '\n'.join(entries) + '\n</ol></nav>'
+        return XHTML_TEMPLATE.format(lang=self.language, title=escape(self.novel_info['title']), body=body)
+
+    def toc_entries(self):
+        return [(item_id, href, title) for item_id, href, title in self.chapters if title is not None]
+
+    def close(self):
+        """Writes the package document, NCX and navigation file, then closes the archive."""
+        self._write_raw(MANIFEST_FILES[0], self._content_opf())
+        self._write_raw(MANIFEST_FILES[1], self._toc_ncx())
+        self._write_raw(MANIFEST_FILES[2], self._nav_xhtml())
+        self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.zip.close()
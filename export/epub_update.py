@@ -0,0 +1,117 @@
+"""
+epub_update.py
+
+This module adds new chapters to an EPUB written by StreamingEpubWriter without rebuilding it.
+Those books keep their package document, NCX and navigation file at the tail
+of the archive, so an update truncates the archive at the first of them, appends
+the new chapter files, and writes fresh copies of the three small files. Every
+other entry is left in place, untouched and without being recompressed.
+"""
+
+import logging
+import zipfile
+import xml.etree.ElementTree as ET
+
+from .epub_stream import StreamingEpubWriter, FRONT_MATTER_IDS, MANIFEST_FILES
+
+logger = logging.getLogger(__name__)
+
+OPF_NS = {'opf': 'http://www.idpf.org/2007/opf'}
+NCX_NS = {'ncx': 'http://www.daisy.org/z3986/2005/ncx/'}
+
+class EpubUpdateError(Exception):
+    pass
+
+class AppendingEpubWriter(StreamingEpubWriter):
+    def __init__(self, path, novel_info, language='en'):
+        self.path = path
+        self.novel_info = novel_info
+        self.language = language
+        self.items = []
+        self.chapters = []
+        self.cover_href = None
+        self.added = 0
+        try:
+            self.zip = zipfile.ZipFile(path, 'a', compression=zipfile.ZIP_DEFLATED)
+        except (OSError, zipfile.BadZipFile) as e:
+            raise EpubUpdateError(f"Cannot open {path}: {str(e)}")
+
+        try:
+            self._restore_state()
+            self._drop_manifest_files()
+        except Exception:
+            self.zip.close()
+            raise
+
+    def _restore_state(self):
+        infos = self.zip.infolist()
+        if tuple(info.filename for info in infos[-len(MANIFEST_FILES):]) != MANIFEST_FILES:
+            raise EpubUpdateError(f"{self.path} was not written by the streaming exporter")
+
+        opf = ET.fromstring(self.zip.read(MANIFEST_FILES[0]))
+        ncx = ET.fromstring(self.zip.read(MANIFEST_FILES[1]))
+        titles = {
+            point.find('ncx:content', NCX_NS).get('src'): point.find('ncx:navLabel/ncx:text', NCX_NS).text or ''
+            for point in ncx.iter(f"{{{NCX_NS['ncx']}}}navPoint")
+        }
+
+        hrefs = {}
+        for item in opf.find('opf:manifest', OPF_NS):
+            item_id = item.get('id')
+            if item_id in ('ncx', 'nav'):
+                continue
+            hrefs[item_id] = item.get('href')
+            self.items.append((item_id, item.get('href'), item.get('media-type'), item.get('properties')))
+            if item.get('properties') == 'cover-image':
+                self.cover_href = item.get('href')
+
+        # Only the cover and novel information pages keep their place in the spine. The update places every
+        # chapter again, so the placeholder pages of chapters that were missing are left out of the book.
+        placeholders = set()
+        for itemref in opf.find('opf:spine', OPF_NS):
+            item_id = itemref.get('idref')
+            if item_id in FRONT_MATTER_IDS:
+                self.chapters.append((item_id, hrefs[item_id], titles.get(hrefs[item_id])))
+            elif item_id.startswith('missing_'):
+                placeholders.add(item_id)
+        self.items = [item for item in self.items if item[0] not in placeholders]
+
+        self._existing = set(hrefs.values())
+
+    def _drop_manifest_files(self):
+        tail = [self.zip.getinfo(name) for name in MANIFEST_FILES]
+        self._old_manifest = [(name, self.zip.read(name)) for name in MANIFEST_FILES]
+        # New entries are written from start_dir, so the old manifest files get overwritten and truncated away
+        self.zip.start_dir = tail[0].header_offset
+        for info in tail:
+            self.zip.filelist.remove(info)
+            del self.zip.NameToInfo[info.filename]
+        self.zip._didModify = True
+
+    def has_chapter(self, href):
+        return href in self._existing
+
+    def add_item(self, href, data, media_type, item_id=None, properties=None):
+        """Like StreamingEpubWriter.add_item, but a file already in the archive is kept as it is."""
+        if href in self._existing:
+            return next(item[0] for item in self.items if item[1] == href)
+        self._existing.add(href)
+        return super().add_item(href, data, media_type, item_id, properties)
+
+    def add_existing_chapter(self, title, href):
+        """Places a chapter that is already in the archive at the next position of the spine and TOC."""
+        self.chapters.append((href.rsplit('.', 1)[0], href, title))
+
+    def add_chapter(self, title, content, href):
+        super().add_chapter(title, content, href)
+        self._existing.add(href)
+        self.added += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Put the previous manifest back so the book still opens. Chapters appended so far are just unlisted.
+            for name, data in self._old_manifest:
+                self._write_raw(name, data)
+            self.zip.close()
@@ -0,0 +1,125 @@
+"""
+images.py
+
+This module prepares downloaded images for an EPUB.
+Images larger than the target e-reader resolution are downscaled, and images
+that would take less space as JPEG, such as opaque PNG covers, are recompressed.
+Pillow is optional: without it images are embedded as they were downloaded,
+with their media type read from their first bytes.
+"""
+
+import io
+import logging
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Screen of a 6" 300 ppi e-reader
+DEFAULT_COVER_SIZE = (1264, 1680)
+DEFAULT_QUALITY = 85
+
+# Leading bytes of the image formats EPUB readers support
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp',
+              'image/svg+xml': 'svg'}
+
+_warned = False
+
+def sniff_media_type(data, fallback=None):
+    """Returns the media type of image data from its first bytes, or fallback when it is not recognised."""
+    for signature, media_type in SIGNATURES:
+        if data.startswith(signature):
+            return media_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data.lstrip()[:5] in (b'<?xml', b'<svg ') and b'<svg' in data[:1024]:
+        return 'image/svg+xml'
+    if fallback:
+        return fallback.split(';')[0].strip().lower()
+    return None
+
+def extension_for(media_type):
+    return EXTENSIONS.get(media_type, 'img')
+
+def parse_size(value):
+    """Parses a WIDTHxHEIGHT argument. '0' and '' mean the original size, returned as None."""
+    if not value or value == '0':
+        return None
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Invalid image size '{value}', expected WIDTHxHEIGHT such as 1264x1680")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Invalid image size '{value}', expected WIDTHxHEIGHT such as 1264x1680")
+    return width, height
+
+def fit_image(data, max_size=DEFAULT_COVER_SIZE, quality=DEFAULT_QUALITY, max_bytes=None):
+    """
+    Returns (data, media_type) of an image made to fit an e-reader. The original is returned
+    unchanged when Pillow is missing, the image cannot be decoded or re-encoding does not make it smaller.
+    :param max_size: (width, height) the image is downscaled to fit in, None keeps its size
+    :param quality: JPEG quality of recompressed images
+    :param max_bytes: if set, the JPEG quality is lowered step by step until the image fits in this many bytes
+    """
+    media_type = sniff_media_type(data)
+    if Image is None or media_type not in ('image/jpeg', 'image/png', 'image/webp'):
+        if Image is None:
+            _warn_missing_pillow()
+        return data, media_type
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception as e:
+        logger.warning(f"Could not decode image for recompression: {str(e)}")
+        return data, media_type
+
+    too_large = max_size and (image.width > max_size[0] or image.height > max_size[1])
+    over_budget = max_bytes and len(data) > max_bytes
+    if not too_large and not over_budget and media_type == 'image/jpeg':
+        return data, media_type
+
+    if too_large:
+        image.thumbnail(max_size, Image.LANCZOS)
+
+    # Transparent images stay PNG, anything else is cheaper as JPEG
+    if _has_alpha(image):
+        output = io.BytesIO()
+        image.save(output, format='PNG', optimize=True)
+        result, result_type = output.getvalue(), 'image/png'
+    else:
+        result, result_type = _encode_jpeg(image.convert('RGB'), quality, max_bytes)
+
+    if len(result) >= len(data) and not too_large:
+        return data, media_type
+    return result, result_type
+
+def _encode_jpeg(image, quality, max_bytes):
+    while True:
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+        if not max_bytes or output.tell() <= max_bytes or quality <= 40:
+            return output.getvalue(), 'image/jpeg'
+        quality -= 10
+
+def _has_alpha(image):
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        return image.convert('RGBA').getextrema()[3][0] < 255
+    return False
+
+def _warn_missing_pillow():
+    global _warned
+    if not _warned:
+        logger.warning("Pillow is not installed, so images are embedded without downscaling or recompression. "
+                       "Install it with 'pip install Pillow' to keep EPUBs small.")
+        _warned = True
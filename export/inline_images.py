@@ -0,0 +1,160 @@
+"""
+inline_images.py
+
+This module embeds the images of chapter bodies into the EPUB, so they render
+offline. Image URLs are collected from each chapter as the exporter reads it,
+and fetched on a thread pool a number of chapters ahead of the chapter being
+written, so downloading overlaps with the export instead of following it.
+Each image is fetched once however many chapters show it, cached under its URL
+and recompressed to the size budget before it is embedded.
+"""
+
+import hashlib
+import logging
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from html import unescape
+from urllib.parse import urljoin
+
+from .images import DEFAULT_COVER_SIZE, DEFAULT_QUALITY, extension_for, fit_image
+
+logger = logging.getLogger(__name__)
+
+# Images are at most the screen size and about this many bytes once recompressed
+DEFAULT_IMAGE_BUDGET = 300 * 1024
+
+IMAGE_DIR = 'images'
+
+IMG_TAG = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+SRC_ATTRIBUTE = re.compile(r'''(\ssrc\s*=\s*)(?:"([^"]*)"|'([^']*)')''', re.IGNORECASE)
+# Responsive variants would point the reader back at the web
+SRCSET_ATTRIBUTE = re.compile(r'''\ssrcset\s*=\s*(?:"[^"]*"|'[^']*')''', re.IGNORECASE)
+
+def image_urls(content, base_url=None):
+    """Returns the absolute http(s) URLs of the <img> tags of a chapter body, in order and without repeats."""
+    urls = []
+    for tag in IMG_TAG.findall(content or ""):
+        url = _absolute_src(tag, base_url)
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+def image_href(url, media_type):
+    """Returns the path of an embedded image in the EPUB, the same for a URL in every export."""
+    return f"{IMAGE_DIR}/{hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]}.{extension_for(media_type)}"
+
+def rewrite_image_sources(content, hrefs, base_url=None):
+    """
+    Returns content with the src of every <img> whose URL is in hrefs pointing at the embedded image.
+    Images that could not be embedded keep their remote src.
+    """
+    def rewrite(match):
+        tag = match.group(0)
+        href = hrefs.get(_absolute_src(tag, base_url))
+        if not href:
+            return tag
+        tag = SRCSET_ATTRIBUTE.sub('', tag)
+        return SRC_ATTRIBUTE.sub(lambda src: f'{src.group(1)}"{href}"', tag, count=1)
+    return IMG_TAG.sub(rewrite, content or "")
+
+def _absolute_src(tag, base_url):
+    match = SRC_ATTRIBUTE.search(tag)
+    if not match:
+        return None
+    src = unescape((match.group(2) if match.group(2) is not None else match.group(3)).strip())
+    url = urljoin(base_url, src) if base_url else src
+    return url if url.startswith(('http://', 'https://')) else None
+
+class ImageStage:
+    def __init__(self, fetcher, workers=8, max_size=DEFAULT_COVER_SIZE, quality=DEFAULT_QUALITY,
+                 max_bytes=DEFAULT_IMAGE_BUDGET, lookahead=None):
+        """
+        :param fetcher: AssetFetcher that gets images from the cache or the network
+        :param workers: number of images fetched at once
+        :param max_size: (width, height) images are downscaled to fit in, None keeps their size
+        :param quality: JPEG quality of recompressed images
+        :param max_bytes: size budget of a recompressed image, None for no budget
+        :param lookahead: number of chapters whose images are fetched ahead of the one being written,
+                          defaults to four times workers
+        """
+        self.fetcher = fetcher
+        self.workers = max(1, workers)
+        self.max_size = max_size
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.lookahead = lookahead or self.workers * 4
+        # Images being fetched, and the href (None if it failed) of those already embedded
+        self.futures = {}
+        self.hrefs = {}
+        self.embedded = 0
+        self.failed = 0
+        self.bytes_saved = 0
+
+    def embed(self, chapters):
+        """
+        Yields (title, content, href, images) for every (title, content, href, base_url) of chapters,
+        in order. content has its image sources rewritten, and images lists the (href, data, media_type)
+        of the images the chapter shows for the first time, to add to the book along with it.
+        Chapters with None content, such as chapters already in the book, are passed through.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image')
+        try:
+            window = deque()
+            for chapter in chapters:
+                window.append(self._submit(executor, chapter))
+                if len(window) > self.lookahead:
+                    yield self._finish(*window.popleft())
+            while window:
+                yield self._finish(*window.popleft())
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if self.embedded or self.failed:
+                logger.info(f"Embedded {self.embedded} chapter images, {self.failed} could not be fetched, "
+                            f"recompression saved {self.bytes_saved // 1024} KB")
+
+    def _submit(self, executor, chapter):
+        title, content, href, base_url = chapter
+        urls = image_urls(content, base_url)
+        for url in urls:
+            if url not in self.futures and url not in self.hrefs:
+                self.futures[url] = executor.submit(self._fetch, url, base_url)
+        return title, content, href, base_url, urls
+
+    def _fetch(self, url, referer):
+        image = self.fetcher.get(url, referer=referer)
+        if not image:
+            return None
+        original, _ = image
+        data, media_type = fit_image(original, max_size=self.max_size, quality=self.quality,
+                                     max_bytes=self.max_bytes)
+        if not media_type:
+            logger.warning(f"Skipping {url}, which is not an image format EPUB readers support")
+            return None
+        return image_href(url, media_type), data, media_type, len(original) - len(data)
+
+    def _finish(self, title, content, chapter_href, base_url, urls):
+        images = []
+        for url in urls:
+            if url in self.hrefs:
+                continue
+            # The data is only kept until the first chapter showing the image has it
+            future = self.futures.pop(url)
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.warning(f"Failed to fetch image {url}: {str(e)}")
+                result = None
+            if not result:
+                self.hrefs[url] = None
+                self.failed += 1
+                continue
+            href, data, media_type, saved = result
+            self.hrefs[url] = href
+            images.append((href, data, media_type))
+            self.embedded += 1
+            self.bytes_saved += saved
+        hrefs = {url: self.hrefs[url] for url in urls if self.hrefs[url]}
+        if hrefs:
+            content = rewrite_image_sources(content, hrefs, base_url)
+        return title, content, chapter_href, images
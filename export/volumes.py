@@ -0,0 +1,120 @@
+"""
+volumes.py
+
+This module splits long novels into several EPUB volumes, by chapter count or
+by a byte budget, and builds the volumes in parallel worker processes. Every
+worker reads its range of chapters straight from the cache and writes its
+volume with the streaming exporter, so each volume has its own table of
+contents and export time goes down with the number of cores.
+"""
+
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cache.novel_cache import NovelCache
+from fetch.assets import AssetFetcher
+from fetch.http_session import HttpSession
+from .epub_stream import StreamingEpubWriter, with_placeholders
+from .inline_images import ImageStage
+
+logger = logging.getLogger(__name__)
+
+def plan_volumes(total_chapters, sizes, max_chapters=None, max_bytes=None):
+    """
+    Returns the (start, end) position ranges of the volumes, end excluded. A volume gets at most
+    max_chapters chapters and, unless a single chapter is larger, at most max_bytes of chapter text.
+    :param sizes: {position: size in bytes} of the cached chapters. Missing chapters count as empty.
+    """
+    volumes = []
+    start, volume_bytes = 0, 0
+    for position in range(total_chapters):
+        size = sizes.get(position) or 0
+        full = max_chapters and position - start >= max_chapters
+        over_budget = max_bytes and volume_bytes + size > max_bytes
+        if position > start and (full or over_budget):
+            volumes.append((start, position))
+            start, volume_bytes = position, 0
+        volume_bytes += size
+    if total_chapters > start:
+        volumes.append((start, total_chapters))
+    return volumes
+
+def volume_number_width(volume_count):
+    return max(2, len(str(volume_count)))
+
+def volume_title(title, number, volume_count):
+    return f"{title} - Volume {number:0{volume_number_width(volume_count)}d}"
+
+def volume_file_name(title, number, volume_count, start, end):
+    """Returns the file name of a volume, which sorts in reading order and names its chapter range."""
+    filename = f"{volume_title(title, number, volume_count)} - Chapters {start + 1}-{end}.epub"
+    return re.sub(r'[^\w\-_\. ]', '_', filename)  # Replace invalid filename characters
+
+def build_volume(job):
+    """
+    Writes one volume from the cache and returns (path, chapters written, seconds taken).
+    Runs in a worker process, so job is a dict of plain values, see NovelDownloader.save_novel_as_volumes.
+    """
+    start_time = time.perf_counter()
+    cache = NovelCache(job['title'], cache_dir=job['cache_dir'], series_id=job['series_id'])
+    http_session = None
+    written = 0
+    try:
+        novel_info = dict(job['novel_info'], title=job['volume_title'])
+        chapters = with_placeholders(cache.iter_chapters(max_position=job['end'], min_position=job['start']),
+                                     job['placeholders'])
+        if job['image_workers']:
+            # Images the parent could not hand over are fetched with its cookies, or left as links
+            if job['http_state']:
+                http_session = HttpSession(proxy=job['http_state']['proxy'])
+                http_session.restore_state(job['http_state'])
+            stage = ImageStage(AssetFetcher(cache, http_session=http_session), workers=job['image_workers'],
+                               max_size=job['image_size'], quality=job['image_quality'],
+                               max_bytes=job['image_budget'])
+            chapters = stage.embed(chapters)
+        else:
+            chapters = ((title, content, href, []) for title, content, href, _ in chapters)
+
+        with StreamingEpubWriter(job['path'], novel_info) as writer:
+            if job['cover']:
+                data, file_name, media_type = job['cover']
+                writer.add_cover(data, file_name=file_name, media_type=media_type)
+            writer.add_info_page()
+            for title, content, href, images in chapters:
+                for image_href, data, media_type in images:
+                    writer.add_item(image_href, data, media_type)
+                writer.add_chapter(title, content, href)
+                written += 1
+    finally:
+        cache.close()
+        if http_session:
+            http_session.close()
+    return job['path'], written, time.perf_counter() - start_time
+
+def build_volumes(jobs, workers=None):
+    """
+    Builds the volumes of jobs on up to workers processes, defaulting to the number of cores,
+    and yields the build_volume result of each volume as it is finished.
+    """
+    workers = min(len(jobs), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        for job in jobs:
+            yield build_volume(job)
+        return
+
+    logger.info(f"Building {len(jobs)} volumes on {workers} worker processes")
+    # The parent runs browser and fetch threads, which a forked child would inherit in an unknown state
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(build_volume, job) for job in jobs]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
@@ -0,0 +1,89 @@
+"""
+assets.py
+
+This module fetches binary files such as cover images into memory and keeps
+them in the novel cache under their URL, so exporting a novel again does not
+touch the network. Files are fetched through the HTTP fast path when it is
+enabled, and otherwise read straight out of a browser tab, without going
+through the download manager or the working directory.
+"""
+
+import logging
+import threading
+
+from export.images import sniff_media_type
+from report.metrics import host_of, metrics
+
+logger = logging.getLogger(__name__)
+
+class AssetFetcher:
+    def __init__(self, cache, http_session=None, page=None, cf_bypasser=None, lean_profile=None, timeout=15):
+        """
+        :param cache: NovelCache the files are stored in
+        :param http_session: HttpSession of the fast path, None to always use the browser
+        :param page: browser tab used when the fast path is unavailable or fails
+        :param cf_bypasser: CloudflareBypasser of page
+        :param lean_profile: LeanProfile of the browser, which lets the fetched URLs through
+        :param timeout: seconds to wait for the browser to load a file
+        """
+        self.cache = cache
+        self.http_session = http_session
+        self.page = page
+        self.cf_bypasser = cf_bypasser
+        self.lean_profile = lean_profile
+        self.timeout = timeout
+        # The tab can only show one file at a time
+        self._browser_lock = threading.Lock()
+
+    def get(self, url, referer=None):
+        """
+        Returns (data, media_type) of the file at url, from the cache if it was fetched before,
+        or None when it could not be fetched.
+        """
+        cached = self.cache.get_asset(url)
+        if cached:
+            data, media_type = cached
+            return data, media_type or sniff_media_type(data)
+
+        result = self._fetch_http(url, referer) or self._fetch_browser(url)
+        if not result:
+            return None
+        data, media_type = result
+        self.cache.cache_asset(url, data, media_type)
+        return data, media_type
+
+    def _fetch_http(self, url, referer=None):
+        if not self.http_session:
+            return None
+        result = self.http_session.get_bytes(url, referer=referer)
+        if not result:
+            return None
+        data, content_type = result
+        media_type = sniff_media_type(data, content_type)
+        if not media_type or not media_type.startswith('image/'):
+            logger.warning(f"Expected an image at {url} but got {content_type or 'unknown content'}")
+            return None
+        return data, media_type
+
+    def _fetch_browser(self, url):
+        if not self.page:
+            return None
+        with self._browser_lock:
+            try:
+                if self.lean_profile:
+                    self.lean_profile.allow(url)
+                with metrics.span('asset_fetch', host_of(url)):
+                    self.page.get(url)
+                    if self.cf_bypasser:
+                        self.cf_bypasser.bypass()
+                    # Chrome shows a file it opens directly in an <img>, whose loaded bytes CDP hands back
+                    image = self.page.ele('tag:img', timeout=self.timeout)
+                    data = image.get_src(timeout=self.timeout) if image else None
+            except Exception as e:
+                logger.warning(f"Failed to fetch {url} through the browser: {str(e)}")
+                return None
+        if not isinstance(data, bytes) or not data:
+            logger.warning(f"The browser returned no image for {url}")
+            return None
+        metrics.count('bytes_fetched', host_of(url), len(data))
+        return data, sniff_media_type(data)
@@ -0,0 +1,96 @@
+"""
+async_engine.py
+
+This module provides an asyncio fetch layer for the translation sites.
+Requests share one keep-alive connection pool and are limited per host by a
+semaphore, so a slow site only queues its own requests while downloads from
+other sites keep going in the same process. Code running on plain threads,
+like the tab workers, goes through the engine's own event loop with fetch_sync.
+"""
+
+import asyncio
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from .http_session import HttpSession
+
+logger = logging.getLogger(__name__)
+
+class AsyncFetchEngine:
+    def __init__(self, http_session=None, per_host_limit=4, max_connections=32):
+        """
+        :param http_session: HttpSession whose connection pool and cookies are shared by all requests.
+                             Requests then wait for its browser clearance cookies, like HttpSession.get.
+                             Without it the engine opens its own session, which does not wait.
+        :param per_host_limit: maximum number of requests in flight per host
+        :param max_connections: maximum number of requests in flight overall
+        """
+        self._owns_session = http_session is None
+        self.http_session = http_session or HttpSession(pool_size=per_host_limit)
+        self._request = self.http_session.request if self._owns_session else self.http_session.get
+        self.per_host_limit = per_host_limit
+        # Semaphores belong to the event loop they were created in, so every loop gets its own
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="fetch")
+        # The browser can only drive one navigation at a time, so fallbacks are serialized
+        self._browser_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="browser")
+        self._loop = None
+        self._loop_thread = None
+
+    def _semaphore(self, url):
+        loop = asyncio.get_running_loop()
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphores = self._semaphores.setdefault(loop, {})
+            if host not in semaphores:
+                semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+            return semaphores[host]
+
+    async def fetch(self, url):
+        """Returns the HTML of url, or None if the request failed or hit a Cloudflare challenge."""
+        async with self._semaphore(url):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._request, url)
+
+    async def fetch_all(self, urls):
+        """Fetches urls concurrently and returns their HTML in input order."""
+        return await asyncio.gather(*(self.fetch(url) for url in urls))
+
+    async def run_in_browser(self, func, *args):
+        """Runs a blocking browser call without stalling the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._browser_executor, func, *args)
+
+    def fetch_sync(self, url):
+        """Like fetch, for callers outside an event loop. Blocks until the engine's own loop has fetched url."""
+        return asyncio.run_coroutine_threadsafe(self.fetch(url), self._background_loop()).result()
+
+    def _background_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name="fetch-loop", daemon=True)
+                self._loop_thread.start()
+            return self._loop
+
+    def close(self):
+        with self._lock:
+            loop, thread, self._loop, self._loop_thread = self._loop, self._loop_thread, None, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        self._executor.shutdown(wait=True)
+        self._browser_executor.shutdown(wait=True)
+        if self._owns_session:
+            self.http_session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
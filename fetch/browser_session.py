@@ -0,0 +1,91 @@
+"""
+browser_session.py
+
+This module holds the browser and everything else that outlives a single novel:
+the HTTP fast path, the post-processing pool, the lean profile and the
+NovelUpdates login. One BrowserSession can serve many NovelDownloader
+instances, each working in its own tab, so a batch of novels shares one warm
+browser instead of launching Chromium per novel.
+"""
+
+import logging
+import threading
+
+from DrissionPage import ChromiumPage
+
+from CloudflareBypasser import bypass_stats
+from fetch.async_engine import AsyncFetchEngine
+from fetch.http_session import HttpSession
+from fetch.lean_profile import LeanProfile, make_chromium_options, unmask_headless
+from fetch.readiness import wait_stats
+from report.metrics import metrics
+from source.postprocess import ChapterPostProcessor
+
+logger = logging.getLogger(__name__)
+
+class BrowserSession:
+    def __init__(self, http_fast_path=True, parse_workers=None, lean=False, headless=False, pool_size=10,
+                 proxy=None):
+        """
+        :param http_fast_path: reuse browser cookies in a keep-alive HTTP client for static pages
+        :param parse_workers: processes parsing chapter pages, see ChapterPostProcessor
+        :param lean: block images, fonts, stylesheets and trackers in every tab
+        :param headless: run the browser without a window
+        :param pool_size: keep-alive connections per host of the HTTP fast path
+        :param proxy: URL of a replay.server stand-in that every request goes through
+        """
+        self.browser = ChromiumPage(make_chromium_options(headless, proxy))
+        if proxy:
+            # DrissionPage's download manager is a separate HTTP client
+            self.browser.download.set.proxies(http=proxy, https=proxy)
+            self.browser.download.session.verify = False
+            self.browser.download.session.trust_env = False
+        self.headless = headless
+        self.lean_profile = LeanProfile() if lean else None
+        self.http_session = HttpSession(pool_size=pool_size, proxy=proxy) if http_fast_path else None
+        # Every novel of the session fetches through one engine, so the per-host limits hold across novels
+        self.fetch_engine = AsyncFetchEngine(self.http_session, per_host_limit=pool_size) if http_fast_path else None
+        self.postprocessor = ChapterPostProcessor(parse_workers)
+        # Login cookies live in the browser, so a login in one tab holds for every tab
+        self.nu_logged_in = False
+        self.login_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.setup_tab(self.browser)
+
+    def setup_tab(self, tab):
+        """Applies the headless and lean settings to a tab opened in this browser."""
+        if self.headless:
+            unmask_headless(tab)
+        if self.lean_profile:
+            self.lean_profile.apply(tab)
+        return tab
+
+    def open_tab(self):
+        with self._lock:
+            tab = self.browser.get_tab(self.browser.new_tab())
+        return self.setup_tab(tab)
+
+    def close_tab(self, tab):
+        try:
+            self.browser.close_tabs(tab.tab_id)
+        except Exception as e:
+            logger.warning(f"Failed to close tab: {str(e)}")
+
+    def log_summary(self):
+        metrics.log_summary()
+        wait_stats.log_summary()
+        bypass_stats.log_summary()
+        if self.lean_profile:
+            self.lean_profile.log_summary()
+
+    def close(self):
+        """Stops the parse pool and the HTTP fast path and quits the browser, which the session launched."""
+        self.postprocessor.close()
+        if self.fetch_engine:
+            self.fetch_engine.close()
+        if self.http_session:
+            self.http_session.close()
+        try:
+            self.browser.quit()
+        except Exception as e:
+            logger.warning(f"Failed to quit the browser: {str(e)}")
@@ -0,0 +1,229 @@
+"""
+http_session.py
+
+This module provides a browser-free HTTP fast path for static pages.
+Once the browser has passed a Cloudflare check, the clearance cookie, the other
+session cookies and the user agent are copied into a pooled keep-alive
+requests session, and further pages are fetched without rendering them.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from report.metrics import host_of, metrics
+
+logger = logging.getLogger(__name__)
+
+# Markers of a Cloudflare interstitial in the response body
+CHALLENGE_MARKERS = (
+    '<title>just a moment...</title>',
+    'challenges.cloudflare.com',
+    '_cf_chl_opt',
+    'cf-browser-verification',
+)
+
+def is_challenge_response(status_code, headers, text):
+    """Returns True when an HTTP response looks like a Cloudflare challenge page."""
+    if headers.get('cf-mitigated', '').lower() == 'challenge':
+        return True
+    if status_code in (403, 429, 503):
+        head = text[:4096].lower()
+        return any(marker in head for marker in CHALLENGE_MARKERS)
+    return False
+
+class HttpSession:
+    def __init__(self, pool_size=10, timeout=30, max_challenges=3, proxy=None):
+        """
+        :param pool_size: number of keep-alive connections kept per host
+        :param timeout: request timeout in seconds
+        :param max_challenges: consecutive challenge responses after which the fast path is disabled
+        :param proxy: URL of the replay stand-in proxy, whose intercepting certificate is then accepted
+        """
+        self.session = requests.Session()
+        self.proxy = proxy
+        if proxy:
+            self.session.proxies = {'http': proxy, 'https': proxy}
+            self.session.verify = False
+            # Otherwise a CA bundle set in the environment takes precedence over verify
+            self.session.trust_env = False
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.timeout = timeout
+        self.max_challenges = max_challenges
+        self.ready = False
+        self.disabled = False
+        self._challenges = 0
+        self._lock = threading.Lock()
+
+    def harvest(self, page):
+        """Copies the cookies and user agent of a browser page that has passed the Cloudflare check."""
+        try:
+            cookies = page.get_cookies(all_domains=True, all_info=True)
+            user_agent = page.user_agent
+        except Exception as e:
+            logger.warning(f"Failed to harvest browser cookies: {str(e)}")
+            return False
+
+        with self._lock:
+            for cookie in cookies:
+                self.session.cookies.set(
+                    cookie['name'], cookie['value'],
+                    domain=cookie.get('domain', ''), path=cookie.get('path', '/')
+                )
+            self.session.headers['User-Agent'] = user_agent
+            if not self.ready and any(cookie['name'] == 'cf_clearance' for cookie in cookies):
+                logger.info("Harvested Cloudflare clearance cookie. Using HTTP fast path for static pages.")
+            self.ready = True
+        return True
+
+    def get(self, url):
+        """
+        Returns the HTML of url, or None when the fast path is unavailable, the request
+        fails, or the response looks like a Cloudflare challenge. Callers should fall
+        back to the browser on None.
+        """
+        if not self.ready or self.disabled:
+            return None
+        return self.request(url)
+
+    def request(self, url):
+        """Like get, but does not wait for harvested clearance cookies."""
+        site = host_of(url)
+        try:
+            with metrics.span('http_fetch', site):
+                response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning(f"HTTP fast path failed for {url}: {str(e)}")
+            return None
+        metrics.count('bytes_fetched', site, len(response.content))
+
+        if is_challenge_response(response.status_code, response.headers, response.text):
+            self._record_challenge()
+            return None
+
+        if response.status_code >= 400:
+            logger.warning(f"HTTP fast path got status {response.status_code} for {url}")
+            return None
+
+        with self._lock:
+            self._challenges = 0
+        return response.text
+
+    def get_bytes(self, url, referer=None):
+        """
+        Returns (content, content_type) of a binary file such as an image, or None when the fast
+        path is disabled, the request fails or the server answers with a page instead of the file.
+        Like request, it does not wait for harvested clearance cookies, since image hosts rarely
+        sit behind a challenge.
+        """
+        if self.disabled:
+            return None
+        site = host_of(url)
+        headers = {'Referer': referer} if referer else {}
+        try:
+            with metrics.span('asset_fetch', site):
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning(f"HTTP fast path failed for {url}: {str(e)}")
+            return None
+        metrics.count('bytes_fetched', site, len(response.content))
+
+        content_type = response.headers.get('Content-Type', '')
+        if content_type.startswith('text/html'):
+            if is_challenge_response(response.status_code, response.headers, response.text):
+                self._record_challenge()
+            return None
+        if response.status_code >= 400 or not response.content:
+            logger.warning(f"HTTP fast path got status {response.status_code} for {url}")
+            return None
+        return response.content, content_type or None
+
+    def _record_challenge(self):
+        with self._lock:
+            self._challenges += 1
+            if self._challenges >= self.max_challenges and not self.disabled:
+                logger.warning("HTTP fast path keeps receiving Cloudflare challenges. Falling back to the browser.")
+                self.disabled = True
+
+    def probe(self, url, etag=None, last_modified=None):
+        """
+        Sends a conditional HEAD request for url with the validators of an earlier response.
+        Returns (modified, etag, last_modified), where modified is False only when the server
+        answered 304 Not Modified, or None when the fast path is unavailable or the request fails.
+        """
+        if not self.ready or self.disabled:
+            return None
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        try:
+            response = self.session.head(url, headers=headers, timeout=self.timeout, allow_redirects=True)
+        except requests.RequestException as e:
+            logger.warning(f"Failed to probe {url}: {str(e)}")
+            return None
+
+        if is_challenge_response(response.status_code, response.headers, ''):
+            self._record_challenge()
+            return None
+        if response.status_code == 304:
+            return False, response.headers.get('ETag', etag), response.headers.get('Last-Modified', last_modified)
+        if response.status_code >= 400:
+            return None
+        return True, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+    def resolve_redirect(self, url):
+        """
+        Returns the URL that url redirects to, read from the Location header without
+        following it, or None when the fast path is unavailable or url does not redirect.
+        """
+        if not self.ready or self.disabled:
+            return None
+        try:
+            with metrics.span('redirect_resolve', host_of(url)):
+                response = self.session.get(url, timeout=self.timeout, allow_redirects=False, stream=True)
+        except requests.RequestException as e:
+            logger.warning(f"Failed to resolve redirect of {url}: {str(e)}")
+            return None
+
+        with response:
+            location = response.headers.get('Location')
+            if response.is_redirect and location:
+                return urljoin(url, location)
+            if is_challenge_response(response.status_code, response.headers, ''):
+                self._record_challenge()
+            return None
+
+    def resolve_redirects(self, urls, workers=8):
+        """Resolves many redirects in parallel and returns {url: target} for those that resolved."""
+        if not self.ready or self.disabled or not urls:
+            return {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            targets = executor.map(self.resolve_redirect, urls)
+            return {url: target for url, target in zip(urls, targets) if target}
+
+    def export_state(self):
+        """Returns the proxy, cookies and user agent of the session, for restore_state in a worker process."""
+        with self._lock:
+            return {'proxy': self.proxy, 'cookies': self.session.cookies.copy(),
+                    'user_agent': self.session.headers.get('User-Agent'), 'ready': self.ready}
+
+    def restore_state(self, state):
+        """Continues a session from the export_state of another one. The proxy is set by the constructor."""
+        with self._lock:
+            self.session.cookies.update(state['cookies'])
+            if state['user_agent']:
+                self.session.headers['User-Agent'] = state['user_agent']
+            self.ready = state['ready']
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,118 @@
+"""
+lean_profile.py
+
+This module trims the browser down to what the scrapers read: the HTML.
+In lean mode, images, web fonts, stylesheets and media are failed before they
+hit the network, and known ad and tracker hosts are blocked outright. The
+Cloudflare challenge platform and explicitly allowed URLs, such as the cover
+image, are always let through. The browser can also be started headless.
+"""
+
+import logging
+import threading
+from functools import partial
+from urllib.parse import urlparse
+
+from DrissionPage import ChromiumOptions
+
+logger = logging.getLogger(__name__)
+
+# Resource types paused through the Fetch domain and failed unless they are allowed
+BLOCKED_RESOURCE_TYPES = ('Image', 'Font', 'Stylesheet', 'Media')
+
+# Ad and tracker hosts, blocked for every resource type with Network.setBlockedURLs
+TRACKER_URL_PATTERNS = [
+    '*googletagmanager.com*',
+    '*google-analytics.com*',
+    '*googlesyndication.com*',
+    '*googleadservices.com*',
+    '*doubleclick.net*',
+    '*adservice.google.*',
+    '*amazon-adsystem.com*',
+    '*connect.facebook.net*',
+    '*scorecardresearch.com*',
+    '*quantserve.com*',
+    '*adnxs.com*',
+    '*pubmatic.com*',
+    '*rubiconproject.com*',
+    '*taboola.com*',
+    '*outbrain.com*',
+    '*criteo.com*',
+    '*hotjar.com*',
+    '*clarity.ms*',
+    '*disqus.com*',
+]
+
+# Cloudflare challenges must keep working, whatever they load
+ALLOWED_HOSTS = ('challenges.cloudflare.com',)
+ALLOWED_PATH_PREFIXES = ('/cdn-cgi/',)
+
+def make_chromium_options(headless=False, proxy=None):
+    """
+    Returns the ChromiumOptions the downloader starts the browser with.
+    :param proxy: URL of the replay stand-in proxy, whose intercepting certificate is then accepted
+    """
+    options = ChromiumOptions()
+    if headless:
+        options.set_headless(True)
+    if proxy:
+        options.set_proxy(proxy)
+        options.set_argument('--ignore-certificate-errors')
+    return options
+
+def unmask_headless(page):
+    """Removes the HeadlessChrome token that headless Chrome puts in the user agent, which Cloudflare flags."""
+    user_agent = page.user_agent
+    if 'HeadlessChrome' in user_agent:
+        page.set.user_agent(user_agent.replace('HeadlessChrome', 'Chrome'))
+    return page
+
+class LeanProfile:
+    def __init__(self):
+        self.allowed_urls = set()
+        self._lock = threading.Lock()
+        self.blocked = {}
+
+    def allow(self, url):
+        """Lets url through even if its resource type is blocked, e.g. the cover image."""
+        self.allowed_urls.add(url)
+
+    def is_allowed(self, url):
+        if url in self.allowed_urls:
+            return True
+        parsed = urlparse(url)
+        return parsed.netloc in ALLOWED_HOSTS or parsed.path.startswith(ALLOWED_PATH_PREFIXES)
+
+    def apply(self, page):
+        """Enables request blocking on a page or tab. Blocking lasts until the tab is closed."""
+        page.run_cdp('Network.enable')
+        page.run_cdp('Network.setBlockedURLs', urls=TRACKER_URL_PATTERNS)
+        page.driver.set_listener('Fetch.requestPaused', partial(self._on_request_paused, page))
+        page.run_cdp('Fetch.enable', patterns=[
+            {'urlPattern': '*', 'resourceType': resource_type, 'requestStage': 'Request'}
+            for resource_type in BLOCKED_RESOURCE_TYPES
+        ])
+        logger.debug(f"Lean fetch enabled, blocking {', '.join(BLOCKED_RESOURCE_TYPES)} and trackers")
+        return page
+
+    def _on_request_paused(self, page, **event):
+        # Called on the DevTools event thread. Every paused request must be answered or it hangs.
+        request_id = event['requestId']
+        url = event['request']['url']
+        try:
+            if self.is_allowed(url):
+                page.run_cdp('Fetch.continueRequest', requestId=request_id)
+            else:
+                page.run_cdp('Fetch.failRequest', requestId=request_id, errorReason='BlockedByClient')
+                with self._lock:
+                    resource_type = event.get('resourceType', 'Other')
+                    self.blocked[resource_type] = self.blocked.get(resource_type, 0) + 1
+        except Exception as e:
+            logger.debug(f"Could not answer paused request {url}: {str(e)}")
+
+    def log_summary(self):
+        with self._lock:
+            blocked = dict(self.blocked)
+        if blocked:
+            details = ', '.join(f"{count} {resource_type}" for resource_type, count in sorted(blocked.items()))
+            logger.info(f"Lean fetch blocked {sum(blocked.values())} requests ({details})")
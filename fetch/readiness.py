@@ -0,0 +1,149 @@
+"""
+readiness.py
+
+This module replaces fixed sleeps with waits that return as soon as a page is ready.
+A wait ends on DOM-ready, when an element appears, when the URL reaches
+the expected site or when the network goes idle, and gives up after a
+configurable timeout. Every wait is timed per site in wait_stats, so the
+latency each site actually needs can be compared with the old fixed delays.
+"""
+
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from report.metrics import latency_summary
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds. A wait normally returns long before reaching them.
+DEFAULT_TIMEOUTS = {
+    'dom_ready': 15,
+    'element': 15,
+    'url': 15,
+    'network_idle': 10,
+    'challenge': 2,
+}
+
+POLL_INTERVAL = 0.1
+
+# Number of resources the page has started loading, used to detect network idle
+RESOURCE_COUNT_JS = "return performance.getEntriesByType('resource').length;"
+
+def set_default_timeouts(**timeouts):
+    """Changes the default timeout of some kinds of wait, e.g. set_default_timeouts(element=30)."""
+    for name, value in timeouts.items():
+        if name not in DEFAULT_TIMEOUTS:
+            raise ValueError(f"Unknown wait '{name}'")
+        DEFAULT_TIMEOUTS[name] = value
+
+class WaitStats:
+    """Thread-safe record of how long each kind of wait took, per site."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waits = {}
+
+    def record(self, site, name, elapsed, ready):
+        with self._lock:
+            self._waits.setdefault((site, name), []).append((elapsed, ready))
+
+    def summary(self):
+        """Returns {(site, wait): {count, timeouts, mean, p50, p95, max, total}} with times in seconds."""
+        with self._lock:
+            waits = {key: list(values) for key, values in self._waits.items()}
+
+        summary = {}
+        for key, values in waits.items():
+            summary[key] = latency_summary([elapsed for elapsed, _ in values])
+            summary[key]['timeouts'] = sum(1 for _, ready in values if not ready)
+        return summary
+
+    def log_summary(self):
+        for (site, name), stats in sorted(self.summary().items()):
+            logger.info(f"Wait '{name}' on {site}: {stats['count']} waits, mean {stats['mean']:.2f}s, "
+                        f"p95 {stats['p95']:.2f}s, max {stats['max']:.2f}s, {stats['timeouts']} timed out")
+
+    def reset(self):
+        with self._lock:
+            self._waits.clear()
+
+wait_stats = WaitStats()
+
+class PageReadiness:
+    def __init__(self, page, site=None, stats=None):
+        """
+        :param page: ChromiumPage or tab to wait on
+        :param site: name the waits are recorded under, defaults to the host of the current URL
+        :param stats: WaitStats to record into, defaults to the module-wide wait_stats
+        """
+        self.page = page
+        self.site = site
+        self.stats = stats or wait_stats
+
+    def _site(self):
+        if self.site:
+            return self.site
+        try:
+            return urlparse(self.page.url).netloc or 'unknown'
+        except Exception:
+            return 'unknown'
+
+    def _timed(self, name, wait):
+        start = time.perf_counter()
+        try:
+            ready = bool(wait())
+        except Exception as e:
+            logger.warning(f"Error while waiting for {name}: {str(e)}")
+            ready = False
+        elapsed = time.perf_counter() - start
+        self.stats.record(self._site(), name, elapsed, ready)
+        logger.debug(f"Wait '{name}' {'ready' if ready else 'timed out'} after {elapsed:.2f}s")
+        return ready
+
+    def until(self, name, condition, timeout=None, kind='element'):
+        """Polls condition() until it is truthy. Returns False when timeout runs out."""
+        timeout = DEFAULT_TIMEOUTS[kind] if timeout is None else timeout
+
+        def poll():
+            deadline = time.perf_counter() + timeout
+            while True:
+                try:
+                    if condition():
+                        return True
+                except Exception as e:
+                    logger.debug(f"Condition '{name}' raised: {str(e)}")
+                if time.perf_counter() >= deadline:
+                    return False
+                time.sleep(POLL_INTERVAL)
+
+        return self._timed(name, poll)
+
+    def dom_ready(self, timeout=None):
+        """Waits for the current document to finish loading."""
+        timeout = DEFAULT_TIMEOUTS['dom_ready'] if timeout is None else timeout
+        return self._timed('dom_ready', lambda: self.page.wait.load_complete(timeout=timeout))
+
+    def element(self, locator, timeout=None):
+        """Waits for an element matching the DrissionPage locator to appear in the DOM."""
+        timeout = DEFAULT_TIMEOUTS['element'] if timeout is None else timeout
+        return self._timed(f"element {locator}", lambda: self.page.ele(locator, timeout=timeout))
+
+    def url_contains(self, fragment, timeout=None):
+        """Waits for redirects to land on a URL containing fragment."""
+        return self.until(f"url {fragment}", lambda: fragment in self.page.url, timeout, kind='url')
+
+    def network_idle(self, idle_time=0.5, timeout=None):
+        """Waits until the page has started no new request for idle_time seconds."""
+        state = {'count': -1, 'since': time.perf_counter()}
+
+        def idle():
+            count = self.page.run_js(RESOURCE_COUNT_JS)
+            now = time.perf_counter()
+            if count != state['count']:
+                state['count'], state['since'] = count, now
+                return False
+            return now - state['since'] >= idle_time
+
+        return self.until('network_idle', idle, timeout, kind='network_idle')
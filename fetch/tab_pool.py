@@ -0,0 +1,97 @@
+"""
+tab_pool.py
+
+This module provides a pool of browser tabs for fetching chapters in parallel.
+Every tab gets its own CloudflareBypasser, and work is handed out to whichever
+tab is idle while results are returned in the order they were submitted.
+Only a few items per tab are handed out ahead of the results that were read.
+"""
+
+import logging
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from CloudflareBypasser import CloudflareBypasser
+
+logger = logging.getLogger(__name__)
+
+class TabPool:
+    # Items submitted per tab ahead of the results that were read, so a tab never waits for the reader
+    PREFETCH_PER_TAB = 2
+
+    def __init__(self, page, cf_bypasser, size=1, factory=None, setup=None, browser=None):
+        """
+        :param page: ChromiumPage that owns the tabs. It is used as the first slot.
+        :param cf_bypasser: CloudflareBypasser already bound to page
+        :param size: number of tabs in the pool
+        :param factory: optional callable(tab, cf_bypasser) building the object handed to workers,
+                        e.g. a TranslationSite class. Defaults to the (tab, cf_bypasser) pair.
+        :param setup: optional callable(tab) run on every tab the pool opens, e.g. to enable request blocking
+        :param browser: ChromiumPage the extra tabs are opened from, when page is itself a tab. Defaults to page.
+        """
+        self.page = page
+        self.browser = browser or page
+        self.size = max(1, int(size))
+        self.factory = factory or (lambda tab, bypasser: (tab, bypasser))
+        self._tab_ids = []
+        self._idle = queue.Queue()
+        self._idle.put(self.factory(page, cf_bypasser))
+
+        for _ in range(self.size - 1):
+            tab_id = self.browser.new_tab()
+            self._tab_ids.append(tab_id)
+            tab = self.browser.get_tab(tab_id)
+            if setup:
+                setup(tab)
+            self._idle.put(self.factory(tab, CloudflareBypasser(tab)))
+
+        logger.info(f"Opened tab pool with {self.size} tab(s)")
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="tab")
+
+    def _run(self, func, item):
+        slot = self._idle.get()
+        try:
+            return func(slot, item)
+        finally:
+            self._idle.put(slot)
+
+    def map(self, func, items):
+        """
+        Runs func(slot, item) for items and returns an iterator yielding the results in input order.
+        Items are submitted lazily, at most PREFETCH_PER_TAB per tab ahead of the results read so far,
+        so when the reader stops, e.g. at a paywall or on an error, only that window was fetched.
+        Exceptions raised by func are re-raised when the corresponding result is reached.
+        """
+        window = self.size * self.PREFETCH_PER_TAB
+        items = iter(items)
+        futures = deque()
+
+        def results():
+            try:
+                for item in items:
+                    futures.append(self._executor.submit(self._run, func, item))
+                    if len(futures) >= window:
+                        yield futures.popleft().result()
+                while futures:
+                    yield futures.popleft().result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        return results()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if self._tab_ids:
+            try:
+                self.browser.close_tabs(self._tab_ids)
+            except Exception as e:
+                logger.warning(f"Failed to close pool tabs: {str(e)}")
+            self._tab_ids = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
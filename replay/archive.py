@@ -0,0 +1,105 @@
+"""
+archive.py
+
+This module stores the HTTP responses of a recorded run in a SQLite file, so the
+run can be replayed later without network access. Responses are keyed by
+method, URL and a hash of the request body, since the NovelUpdates chapter list
+is a POST whose body names the series. Cloudflare interstitials are kept apart
+from the page they guarded, so a replay serves the page and injects challenges
+on its own terms.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+def body_hash(body):
+    return hashlib.sha1(body).hexdigest() if body else ''
+
+def without_query(url):
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+
+class Archive:
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    method TEXT,
+                    url TEXT,
+                    body_hash TEXT,
+                    challenge INTEGER,
+                    status INTEGER,
+                    headers TEXT,
+                    body BLOB,
+                    recorded_at REAL,
+                    PRIMARY KEY (method, url, body_hash, challenge)
+                )
+            ''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS responses_path ON responses (method, url)')
+            self.connection.commit()
+
+    def record(self, method, url, request_body, status, headers, body, challenge=False):
+        """
+        Stores a response, replacing an earlier one for the same request.
+        :param headers: list of (name, value) pairs, repeated names such as Set-Cookie included
+        """
+        with self._lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (method, url, body_hash(request_body), int(challenge), status, json.dumps(headers), body, time.time())
+            )
+            self.connection.commit()
+
+    def lookup(self, method, url, request_body=None):
+        """
+        Returns (status, headers, body, challenge) for a request, or None when it was not recorded.
+        The page is preferred over a recorded challenge for it. A URL whose query string differs,
+        e.g. a cache buster, falls back to a response recorded for the same path.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT status, headers, body, challenge FROM responses WHERE method = ? AND url = ? '
+                'AND body_hash = ? ORDER BY challenge LIMIT 1',
+                (method, url, body_hash(request_body))
+            ).fetchone()
+            if row is None:
+                row = self.connection.execute(
+                    'SELECT status, headers, body, challenge FROM responses WHERE method = ? AND url = ? '
+                    'ORDER BY challenge, recorded_at DESC LIMIT 1',
+                    (method, url)
+                ).fetchone()
+            if row is None and urlsplit(url).query:
+                base = without_query(url)
+                row = self.connection.execute(
+                    'SELECT status, headers, body, challenge FROM responses WHERE method = ? '
+                    'AND (url = ? OR substr(url, 1, ?) = ?) ORDER BY challenge, recorded_at DESC LIMIT 1',
+                    (method, base, len(base) + 1, base + '?')
+                ).fetchone()
+        if row is None:
+            return None
+        status, headers, body, challenge = row
+        return status, [tuple(header) for header in json.loads(headers)], body, bool(challenge)
+
+    def summary(self):
+        """Returns the number of recorded responses and challenges per host."""
+        with self._lock:
+            rows = self.connection.execute('SELECT url, challenge FROM responses').fetchall()
+        hosts = {}
+        for url, challenge in rows:
+            stats = hosts.setdefault(urlsplit(url).netloc, {'responses': 0, 'challenges': 0})
+            stats['challenges' if challenge else 'responses'] += 1
+        return hosts
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
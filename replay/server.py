@@ -0,0 +1,339 @@
+"""
+server.py
+
+This module provides the local stand-in for the sites a run talks to. It is an
+HTTP proxy that the browser, the HTTP fast path and the cover download are all
+pointed at. HTTPS is intercepted with a self-signed certificate, which the
+browser is told to accept.
+
+In record mode every request is forwarded to the real site, and the response
+is stored in an Archive: the NovelUpdates pages, the extnu redirects, chapter
+pages, the cover image and the Cloudflare interstitials alike. In replay mode
+the responses come from the archive alone, after a configurable latency, and a
+share of the page loads is answered with a stand-in Cloudflare challenge that
+clears itself after a delay. A run can then be repeated offline and
+deterministically while concurrency, waits and caching are tuned.
+
+Usage:
+    python -m replay.server ARCHIVE [--port PORT] [--record] [--latency S] [--jitter S]
+                                    [--challenge-rate R] [--challenge-delay S]
+"""
+
+import argparse
+import io
+import logging
+import os
+import random
+import ssl
+import subprocess
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from fetch.http_session import is_challenge_response
+from replay.archive import Archive
+
+logger = logging.getLogger(__name__)
+
+# Headers that belong to one connection and are not forwarded or replayed. The body is stored
+# decoded, so its original encoding and length do not apply to it either.
+SKIPPED_HEADERS = (
+    'connection', 'keep-alive', 'proxy-connection', 'proxy-authorization', 'te', 'trailer',
+    'transfer-encoding', 'upgrade', 'host', 'content-length', 'content-encoding', 'date', 'server',
+)
+
+CERT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'certs')
+
+# Looks like a Cloudflare interstitial to CloudflareBypasser and is_challenge_response, and
+# clears itself the way a solved challenge does: it sets cf_clearance and reloads the page.
+CHALLENGE_PAGE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="UTF-8"><title>Just a moment...</title></head>
+<body><div id="challenge-running">Checking your browser before accessing {host}.</div>
+<script>
+window._cf_chl_opt = {{cType: 'stand-in'}};
+setTimeout(function () {{
+    document.cookie = 'cf_clearance=stand-in-' + Math.floor(Date.now() / 1000) + '; path=/; max-age={ttl}';
+    location.reload();
+}}, {delay_ms});
+</script></body></html>
+"""
+
+class StandInError(Exception):
+    pass
+
+def ensure_certificate(directory=CERT_DIR):
+    """Returns the (certificate, key) paths of the interception certificate, creating it with openssl if needed."""
+    cert = os.path.join(directory, 'stand_in_cert.pem')
+    key = os.path.join(directory, 'stand_in_key.pem')
+    if os.path.exists(cert) and os.path.exists(key):
+        return cert, key
+    os.makedirs(directory, exist_ok=True)
+    try:
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', key, '-out', cert,
+                        '-days', '3650', '-subj', '/CN=NovelDownloader stand-in'],
+                       check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise StandInError(f"Failed to create the stand-in certificate with openssl: {str(e)}")
+    return cert, key
+
+class _SocketWriter(io.BufferedIOBase):
+    """Unbuffered writer over the TLS socket of an intercepted tunnel."""
+
+    def __init__(self, sock):
+        self._sock = sock
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._sock.sendall(data)
+        return len(data)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # host:port of the CONNECT tunnel the requests arrive through, if any
+    tunnel = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_CONNECT(self):
+        self.send_response(200, 'Connection Established')
+        self.end_headers()
+        try:
+            connection = self.server.stand_in.ssl_context.wrap_socket(self.connection, server_side=True)
+        except (ssl.SSLError, OSError) as e:
+            logger.debug(f"TLS handshake for {self.path} failed: {str(e)}")
+            self.close_connection = True
+            return
+        self.connection = connection
+        self.rfile = connection.makefile('rb')
+        self.wfile = _SocketWriter(connection)
+        self.tunnel = self.path
+        self.close_connection = False
+
+    def do_GET(self):
+        self._handle()
+
+    def do_HEAD(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _url(self):
+        if self.tunnel:
+            host, _, port = self.tunnel.partition(':')
+            return f"https://{host if port in ('', '443') else self.tunnel}{self.path}"
+        if self.path.startswith(('http://', 'https://')):
+            return self.path
+        # Requested directly rather than through the proxy, e.g. by a test
+        return f"http://{self.headers.get('Host', 'localhost')}{self.path}"
+
+    def _handle(self):
+        stand_in = self.server.stand_in
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, headers, payload = stand_in.respond(self.command, self._url(), self.headers, body)
+
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+class StandInServer:
+    def __init__(self, archive_path, record=False, latency=0.0, jitter=0.0, challenge_rate=0.0,
+                 challenge_delay=2.0, clearance_ttl=1800, host='127.0.0.1', port=0, cert_dir=CERT_DIR,
+                 seed=0, timeout=30):
+        """
+        :param archive_path: SQLite archive recorded to, or replayed from
+        :param record: forward requests to the real sites and record the responses
+        :param latency: seconds added before every replayed response
+        :param jitter: up to this many seconds added at random on top of latency
+        :param challenge_rate: share of page loads without a fresh clearance cookie answered with a challenge
+        :param challenge_delay: seconds the stand-in challenge takes to clear
+        :param clearance_ttl: seconds the clearance cookie of a cleared challenge stays valid
+        :param port: port to listen on, 0 picks a free one
+        :param seed: seed of the latency and challenge draws, so replays are repeatable
+        """
+        self.archive = Archive(archive_path)
+        self.record = record
+        self.latency = latency
+        self.jitter = jitter
+        self.challenge_rate = challenge_rate
+        self.challenge_delay = challenge_delay
+        self.clearance_ttl = clearance_ttl
+        self.timeout = timeout
+        self.cert_dir = cert_dir
+        self.ssl_context = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'served': 0, 'misses': 0, 'recorded': 0, 'recorded_challenges': 0,
+                      'challenges_injected': 0, 'upstream_errors': 0}
+        self.missed_urls = []
+
+        self.upstream = requests.Session() if record else None
+        if self.upstream:
+            # Cookies come from the browser with every request, the proxy must not add its own
+            self.upstream.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.stand_in = self
+        self._thread = None
+
+    @property
+    def proxy_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        cert, key = ensure_certificate(self.cert_dir)
+        self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.ssl_context.load_cert_chain(cert, key)
+        self.ssl_context.set_alpn_protocols(['http/1.1'])
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        mode = 'Recording to' if self.record else 'Replaying'
+        logger.info(f"{mode} {self.archive.path} through the stand-in proxy at {self.proxy_url}")
+        return self
+
+    def stop(self):
+        if self._thread:
+            self.server.shutdown()
+        self.server.server_close()
+        if self.upstream:
+            self.upstream.close()
+        self.archive.close()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def respond(self, method, url, headers, body):
+        """Returns the (status, headers, body) to answer a request with."""
+        self._count('requests')
+        if self.record:
+            return self._forward(method, url, headers, body)
+
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            challenge = self._random.random() < self.challenge_rate
+        if delay:
+            time.sleep(delay)
+        if challenge and self._wants_challenge(method, headers):
+            self._count('challenges_injected')
+            return self._challenge(url)
+
+        entry = self.archive.lookup(method, url, body)
+        if entry is None:
+            with self._lock:
+                self.stats['misses'] += 1
+                if len(self.missed_urls) < 20:
+                    self.missed_urls.append(f"{method} {url}")
+            logger.debug(f"Not in the archive: {method} {url}")
+            return 404, [('Content-Type', 'text/plain')], b'Not in the archive'
+        self._count('served')
+        status, recorded_headers, payload, _ = entry
+        return status, [(name, value) for name, value in recorded_headers
+                        if name.lower() not in SKIPPED_HEADERS], payload
+
+    def _wants_challenge(self, method, headers):
+        # Only page loads are challenged, and not while a stand-in clearance is fresh
+        if method != 'GET' or 'text/html' not in headers.get('Accept', ''):
+            return False
+        cookie = SimpleCookie()
+        try:
+            cookie.load(headers.get('Cookie', ''))
+        except Exception:
+            return True
+        clearance = cookie.get('cf_clearance')
+        if clearance is None or not clearance.value.startswith('stand-in-'):
+            return True
+        try:
+            return time.time() - int(clearance.value[len('stand-in-'):]) > self.clearance_ttl
+        except ValueError:
+            return True
+
+    def _challenge(self, url):
+        host = url.split('/')[2]
+        page = CHALLENGE_PAGE.format(host=host, ttl=int(self.clearance_ttl), delay_ms=int(self.challenge_delay * 1000))
+        return 503, [('Content-Type', 'text/html; charset=UTF-8'), ('Cache-Control', 'no-store')], page.encode('utf-8')
+
+    def _forward(self, method, url, headers, body):
+        request_headers = {name: value for name, value in headers.items() if name.lower() not in SKIPPED_HEADERS}
+        # The body is stored decoded, so only ask for encodings requests can decode
+        request_headers['Accept-Encoding'] = 'gzip, deflate'
+        try:
+            response = self.upstream.request(method, url, headers=request_headers, data=body or None,
+                                             allow_redirects=False, timeout=self.timeout)
+        except requests.RequestException as e:
+            self._count('upstream_errors')
+            logger.warning(f"Upstream request failed: {method} {url}: {str(e)}")
+            return 502, [('Content-Type', 'text/plain')], f"Upstream request failed: {str(e)}".encode('utf-8')
+
+        response_headers = [(name, value) for name, value in response.raw.headers.items()
+                            if name.lower() not in SKIPPED_HEADERS]
+        challenge = is_challenge_response(response.status_code, response.headers, response.text)
+        self.archive.record(method, url, body, response.status_code, response_headers, response.content, challenge)
+        self._count('recorded_challenges' if challenge else 'recorded')
+        return response.status_code, response_headers, response.content
+
+    def summary(self):
+        with self._lock:
+            summary = dict(self.stats, mode='record' if self.record else 'replay')
+            summary['missed_urls'] = list(self.missed_urls)
+        return summary
+
+    def log_summary(self):
+        summary = self.summary()
+        if self.record:
+            logger.info(f"Stand-in recorded {summary['recorded']} responses and {summary['recorded_challenges']} "
+                        f"challenges, {summary['upstream_errors']} upstream errors")
+            return
+        logger.info(f"Stand-in served {summary['served']} of {summary['requests']} requests from the archive, "
+                    f"{summary['misses']} misses, {summary['challenges_injected']} challenges injected")
+        for url in summary['missed_urls'][:5]:
+            logger.info(f"Not in the archive: {url}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the stand-in proxy on its own.")
+    parser.add_argument('archive', help="SQLite archive to replay, or to record to with --record")
+    parser.add_argument('--port', type=int, default=8899, help="Port to listen on (default: 8899)")
+    parser.add_argument('--record', action='store_true', help="Forward requests to the real sites and record them")
+    parser.add_argument('--latency', type=float, default=0, help="Seconds added before every response (default: 0)")
+    parser.add_argument('--jitter', type=float, default=0, help="Up to this many extra seconds per response (default: 0)")
+    parser.add_argument('--challenge-rate', type=float, default=0,
+                        help="Share of page loads answered with a Cloudflare challenge (default: 0)")
+    parser.add_argument('--challenge-delay', type=float, default=2,
+                        help="Seconds a stand-in challenge takes to clear (default: 2)")
+    return parser.parse_args()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    stand_in = StandInServer(args.archive, record=args.record, latency=args.latency, jitter=args.jitter,
+                             challenge_rate=args.challenge_rate, challenge_delay=args.challenge_delay,
+                             port=args.port)
+    try:
+        stand_in.start()
+        logger.info("Start the browser with --proxy-server and --ignore-certificate-errors. Press Ctrl+C to stop.")
+        while True:
+            time.sleep(3600)
+    except StandInError as e:
+        logger.error(str(e))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stand_in.log_summary()
+        stand_in.stop()
+
+if __name__ == "__main__":
+    main()
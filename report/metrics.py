@@ -0,0 +1,158 @@
+"""
+metrics.py
+
+This module times the phases of a run and counts what they fetch. Phases such as
+navigation, Cloudflare bypass, redirect waits, parsing, cache writes and the EPUB
+build are timed with span(), per site. Bytes fetched and retries are counted the
+same way. At the end of a run, write_json_report and write_prometheus_textfile
+save the latencies, counters and the wait and Cloudflare statistics in a
+machine-readable form.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+def host_of(url):
+    """Returns the host of url without www., the site name metrics are recorded under."""
+    if not isinstance(url, str):
+        return 'unknown'
+    try:
+        host = urlparse(url).netloc.lower()
+    except ValueError:
+        return 'unknown'
+    return (host[4:] if host.startswith('www.') else host) or 'unknown'
+
+def latency_summary(times):
+    """Returns {count, mean, p50, p95, max, total} for a list of durations in seconds."""
+    times = sorted(times)
+    return {
+        'count': len(times),
+        'mean': sum(times) / len(times),
+        'p50': times[len(times) // 2],
+        'p95': times[min(len(times) - 1, int(len(times) * 0.95))],
+        'max': times[-1],
+        'total': sum(times),
+    }
+
+class Metrics:
+    """Thread-safe record of phase durations and counters, per site."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._counters = {}
+        self.started = time.time()
+
+    def record(self, phase, site, elapsed):
+        with self._lock:
+            self._spans.setdefault((phase, site or 'all'), []).append(elapsed)
+
+    def count(self, name, site, value=1):
+        with self._lock:
+            key = (name, site or 'all')
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def span(self, phase, site=None):
+        """Times the enclosed block as one occurrence of phase on site, even when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, site, time.perf_counter() - start)
+
+    def summary(self):
+        """Returns {'phases': {phase: {site: latency_summary}}, 'counters': {name: {site: value}}}."""
+        with self._lock:
+            spans = {key: list(values) for key, values in self._spans.items()}
+            counters = dict(self._counters)
+
+        phases = {}
+        for (phase, site), times in sorted(spans.items()):
+            phases.setdefault(phase, {})[site] = latency_summary(times)
+        totals = {}
+        for (name, site), value in sorted(counters.items()):
+            totals.setdefault(name, {})[site] = value
+        return {'phases': phases, 'counters': totals}
+
+    def log_summary(self):
+        for phase, sites in self.summary()['phases'].items():
+            for site, stats in sites.items():
+                logger.info(f"Phase '{phase}' on {site}: {stats['count']} spans, p50 {stats['p50']:.2f}s, "
+                            f"p95 {stats['p95']:.2f}s, total {stats['total']:.1f}s")
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+        self.started = time.time()
+
+metrics = Metrics()
+
+def build_report(wait_stats=None, bypass_stats=None, extra=None):
+    """Returns the run report as a dict, with the wait and Cloudflare statistics when given."""
+    report = {
+        'started': metrics.started,
+        'finished': time.time(),
+        'duration': time.time() - metrics.started,
+    }
+    report.update(metrics.summary())
+    if wait_stats is not None:
+        waits = {}
+        for (site, name), stats in sorted(wait_stats.summary().items()):
+            waits.setdefault(name, {})[site] = stats
+        report['waits'] = waits
+    if bypass_stats is not None:
+        report['cloudflare'] = bypass_stats.summary()
+    report.update(extra or {})
+    return report
+
+def write_json_report(path, report):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+    logger.info(f"Run report written to {path}")
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+def prometheus_text(report, prefix='novel_downloader'):
+    """Returns the report in the Prometheus text exposition format, e.g. for the node exporter textfile collector."""
+    lines = [f"# TYPE {prefix}_phase_seconds summary"]
+    for phase, sites in report.get('phases', {}).items():
+        for site, stats in sites.items():
+            labels = f'phase="{_label(phase)}",site="{_label(site)}"'
+            lines.append(f'{prefix}_phase_seconds{{{labels},quantile="0.5"}} {stats["p50"]:.6f}')
+            lines.append(f'{prefix}_phase_seconds{{{labels},quantile="0.95"}} {stats["p95"]:.6f}')
+            lines.append(f'{prefix}_phase_seconds_sum{{{labels}}} {stats["total"]:.6f}')
+            lines.append(f'{prefix}_phase_seconds_count{{{labels}}} {stats["count"]}')
+
+    for name, sites in report.get('counters', {}).items():
+        metric = f"{prefix}_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for site, value in sites.items():
+            lines.append(f'{metric}{{site="{_label(site)}"}} {value}')
+
+    lines.append(f"# TYPE {prefix}_cloudflare_challenges_total counter")
+    for domain, stats in report.get('cloudflare', {}).items():
+        lines.append(f'{prefix}_cloudflare_challenges_total{{site="{_label(domain)}"}} {stats["challenges"]}')
+    lines.append(f"# TYPE {prefix}_run_duration_seconds gauge")
+    lines.append(f"{prefix}_run_duration_seconds {report.get('duration', 0):.3f}")
+    return '\n'.join(lines) + '\n'
+
+def write_prometheus_textfile(path, report):
+    # Written next to the target and renamed, so a collector never reads a half-written file
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as file:
+        file.write(prometheus_text(report))
+    os.replace(temporary, path)
+    logger.info(f"Prometheus metrics written to {path}")
@@ -1,15 +1,62 @@
 from DrissionPage import ChromiumPage
-from bs4 import BeautifulSoup
-import time
 import logging
 import os
 from dotenv import load_dotenv
+from .html_parser import parse_html
+from fetch.readiness import PageReadiness
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# The request behind the "show all chapters" popup of a series page
+CHAPTER_LIST_JS = '''
+const body = new URLSearchParams({action: 'nd_getchapters', mypostid: arguments[0], mypostid2: '0'});
+return fetch('/wp-admin/admin-ajax.php', {method: 'POST', body: body, credentials: 'include'})
+    .then(response => response.ok ? response.text() : '');
+'''
+
+def parse_novel_info(html_content):
+    """Reads the metadata of a novel from its NovelUpdates series page."""
+    document = parse_html(html_content)
+    novel_info = {}
+    novel_info['title'] = document.select_one('meta[property="og:title"]')['content']
+    novel_info['cover'] = document.select_one('meta[property="og:image"]')['content']
+    novel_info['author'] = document.select_one('a#authtag').text(strip=False)
+    novel_info['type'] = document.select_one('a[class="genre type"]').text(strip=False)
+
+    associated_names = document.select_one('div#editassociated').text(strip=False).split('<br>')
+    novel_info['associated_names'] = [name.strip() for name in associated_names if name.strip()]
+
+    novel_info['genre'] = ', '.join([tag.text() for tag in document.select('div#seriesgenre a.genre')])
+    novel_info['tags'] = ', '.join([tag.text() for tag in document.select('div#showtags a.genre')])
+    novel_info['description'] = document.select_one('meta[property="og:description"]')['content']
+    return novel_info
+
+def parse_chapter_list(chapter_list_html):
+    """Returns the extnu links of a NovelUpdates chapter list, oldest first."""
+    chapter_links = []
+    for li in parse_html(chapter_list_html).select('li.sp_li_chp'):
+        link = li.select_one('a[href^="//www.novelupdates.com/extnu/"]')
+        if link:
+            chapter_links.append(f"https:{link['href']}")
+
+    # Reverse the list to get oldest first
+    chapter_links.reverse()
+    return chapter_links
+
+def parse_post_id(series_html):
+    """Returns the WordPress post id of a series page, which the chapter list request is keyed by."""
+    document = parse_html(series_html)
+    post_id = document.select_one('input#mypostid')
+    if post_id and post_id.get('value'):
+        return post_id.get('value')
+    shortlink = document.select_one('link[rel="shortlink"]')
+    if shortlink and '?p=' in shortlink.get('href', ''):
+        return shortlink['href'].split('?p=', 1)[1]
+    return None
+
 class NovelUpdatesChapterRetriever:
     def __init__(self, page: ChromiumPage, cf_bypasser):
         self.page = page
@@ -18,8 +65,12 @@ class NovelUpdatesChapterRetriever:
         self.logged_in = False
         self.username = os.getenv('NU_USERNAME')
         self.password = os.getenv('NU_PASSWORD')
+        self.readiness = PageReadiness(page, site='novelupdates')
 
     def login(self):
+        if self.logged_in:
+            return True
+
         if not self.username or not self.password:
             logger.error("NovelUpdates credentials not found in .env file.")
             return False
@@ -42,10 +93,7 @@ class NovelUpdatesChapterRetriever:
             self.page.ele('#wp-submit').click()
 
             # Wait for login to complete
-            time.sleep(2)
-
-            # Check if login was successful
-            if self.page.ele('text:Log Out'):
+            if self.readiness.element('text:Log Out'):
                 logger.info("Login to NovelUpdates successful.")
                 self.logged_in = True
                 return True
@@ -56,33 +104,49 @@ class NovelUpdatesChapterRetriever:
             logger.error(f"Login to NovelUpdates failed. Error: {str(e)}")
             return False
 
-    def get_chapter_links(self, novel_url):
+    def get_chapter_links(self, novel_url, post_id=None):
+        """
+        Returns the extnu links of a series, oldest first. The list is requested directly,
+        the way the chapter popup loads it. Passing the post id of the series (see parse_post_id)
+        saves loading the series page again.
+        """
         if not self.logged_in:
             logger.error("Please login to NovelUpdates first.")
             return []
 
-        self.page.get(novel_url)
-        self.cf_bypasser.bypass()
+        if not post_id or not self.page.url.startswith(self.base_url):
+            self.page.get(novel_url)
+            self.cf_bypasser.bypass()
+            post_id = post_id or parse_post_id(self.page.html)
+
+        if post_id:
+            try:
+                chapter_links = parse_chapter_list(self.page.run_js(CHAPTER_LIST_JS, post_id) or "")
+                if chapter_links:
+                    logger.info(f"Retrieved {len(chapter_links)} chapter links from the NovelUpdates chapter list request")
+                    return chapter_links
+            except Exception as e:
+                logger.warning(f"Chapter list request failed, falling back to the chapter popup: {str(e)}")
+        else:
+            logger.warning("Series post id not found, falling back to the chapter popup")
+
+        return self._get_chapter_links_from_popup(novel_url)
+
+    def _get_chapter_links_from_popup(self, novel_url):
+        if not self.page.url.startswith(novel_url):
+            self.page.get(novel_url)
+            self.cf_bypasser.bypass()
 
         try:
             # Click the button to show all chapters
             self.page.ele('.my_popupreading_open').click()
-            time.sleep(2)  # Wait for the chapter list to load
+            # Wait for the chapter list to load
+            if not self.readiness.element('css:.sp_chp li.sp_li_chp'):
+                logger.warning("Timed out waiting for the NovelUpdates chapter list")
 
             # Get the chapter list HTML
             chapter_list_html = self.page.ele('.sp_chp').html
-            soup = BeautifulSoup(chapter_list_html, 'html.parser')
-
-            # Extract chapter links
-            chapter_links = []
-            for li in soup.find_all('li', class_='sp_li_chp'):
-                link = li.find('a', href=lambda h: h and h.startswith('//www.novelupdates.com/extnu/'))
-                if link:
-                    chapter_links.append(f"https:{link['href']}")
-
-            # Reverse the list to get oldest first
-            chapter_links.reverse()
-            return chapter_links
+            return parse_chapter_list(chapter_list_html)
 
         except Exception as e:
             logger.error(f"Error retrieving chapter links from NovelUpdates: {str(e)}")
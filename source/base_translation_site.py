@@ -1,9 +1,64 @@
 from abc import ABC, abstractmethod
 
+from report.metrics import host_of, metrics
+
 class TranslationSite(ABC):
-    def __init__(self, page, cf_bypasser):
+    def __init__(self, page, cf_bypasser, http_session=None, fetch_engine=None):
+        """
+        :param http_session: HttpSession of the HTTP fast path for static pages
+        :param fetch_engine: AsyncFetchEngine the fast path requests go through, so they share its
+                             per-host limits with the other novels downloaded in the process
+        """
         self.page = page
         self.cf_bypasser = cf_bypasser
+        self.http_session = http_session
+        self.fetch_engine = fetch_engine
+
+    def fetch_html(self, url):
+        """
+        Returns the HTML of url, or None if the Cloudflare check could not be passed.
+        Static pages go through the HTTP fast path when it has clearance cookies,
+        and the browser is only used when the response looks like a challenge.
+        """
+        if self.fetch_engine:
+            html = self.fetch_engine.fetch_sync(url)
+        elif self.http_session:
+            html = self.http_session.get(url)
+        else:
+            html = None
+        if html is not None:
+            return html
+        return self.fetch_html_in_browser(url)
+
+    def fetch_html_in_browser(self, url):
+        driver = self.cf_bypasser.driver
+        site = host_of(url)
+        with metrics.span('navigation', site):
+            driver.get(url)
+        self.cf_bypasser.bypass()
+        if not self.cf_bypasser.is_bypassed():
+            return None
+        # A passed challenge reloads the page, so make sure the document has finished loading
+        self.cf_bypasser.readiness.dom_ready()
+
+        if self.http_session:
+            self.http_session.harvest(driver)
+        html = driver.html
+        metrics.count('bytes_fetched', site, len(html.encode('utf-8')))
+        return html
+
+    async def fetch_html_async(self, url, engine):
+        """Like fetch_html, but goes through an AsyncFetchEngine and never blocks the event loop."""
+        html = await engine.fetch(url)
+        if html is None:
+            html = await engine.run_in_browser(self.fetch_html_in_browser, url)
+        return html
+
+    async def get_chapter_content_async(self, url, engine):
+        html = await self.fetch_html_async(url, engine)
+        if not html:
+            raise Exception(f"Failed to load chapter page: {url}")
+        return self.parse_chapter(html)
 
     @abstractmethod
     def get_chapter_links(self, url):
@@ -11,4 +66,24 @@ class TranslationSite(ABC):
 
     @abstractmethod
     def get_chapter_content(self, url):
-        pass
\ No newline at end of file
+        pass
+
+    # Pure function (html) -> (title, content), so it can run in a worker process
+    parse_chapter_html = None
+
+    def parse_chapter(self, html):
+        """Returns (title, content) extracted from the HTML of a chapter page."""
+        if self.parse_chapter_html is None:
+            raise TypeError(f"{type(self).__name__} does not set parse_chapter_html, so its chapter pages "
+                            "cannot be parsed outside get_chapter_content")
+        return self.parse_chapter_html(html)
+
+    def fetch_chapter_html(self, url):
+        """
+        Returns the raw HTML of a chapter page, ready for parse_chapter_html.
+        Sites whose chapter pages need more than fetch_html, like retries or waiting for rendering, override it.
+        """
+        chapter_html = self.fetch_html(url)
+        if not chapter_html:
+            raise Exception(f"Failed to load chapter page: {url}")
+        return chapter_html
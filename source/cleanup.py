@@ -0,0 +1,110 @@
+"""
+cleanup.py
+
+Pure functions that turn the raw HTML of a chapter page into (title, content).
+They take no page or browser state, so ChapterPostProcessor can run them in
+worker processes while the browser keeps fetching.
+"""
+
+import html as html_lib
+import logging
+import re
+
+from .html_parser import parse_html, make_soup, make_fragment
+
+PENGUIN_SQUAD_PAYWALL_MESSAGE = "You are attempting to access the Glacial Archives when you are not even a citizen of the Antarctic Empire. Immigrate to the Antarctic Empire to buy access to the Glacial Archives."
+
+class PaywallException(Exception):
+    pass
+
+def parse_penguin_squad_chapter(chapter_html):
+    document = parse_html(chapter_html)
+
+    chapter_title = document.select_one('h1.chapter__title').text()
+    chapter_content = document.select_one('section#chapter-content').text()
+
+    # Check for paywall message
+    if PENGUIN_SQUAD_PAYWALL_MESSAGE in chapter_content:
+        raise PaywallException("Paywall detected. Unable to access further chapters.")
+
+    return chapter_title, chapter_content
+
+def clean_readingpia_chapter(chapter_html):
+    soup = make_soup(chapter_html)
+    chapter_body = soup.find('div', class_='chapter-body')
+    if not chapter_body:
+        logging.warning("No chapter body found in page")
+        return "", ""
+
+    # Extract chapter title
+    title_tag = chapter_body.find('strong')
+    chapter_title = title_tag.get_text(strip=True) if title_tag else ""
+    logging.info(f"Extracted chapter title: {chapter_title}")
+
+    # Remove the title from the chapter body
+    if title_tag:
+        title_tag.decompose()
+
+    # Remove ads
+    for ad in chapter_body.find_all('div', class_='m_ad_code'):
+        ad.decompose()
+
+    # Convert the chapter body to a string for easier text manipulation
+    content = str(chapter_body)
+
+    # 1. Remove "Join Discord" text
+    content = re.sub(r'Join Discord', '', content, flags=re.IGNORECASE)
+
+    # 2. Remove "[ Join Our Discord to </a> ]"
+    content = re.sub(r'\[ Join Our Discord for regular updates and have fun with other community members: <a href="(https://discord\.com/invite/\S+)">\1</a> \]', '', content)
+
+    # 3. Remove Discord invite links
+    content = re.sub(r'https://discord\.com/invite/\w{10}', '', content)
+
+    # 4. Remove unnecessary div with text-align: center
+    content = re.sub(r'<div class="chapter-body" data-theme="default" id="chapter-body" style="">\s*<div style="text-align: center;">', '<div class="chapter-body" data-theme="default" id="chapter-body" style="">', content)
+
+    # Convert the content back to BeautifulSoup object
+    chapter_body = make_fragment(content)
+
+    content = str(chapter_body).strip()
+    if not content:
+        logging.warning("Extracted content is empty")
+    return chapter_title, content
+
+GENESISTUDIO_CONTENT_START = '<div class="break-words">'
+GENESISTUDIO_CONTENT_END = '<div class="mb-48">'
+
+def extract_genesistudio_chapter(html_content):
+    # Extract chapter title
+    title_match = re.search(r'<h1 class="sr-only">(.*?)</h1>', html_content)
+    if title_match:
+        full_title = html_lib.unescape(title_match.group(1)).strip()
+        logging.info(f"Found title in HTML. Full title: '{full_title}'")
+    else:
+        full_title = "Unknown Title"
+        logging.warning("Failed to find title element (main h1.sr-only) in HTML")
+
+    # Extract chapter number and name
+    match = re.search(r'Read .+ - Chapter (\d+)(?::\s*(.+))? \|', full_title)
+    if match:
+        chapter_number = match.group(1)
+        chapter_name = match.group(2) if match.group(2) else ""
+        chapter_title = f"Chapter {chapter_number}: {chapter_name}".strip()
+        logging.info(f"Extracted chapter title: '{chapter_title}'")
+    else:
+        chapter_title = "Unknown Chapter"
+        logging.warning(f"Regex match failed. Full title: '{full_title}'")
+
+    # Extract chapter content
+    start_index = html_content.find(GENESISTUDIO_CONTENT_START)
+    end_index = html_content.find(GENESISTUDIO_CONTENT_END, start_index)
+
+    if start_index != -1 and end_index != -1:
+        chapter_content = html_content[start_index:end_index]
+        logging.info(f"Extracted chapter content (length: {len(chapter_content)})")
+    else:
+        chapter_content = ""
+        logging.warning("Could not find chapter content between specified div tags")
+
+    return chapter_title, chapter_content
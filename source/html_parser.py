@@ -0,0 +1,142 @@
+"""
+html_parser.py
+
+This module gives the scrapers one way to query HTML whatever parser is installed.
+parse_html() uses selectolax, then lxml, and falls back to BeautifulSoup's
+html.parser, the slowest backend but the only one that is always available.
+Set NOVEL_HTML_PARSER to force a backend.
+"""
+
+import logging
+import os
+
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    lxml = None
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('selectolax', 'lxml', 'html.parser')
+
+def available_backends():
+    installed = {'selectolax': LexborHTMLParser is not None, 'lxml': lxml is not None, 'html.parser': True}
+    return [name for name in BACKENDS if installed[name]]
+
+def _default_backend():
+    requested = os.environ.get('NOVEL_HTML_PARSER')
+    if requested:
+        if requested in available_backends():
+            return requested
+        logger.warning(f"HTML parser '{requested}' is not available, using the fastest installed one")
+    return available_backends()[0]
+
+_backend = _default_backend()
+
+def get_backend():
+    return _backend
+
+def set_backend(name):
+    """Selects the backend used by parse_html() and make_soup()."""
+    global _backend
+    if name not in available_backends():
+        raise ValueError(f"HTML parser '{name}' is not installed (available: {', '.join(available_backends())})")
+    _backend = name
+
+class HtmlNode:
+    """An element of a parsed page. Only the small API the scrapers need is exposed."""
+
+    def __init__(self, node, backend):
+        self._node = node
+        self._backend = backend
+
+    def select(self, selector):
+        if self._backend == 'selectolax':
+            nodes = self._node.css(selector)
+        elif self._backend == 'lxml':
+            nodes = _css(selector)(self._node)
+        else:
+            nodes = self._node.select(selector)
+        return [HtmlNode(node, self._backend) for node in nodes]
+
+    def select_one(self, selector):
+        if self._backend == 'selectolax':
+            node = self._node.css_first(selector)
+            return HtmlNode(node, self._backend) if node is not None else None
+        nodes = self.select(selector)
+        return nodes[0] if nodes else None
+
+    def text(self, strip=True):
+        if self._backend == 'selectolax':
+            text = self._node.text(deep=True)
+        elif self._backend == 'lxml':
+            text = self._node.text_content()
+        else:
+            text = self._node.get_text()
+        return text.strip() if strip else text
+
+    def get(self, attribute, default=None):
+        if self._backend == 'selectolax':
+            value = self._node.attributes.get(attribute)
+            return default if value is None else value
+        return self._node.get(attribute, default)
+
+    def __getitem__(self, attribute):
+        value = self.get(attribute)
+        if value is None:
+            raise KeyError(attribute)
+        return value
+
+    @property
+    def html(self):
+        if self._backend == 'selectolax':
+            return self._node.html
+        if self._backend == 'lxml':
+            return lxml.html.tostring(self._node, encoding='unicode')
+        return str(self._node)
+
+_selectors = {}
+
+def _css(selector):
+    # Compiling a selector costs more than running it, so each one is compiled once
+    compiled = _selectors.get(selector)
+    if compiled is None:
+        compiled = _selectors[selector] = CSSSelector(selector, translator='html')
+    return compiled
+
+def parse_html(html, backend=None):
+    """Parses a whole page and returns its root as an HtmlNode."""
+    backend = backend or _backend
+    html = html or "<html></html>"
+    if backend == 'selectolax':
+        return HtmlNode(LexborHTMLParser(html).root, backend)
+    if backend == 'lxml':
+        try:
+            root = lxml.html.document_fromstring(html)
+        except ValueError:
+            # lxml refuses str input that carries an XML encoding declaration
+            root = lxml.html.document_fromstring(html.encode('utf-8'))
+        return HtmlNode(root, backend)
+    return HtmlNode(BeautifulSoup(html, 'html.parser'), backend)
+
+def make_soup(html):
+    """
+    Returns a BeautifulSoup tree of a whole page for code that edits the tree,
+    built with lxml when it is installed.
+    """
+    return BeautifulSoup(html, 'lxml' if lxml is not None and _backend != 'html.parser' else 'html.parser')
+
+def make_fragment(html):
+    """
+    Returns a BeautifulSoup tree of an HTML fragment. html.parser is used so the
+    fragment is not wrapped in <html> and <body> tags when it is serialized back.
+    """
+    return BeautifulSoup(html, 'html.parser')
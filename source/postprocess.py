@@ -0,0 +1,85 @@
+"""
+postprocess.py
+
+This module runs the CPU-heavy chapter parsing and cleanup in a process pool,
+so it uses every core and overlaps with the network-bound fetching in the
+browser tabs instead of running on the threads that drive them.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from report.metrics import metrics
+from . import html_parser
+
+logger = logging.getLogger(__name__)
+
+def _timed_parse(parse, html):
+    # Runs in the worker process, so the time is measured there and sent back with the result
+    start = time.perf_counter()
+    result = parse(html)
+    return result, time.perf_counter() - start
+
+class ChapterPostProcessor:
+    def __init__(self, workers=None):
+        """
+        :param workers: number of worker processes, defaults to the number of cores.
+                        With 0, parsing runs inline on the calling thread.
+        """
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, parse, html, site=None):
+        """
+        Schedules parse(html) and returns a Future for its (title, content) result.
+        parse must be a module-level function so it can be sent to a worker process.
+        Workers parse with the html_parser backend that was selected when the pool started.
+        The parse time is recorded as the 'parse' phase of site.
+        """
+        if self.workers <= 0:
+            future = Future()
+            try:
+                with metrics.span('parse', site):
+                    future.set_result(parse(html))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        # Several downloaders can share the pool in batch mode, so it is started only once
+        with self._lock:
+            if self._executor is None:
+                logger.info(f"Starting chapter post-processing pool with {self.workers} worker(s)")
+                # A spawned worker would pick its own default, so it gets the backend selected here
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=html_parser.set_backend,
+                                                     initargs=(html_parser.get_backend(),))
+            timed = self._executor.submit(_timed_parse, parse, html)
+
+        future = Future()
+
+        def done(timed):
+            try:
+                result, elapsed = timed.result()
+            except BaseException as e:
+                future.set_exception(e)
+                return
+            metrics.record('parse', site, elapsed)
+            future.set_result(result)
+
+        timed.add_done_callback(done)
+        return future
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,51 +1,59 @@
-import re
 import time
 import logging
-from bs4 import BeautifulSoup
 from .base_translation_site import TranslationSite
+from .cleanup import clean_readingpia_chapter
+from .html_parser import make_soup, parse_html
+from report.metrics import metrics
 
 class ReadingPiaSite(TranslationSite):
-    def __init__(self, page, cf_bypasser):
-        super().__init__(page, cf_bypasser)
+    parse_chapter_html = staticmethod(clean_readingpia_chapter)
+
+    def __init__(self, page, cf_bypasser, http_session=None, fetch_engine=None):
+        super().__init__(page, cf_bypasser, http_session, fetch_engine)
         self.base_url = "https://www.readingpia.me"
 
-    def get_soup(self, url):
+    def _fetch_page(self, url):
         logging.info(f"Fetching content for URL: {url}")
         try:
-            self.cf_bypasser.driver.get(url)
-            self.cf_bypasser.bypass()
-            
-            if self.cf_bypasser.is_bypassed():
-                content = self.cf_bypasser.driver.html
-                return BeautifulSoup(content, 'html.parser')
-            else:
-                logging.error(f"Failed to bypass Cloudflare for URL: {url}")
-                return None
+            content = self.fetch_html(url)
+            if content:
+                return content
+            logging.error(f"Failed to bypass Cloudflare for URL: {url}")
         except Exception as e:
             logging.error(f"Error while fetching content for URL {url}: {str(e)}")
-            return None
+        return None
+
+    def get_document(self, url):
+        """Returns the page at url parsed with the fastest html_parser backend, or None if it failed to load."""
+        content = self._fetch_page(url)
+        return parse_html(content) if content else None
+
+    def get_soup(self, url):
+        """Returns the page at url as a BeautifulSoup tree, for callers of the API before get_document."""
+        content = self._fetch_page(url)
+        return make_soup(content) if content else None
 
     def get_chapter_links(self, url):
         logging.info(f"Getting chapter links for URL: {url}")
-        soup = self.get_soup(url)
-        if not soup:
-            logging.error(f"Failed to get soup for URL: {url}")
+        document = self.get_document(url)
+        if not document:
+            logging.error(f"Failed to get page for URL: {url}")
             return []
 
-        chapter_list = soup.find('div', class_='chapter-list')
+        chapter_list = document.select_one('div.chapter-list')
         if not chapter_list:
             logging.warning(f"No chapter list found for URL: {url}")
             return []
 
         links = []
         seen_links = set()
-        for chapter in chapter_list.find_all('a'):
+        for chapter in chapter_list.select('a'):
             try:
-                if 'href' not in chapter.attrs:
-                    logging.warning(f"Found 'a' tag without 'href' attribute: {chapter}")
+                href = chapter.get('href')
+                if href is None:
+                    logging.warning(f"Found 'a' tag without 'href' attribute: {chapter.html}")
                     continue
-                
-                href = chapter['href']
+
                 if not href.startswith('/'):
                     logging.warning(f"Invalid href found: {href}")
                     continue
@@ -63,66 +71,36 @@ class ReadingPiaSite(TranslationSite):
         logging.info(f"Found {len(links)} chapter links")
         return links
 
-    def get_chapter_content(self, url):
+    def fetch_chapter_html(self, url):
         max_retries = 3
         for attempt in range(max_retries):
+            if attempt:
+                metrics.count('retries', 'readingpia.me')
             logging.info(f"Attempting to get content for URL: {url} (Attempt {attempt + 1}/{max_retries})")
-            soup = self.get_soup(url)
-            if not soup:
-                logging.warning(f"Failed to get soup for URL: {url}")
-                if attempt < max_retries - 1:
-                    time.sleep(attempt + 1)
-                    continue
-                return "", ""
+            try:
+                html = self.fetch_html(url)
+            except Exception as e:
+                logging.error(f"Error while fetching content for URL {url}: {str(e)}")
+                html = None
 
-            chapter_body = soup.find('div', class_='chapter-body')
-            if not chapter_body:
+            if not html:
+                logging.warning(f"Failed to get soup for URL: {url}")
+            elif 'chapter-body' not in html:
                 logging.warning(f"No chapter body found for URL: {url}")
-                if attempt < max_retries - 1:
-                    time.sleep(attempt + 1)
-                    continue
-                return "", ""
-
-            # Extract chapter title
-            title_tag = chapter_body.find('strong')
-            chapter_title = title_tag.get_text(strip=True) if title_tag else ""
-            logging.info(f"Extracted chapter title: {chapter_title}")
-
-            # Remove the title from the chapter body
-            if title_tag:
-                title_tag.decompose()
-
-            # Remove ads
-            for ad in chapter_body.find_all('div', class_='m_ad_code'):
-                ad.decompose()
-
-            # Convert the chapter body to a string for easier text manipulation
-            content = str(chapter_body)
-
-            # 1. Remove "Join Discord" text
-            content = re.sub(r'Join Discord', '', content, flags=re.IGNORECASE)
-
-            # 2. Remove "[ Join Our Discord to </a> ]"
-            content = re.sub(r'\[ Join Our Discord for regular updates and have fun with other community members: <a href="(https://discord\.com/invite/\S+)">\1</a> \]', '', content)
-
-            # 3. Remove Discord invite links
-            content = re.sub(r'https://discord\.com/invite/\w{10}', '', content)
-
-            # 4. Remove unnecessary div with text-align: center
-            content = re.sub(r'<div class="chapter-body" data-theme="default" id="chapter-body" style="">\s*<div style="text-align: center;">', '<div class="chapter-body" data-theme="default" id="chapter-body" style="">', content)
-
-            # Convert the content back to BeautifulSoup object
-            chapter_body = BeautifulSoup(content, 'html.parser')
-
-            content = str(chapter_body).strip()
-            if content:
-                logging.info(f"Successfully extracted content for URL: {url}")
-                return chapter_title, content
             else:
-                logging.warning(f"Extracted content is empty for URL: {url}")
-            
+                return html
+
             if attempt < max_retries - 1:
                 time.sleep(attempt + 1)
 
         logging.error(f"Failed to get content after {max_retries} attempts for URL: {url}")
-        return "", ""
+        return ""
+
+    def get_chapter_content(self, url):
+        html = self.fetch_chapter_html(url)
+        if not html:
+            return "", ""
+        chapter_title, content = self.parse_chapter(html)
+        if content:
+            logging.info(f"Successfully extracted content for URL: {url}")
+        return chapter_title, content
@@ -0,0 +1,55 @@
+"""
+Shared test data: the novel information of the EPUB tests, small image files and
+stand-ins for the browser tab and the asset fetcher. Test modules import them
+with `from conftest import ...`; the tests directory is on sys.path under
+pytest and when a test module is run directly.
+"""
+
+import threading
+
+# Title and description carry characters that have to be escaped in the EPUB files
+NOVEL_INFO = {'title': "Test & Novel", 'author': "Someone", 'type': "Web Novel", 'genre': "Fantasy",
+              'tags': "Magic", 'description': "A <test> novel."}
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+GIF = b'GIF89a' + b'\x00' * 16
+
+class FakeFetcher:
+    """AssetFetcher that serves GIFs for every URL except those containing 'broken'."""
+
+    def __init__(self):
+        self.fetched = []
+        self._lock = threading.Lock()
+
+    def get(self, url, referer=None):
+        with self._lock:
+            self.fetched.append(url)
+        return None if 'broken' in url else (GIF, 'image/gif')
+
+class FakeTab:
+    """Browser tab that fails every page load, so a test notices when it is used."""
+
+    def __init__(self):
+        self.visited = []
+
+    def get(self, url):
+        self.visited.append(url)
+        raise RuntimeError("browser unavailable")
+
+class FakeImage:
+    """<img> element with the signature of DrissionPage 3.2.32's ChromiumElement.get_src."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def get_src(self, timeout=None, base64_to_bytes=True):
+        return self.data
+
+class ImageTab(FakeTab):
+    """Browser tab that opens every URL as a PNG image."""
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def ele(self, locator, timeout=None):
+        return FakeImage(PNG) if locator == 'tag:img' else None
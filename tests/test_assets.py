@@ -0,0 +1,109 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from cache.novel_cache import NovelCache
+from conftest import PNG, FakeTab, ImageTab
+from export import images
+from fetch.assets import AssetFetcher
+from fetch.http_session import HttpSession
+
+class ImageHandler(BaseHTTPRequestHandler):
+    requests_served = 0
+
+    def do_GET(self):
+        ImageHandler.requests_served += 1
+        if self.path == '/cover.png':
+            body, content_type = PNG, 'application/octet-stream'
+        else:
+            body, content_type = b'<html><body>Hotlinking is not allowed</body></html>', 'text/html'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestAssetFetcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = NovelCache("Some Novel", cache_dir=self.tmp_dir.name)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.http_session = HttpSession()
+        ImageHandler.requests_served = 0
+
+    def tearDown(self):
+        self.http_session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_cover_is_fetched_once_and_cached(self):
+        tab = FakeTab()
+        fetcher = AssetFetcher(self.cache, http_session=self.http_session, page=tab)
+        url = f"{self.base}/cover.png"
+        # The media type comes from the file itself when the server does not name it
+        self.assertEqual(fetcher.get(url), (PNG, 'image/png'))
+        self.assertEqual(fetcher.get(url), (PNG, 'image/png'))
+        self.assertEqual(ImageHandler.requests_served, 1)
+        self.assertEqual(tab.visited, [])
+        self.assertEqual(self.cache.get_asset(url), (PNG, 'image/png'))
+
+    def test_html_instead_of_image_falls_back_to_browser(self):
+        tab = FakeTab()
+        fetcher = AssetFetcher(self.cache, http_session=self.http_session, page=tab)
+        url = f"{self.base}/hotlinked.jpg"
+        self.assertIsNone(fetcher.get(url))
+        self.assertEqual(tab.visited, [url])
+        self.assertIsNone(self.cache.get_asset(url))
+
+    def test_browser_fetch_reads_the_loaded_image(self):
+        tab = ImageTab()
+        fetcher = AssetFetcher(self.cache, page=tab)
+        url = f"{self.base}/protected.png"
+        self.assertEqual(fetcher.get(url), (PNG, 'image/png'))
+        self.assertEqual(tab.visited, [url])
+        self.assertEqual(self.cache.get_asset(url), (PNG, 'image/png'))
+
+class TestImages(unittest.TestCase):
+    def test_sniff_media_type(self):
+        self.assertEqual(images.sniff_media_type(b'\xff\xd8\xff\xe0rest'), 'image/jpeg')
+        self.assertEqual(images.sniff_media_type(b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'image/webp')
+        self.assertEqual(images.sniff_media_type(b'????', 'image/gif; charset=binary'), 'image/gif')
+        self.assertIsNone(images.sniff_media_type(b'????'))
+
+    def test_parse_size(self):
+        self.assertEqual(images.parse_size('600x800'), (600, 800))
+        self.assertIsNone(images.parse_size('0'))
+        with self.assertRaises(ValueError):
+            images.parse_size('600')
+
+    @unittest.skipUnless(images.Image, "Pillow is not installed")
+    def test_large_png_is_downscaled_to_jpeg(self):
+        import io
+        output = io.BytesIO()
+        images.Image.effect_noise((2000, 3000), 64).convert('RGB').save(output, format='PNG')
+        data, media_type = images.fit_image(output.getvalue(), max_size=(600, 800))
+        self.assertEqual(media_type, 'image/jpeg')
+        self.assertEqual(images.Image.open(io.BytesIO(data)).size, (533, 800))
+
+    def test_without_pillow_image_is_kept(self):
+        original = images.Image
+        images.Image = None
+        try:
+            self.assertEqual(images.fit_image(PNG), (PNG, 'image/png'))
+        finally:
+            images.Image = original
+
+if __name__ == '__main__':
+    unittest.main()
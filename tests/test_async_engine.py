@@ -0,0 +1,131 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from fetch.async_engine import AsyncFetchEngine
+from fetch.http_session import HttpSession
+from source.penguin_squad_site import PenguinSquadSite
+
+CHAPTER_HTML = """
+<html><body>
+<h1 class="chapter__title">Chapter 1: Local</h1>
+<section id="chapter-content">Served by the stand-in server.</section>
+</body></html>
+"""
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves chapter pages slowly and tracks how many requests each host has in flight."""
+    lock = threading.Lock()
+    in_flight = {}
+    peak = {}
+    peak_total = 0
+
+    def do_GET(self):
+        host = self.headers['Host'].split(':')[0]
+        with self.lock:
+            self.in_flight[host] = self.in_flight.get(host, 0) + 1
+            self.peak[host] = max(self.peak.get(host, 0), self.in_flight[host])
+            StandInHandler.peak_total = max(StandInHandler.peak_total, sum(self.in_flight.values()))
+        try:
+            time.sleep(0.1)
+            if self.path.startswith('/challenge'):
+                self.send_response(403)
+                self.send_header('cf-mitigated', 'challenge')
+                self.end_headers()
+                self.wfile.write(b'<title>Just a moment...</title>')
+            else:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html')
+                self.end_headers()
+                self.wfile.write(CHAPTER_HTML.encode('utf-8'))
+        finally:
+            with self.lock:
+                self.in_flight[host] -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+class TestAsyncFetchEngine(unittest.TestCase):
+    """Test case for the asyncio fetch engine against a local stand-in server."""
+
+    def setUp(self):
+        StandInHandler.in_flight = {}
+        StandInHandler.peak = {}
+        StandInHandler.peak_total = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port = self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_per_host_limit(self):
+        """Requests to each host never exceed the per-host limit, while hosts are fetched side by side."""
+        urls = [f"http://{host}:{self.port}/chapter-{i}" for host in ('127.0.0.1', 'localhost') for i in range(8)]
+
+        async def run():
+            async with AsyncFetchEngine(per_host_limit=2) as engine:
+                return await engine.fetch_all(urls)
+
+        pages = asyncio.run(run())
+
+        self.assertEqual(len(pages), len(urls))
+        self.assertTrue(all('Chapter 1: Local' in page for page in pages))
+        self.assertEqual(StandInHandler.peak, {'127.0.0.1': 2, 'localhost': 2})
+        # A busy host does not hold back the other one
+        self.assertEqual(StandInHandler.peak_total, 4)
+
+    def test_engine_outlives_event_loops(self):
+        engine = AsyncFetchEngine(per_host_limit=2)
+        urls = [f"http://127.0.0.1:{self.port}/chapter-{i}" for i in range(4)]
+        try:
+            # Each asyncio.run is a new loop, which gets semaphores of its own
+            for _ in range(2):
+                pages = asyncio.run(engine.fetch_all(urls))
+                self.assertTrue(all('Chapter 1: Local' in page for page in pages))
+        finally:
+            engine.close()
+
+    def test_challenge_returns_none(self):
+        async def run():
+            async with AsyncFetchEngine() as engine:
+                return await engine.fetch(f"http://127.0.0.1:{self.port}/challenge")
+
+        self.assertIsNone(asyncio.run(run()))
+
+    def test_site_chapter_content_async(self):
+        site = PenguinSquadSite(None, None)
+
+        async def run():
+            async with AsyncFetchEngine() as engine:
+                return await site.get_chapter_content_async(f"http://127.0.0.1:{self.port}/chapter-1", engine)
+
+        self.assertEqual(asyncio.run(run()), ("Chapter 1: Local", "Served by the stand-in server."))
+
+    def test_site_threads_share_the_engine(self):
+        """Tab threads fetch chapters through the engine, which keeps them within the per-host limit."""
+        http_session = HttpSession()
+        http_session.ready = True
+        engine = AsyncFetchEngine(http_session, per_host_limit=2)
+        site = PenguinSquadSite(None, None, http_session=http_session, fetch_engine=engine)
+        urls = [f"http://127.0.0.1:{self.port}/chapter-{i}" for i in range(6)]
+        try:
+            with ThreadPoolExecutor(max_workers=6) as executor:
+                chapters = list(executor.map(site.get_chapter_content, urls))
+        finally:
+            engine.close()
+            http_session.close()
+
+        self.assertEqual(chapters, [("Chapter 1: Local", "Served by the stand-in server.")] * 6)
+        self.assertEqual(StandInHandler.peak, {'127.0.0.1': 2})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import tempfile
+import threading
+import time
+import unittest
+
+from batch.jobs import JobFileError, defaults_from_args, downloader_options, load_job_file, parse_jobs
+from batch.scheduler import BatchScheduler
+from export.volumes import plan_volumes
+
+NU = 'https://www.novelupdates.com/series/'
+
+class TestJobFile(unittest.TestCase):
+    def test_settings_merge_job_over_site_over_defaults(self):
+        batch = parse_jobs({
+            'workers': 2,
+            'sites': {'genesistudio': {'max_jobs': 1, 'concurrency': 3}},
+            'defaults': {'stream_epub': True},
+            'jobs': [
+                {'site': 'Genesistudio', 'novelupdates_url': NU + 'a/'},
+                {'site': 'Genesistudio', 'novelupdates_url': NU + 'b/', 'concurrency': 1},
+                {'site': 'penguinsquad', 'novelupdates_url': NU + 'c/',
+                 'translation_url': 'https://penguin-squad.com/story/c/'},
+            ],
+        })
+        self.assertEqual(batch['workers'], 2)
+        self.assertEqual(batch['site_limits'], {'Genesistudio': 1})
+        first, second, third = batch['jobs']
+        self.assertEqual((first['concurrency'], second['concurrency'], third['concurrency']), (3, 1, 1))
+        self.assertTrue(all(job['stream_epub'] and job['update'] for job in batch['jobs']))
+        self.assertEqual(third['site'], 'PenguinSquad')
+
+    def test_invalid_jobs_are_rejected(self):
+        with self.assertRaises(JobFileError):
+            parse_jobs([{'site': 'Unknown', 'novelupdates_url': NU + 'a/'}])
+        with self.assertRaises(JobFileError):
+            parse_jobs([{'site': 'ReadingPia', 'novelupdates_url': NU + 'a/'}])
+        with self.assertRaises(JobFileError):
+            parse_jobs({'sites': {'ReadingPia': {'max_jobs': 0}}, 'jobs': []})
+
+    def test_volume_and_image_settings_reach_the_downloader(self):
+        # As parsed from: --volume-chapters 2 --image-workers 0 --cover-size 0
+        args = argparse.Namespace(allow_missing=False, cover_size=None, image_quality=85, image_workers=0,
+                                  image_budget=300, volume_chapters=2, volume_size=None, volume_workers=None)
+        batch = parse_jobs([
+            {'site': 'Genesistudio', 'novelupdates_url': NU + 'a/'},
+            {'site': 'Genesistudio', 'novelupdates_url': NU + 'b/', 'volume_chapters': None, 'volume_size': 0.5,
+             'cover_size': '600x800', 'image_budget': 100},
+        ], defaults=defaults_from_args(args))
+        first, second = (downloader_options(job) for job in batch['jobs'])
+
+        self.assertEqual((first['cover_size'], first['image_workers'], first['image_budget']), (None, 0, 300 * 1024))
+        self.assertEqual(plan_volumes(5, {}, first['volume_chapters'], first['volume_bytes']), [(0, 2), (2, 4), (4, 5)])
+        self.assertEqual((second['cover_size'], second['image_budget']), ((600, 800), 100 * 1024))
+        sizes = {position: 200 * 1024 for position in range(5)}
+        self.assertEqual(plan_volumes(5, sizes, second['volume_chapters'], second['volume_bytes']),
+                         [(0, 2), (2, 4), (4, 5)])
+
+    def test_load_json_and_yaml(self):
+        jobs = [{'site': 'Genesistudio', 'novelupdates_url': NU + 'a/'}]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'jobs.json')
+            with open(path, 'w') as file:
+                json.dump(jobs, file)
+            self.assertEqual(len(load_job_file(path)['jobs']), 1)
+
+            try:
+                import yaml
+            except ImportError:
+                return
+            path = os.path.join(directory, 'jobs.yaml')
+            with open(path, 'w') as file:
+                yaml.safe_dump({'jobs': jobs}, file)
+            self.assertEqual(load_job_file(path)['jobs'][0]['site'], 'Genesistudio')
+
+class TestBatchScheduler(unittest.TestCase):
+    def test_site_cap_does_not_block_other_sites(self):
+        jobs = [{'site': 'A', 'name': 'a1'}, {'site': 'A', 'name': 'a2'}, {'site': 'B', 'name': 'b1'}]
+        lock = threading.Lock()
+        running = {'A': 0}
+        peak = {'A': 0}
+        started = []
+
+        def run_job(job, slot):
+            with lock:
+                started.append(job['name'])
+                if job['site'] == 'A':
+                    running['A'] += 1
+                    peak['A'] = max(peak['A'], running['A'])
+            time.sleep(0.05)
+            with lock:
+                if job['site'] == 'A':
+                    running['A'] -= 1
+
+        results = BatchScheduler(jobs, run_job, ['tab1', 'tab2'], {'A': 1}).run()
+        self.assertTrue(all(result['ok'] for result in results))
+        self.assertEqual(peak['A'], 1)
+        # b1 starts while a1 runs instead of waiting behind a2
+        self.assertEqual(started[:2], ['a1', 'b1'])
+
+    def test_failed_job_does_not_stop_the_batch(self):
+        jobs = [{'site': 'A', 'name': 'bad'}, {'site': 'A', 'name': 'exit'}, {'site': 'A', 'name': 'good'}]
+
+        def run_job(job, slot):
+            if job['name'] == 'bad':
+                raise ValueError('broken page')
+            if job['name'] == 'exit':
+                sys.exit(1)
+
+        results = BatchScheduler(jobs, run_job, ['tab']).run()
+        self.assertEqual([result['ok'] for result in results], [False, False, True])
+        self.assertEqual(results[0]['error'], 'broken page')
+
+if __name__ == '__main__':
+    unittest.main()
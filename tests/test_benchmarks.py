@@ -0,0 +1,30 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+from benchmarks.run_benchmarks import DEFAULT_PAGES, SITE_PARSERS, compare
+
+class TestBenchmarks(unittest.TestCase):
+    def test_fixtures_parse(self):
+        # The suite is only meaningful while every saved page still parses to something
+        for site, path in DEFAULT_PAGES.items():
+            with open(path, encoding='utf-8') as f:
+                result = SITE_PARSERS[site](f.read())
+            self.assertTrue(result, site)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'commit': 'abc', 'timestamp': 't', 'results': {
+            'parse': {'site': {'page_bytes': 100, 'seconds': 1.0, 'pages_per_second': 1.0}},
+            'epub': {'streaming_100': {'seconds': 2.0, 'peak_rss_bytes': None}},
+        }}
+        current = {'results': {
+            'parse': {'site': {'page_bytes': 300, 'seconds': 0.5, 'pages_per_second': 0.8}},
+            'epub': {'streaming_100': {'seconds': 2.5, 'peak_rss_bytes': None}},
+        }}
+        self.assertEqual(compare(baseline, current, 0.1),
+                         ['epub.streaming_100.seconds', 'parse.site.pages_per_second'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+import CloudflareBypasser as cf_module
+from CloudflareBypasser import CloudflareBypasser, BypassStats, TURNSTILE_INPUT
+
+class FakeButton:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def click(self):
+        self.driver.clicks += 1
+
+class FakeNode:
+    """Resolves the parent().shadow_root.child()("tag:body").shadow_root("tag:input") chain to the button."""
+
+    def __init__(self, button):
+        self.button = button
+        self.shadow_root = self
+
+    def parent(self):
+        return self
+
+    def child(self):
+        return self
+
+    def __call__(self, locator):
+        return self.button if locator == "tag:input" else self
+
+class FakeDriver:
+    def __init__(self, clicks_needed):
+        self.url = "https://www.example.com/chapter/1"
+        self.clicks = 0
+        self.clicks_needed = clicks_needed
+        self.lookups = []
+
+    @property
+    def title(self):
+        return "Just a moment..." if self.clicks < self.clicks_needed else "Chapter 1"
+
+    def run_js(self, script):
+        return self.clicks < self.clicks_needed
+
+    def ele(self, locator, timeout=None):
+        self.lookups.append(locator)
+        return FakeNode(FakeButton(self)) if locator == TURNSTILE_INPUT else None
+
+class TestCloudflareBypasser(unittest.TestCase):
+    def setUp(self):
+        cf_module.locator_paths.clear()
+        self.saved_stats = cf_module.bypass_stats
+        self.stats = cf_module.bypass_stats = BypassStats()
+
+    def tearDown(self):
+        cf_module.bypass_stats = self.saved_stats
+
+    def test_no_challenge_is_not_counted(self):
+        CloudflareBypasser(FakeDriver(0), log=False).bypass()
+        self.assertEqual(self.stats.summary(), {})
+
+    def test_solved_challenge_is_recorded_and_path_cached(self):
+        driver = FakeDriver(2)
+        bypasser = CloudflareBypasser(driver, log=False, base_backoff=0.05, max_backoff=0.1)
+        bypasser.bypass()
+
+        self.assertTrue(bypasser.is_bypassed())
+        self.assertEqual(cf_module.locator_paths['www.example.com'], ('turnstile',))
+        stats = self.stats.summary()['www.example.com']
+        self.assertEqual((stats['challenges'], stats['solved'], stats['attempts']), (1, 1, 2))
+        # The second attempt reused the path found by the first one
+        self.assertEqual(stats['cached_path_hits'], 1)
+
+    def test_backoff_grows_with_jitter(self):
+        bypasser = CloudflareBypasser(FakeDriver(0), log=False, base_backoff=2, max_backoff=16)
+        for attempt, delay in ((1, 2), (2, 4), (3, 8), (4, 16), (6, 16)):
+            for _ in range(20):
+                self.assertTrue(delay / 2 <= bypasser.backoff_delay(attempt) <= delay)
+
+if __name__ == '__main__':
+    unittest.main()
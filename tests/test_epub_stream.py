@@ -0,0 +1,126 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import unittest
+import zipfile
+import xml.etree.ElementTree as ET
+
+from conftest import NOVEL_INFO
+from export.epub_stream import StreamingEpubWriter, chapter_file_name, MANIFEST_FILES
+from export.epub_update import AppendingEpubWriter, EpubUpdateError
+
+class TestStreamingEpubWriter(unittest.TestCase):
+    """Test case for writing EPUB files chapter by chapter."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "novel.epub")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_write_epub(self):
+        chapters = [
+            ("https://example.com/1", "Chapter 1: Start", "<p>First&nbsp;line<br>second line</p>"),
+            ("https://example.com/2", "Chapter 2 <Middle>", "Plain text chapter"),
+        ]
+        with StreamingEpubWriter(self.path, NOVEL_INFO) as writer:
+            writer.add_cover(b"\xff\xd8fake jpeg")
+            writer.add_info_page()
+            for url, title, content in chapters:
+                writer.add_chapter(title, content, chapter_file_name(url))
+
+        with zipfile.ZipFile(self.path) as epub_zip:
+            names = epub_zip.namelist()
+            self.assertEqual(names[0], "mimetype")
+            self.assertEqual(epub_zip.getinfo("mimetype").compress_type, zipfile.ZIP_STORED)
+            # The files rewritten on updates sit at the tail of the archive
+            self.assertEqual(tuple(names[-3:]), MANIFEST_FILES)
+
+            # Every XML file in the book must be well-formed
+            for name in names:
+                if name.endswith(('.xhtml', '.opf', '.ncx', '.xml')):
+                    ET.fromstring(epub_zip.read(name))
+
+            chapter = epub_zip.read(f"EPUB/{chapter_file_name('https://example.com/1')}").decode('utf-8')
+            self.assertIn("<br/>", chapter)
+            ncx = epub_zip.read("EPUB/toc.ncx").decode('utf-8')
+            self.assertIn("Chapter 2 &lt;Middle&gt;", ncx)
+            self.assertLess(ncx.index("Novel Information"), ncx.index("Chapter 1: Start"))
+
+    def test_append_chapters(self):
+        with StreamingEpubWriter(self.path, NOVEL_INFO) as writer:
+            writer.add_info_page()
+            for i in (1, 2):
+                writer.add_chapter(f"Chapter {i}", f"<p>{i}</p>", chapter_file_name(f"https://example.com/{i}"))
+
+        with zipfile.ZipFile(self.path) as epub_zip:
+            before = {info.filename: (info.header_offset, info.CRC) for info in epub_zip.infolist()}
+
+        # A new chapter appears between the existing ones
+        with AppendingEpubWriter(self.path, NOVEL_INFO) as writer:
+            for i in (1, 3, 2):
+                href = chapter_file_name(f"https://example.com/{i}")
+                if writer.has_chapter(href):
+                    writer.add_existing_chapter(f"Chapter {i}", href)
+                else:
+                    writer.add_chapter(f"Chapter {i}", f"<p>{i}</p>", href)
+        self.assertEqual(writer.added, 1)
+
+        with zipfile.ZipFile(self.path) as epub_zip:
+            self.assertIsNone(epub_zip.testzip())
+            names = epub_zip.namelist()
+            self.assertEqual(tuple(names[-3:]), MANIFEST_FILES)
+            self.assertEqual(len(names), len(set(names)))
+            # Entries that were already there were not moved or rewritten
+            for info in epub_zip.infolist():
+                if info.filename in before and info.filename not in MANIFEST_FILES:
+                    self.assertEqual((info.header_offset, info.CRC), before[info.filename])
+
+            ncx = epub_zip.read("EPUB/toc.ncx").decode('utf-8')
+            positions = [ncx.index(f"Chapter {i}<") for i in (1, 3, 2)]
+            self.assertEqual(positions, sorted(positions))
+            self.assertIn("Novel Information", ncx)
+            ET.fromstring(epub_zip.read("EPUB/content.opf"))
+
+    def test_append_replaces_placeholders(self):
+        hrefs = [chapter_file_name(f"https://example.com/{i}") for i in range(1, 5)]
+        with StreamingEpubWriter(self.path, NOVEL_INFO) as writer:
+            writer.add_cover(b"\xff\xd8fake jpeg")
+            writer.add_info_page()
+            # Chapters 1 and 3 could not be downloaded the first time
+            for i, href in enumerate(hrefs, 1):
+                if i % 2:
+                    writer.add_chapter(f"Chapter {i} (missing)", "<p>Missing</p>", f"missing_{i}.xhtml")
+                else:
+                    writer.add_chapter(f"Chapter {i}", f"<p>{i}</p>", href)
+
+        with AppendingEpubWriter(self.path, NOVEL_INFO) as writer:
+            for i, href in enumerate(hrefs, 1):
+                if writer.has_chapter(href):
+                    writer.add_existing_chapter(f"Chapter {i}", href)
+                else:
+                    writer.add_chapter(f"Chapter {i}", f"<p>{i}</p>", href)
+        self.assertEqual(writer.added, 2)
+
+        with zipfile.ZipFile(self.path) as epub_zip:
+            opf = ET.fromstring(epub_zip.read("EPUB/content.opf"))
+            # The navigation document comes first, without a TOC entry
+            spine = [itemref.get('idref') for itemref in opf.iter('{http://www.idpf.org/2007/opf}itemref')][1:]
+            self.assertEqual(spine[:2], ['cover', 'intro'])
+            self.assertEqual(spine[2:], [href.rsplit('.', 1)[0] for href in hrefs])
+            manifest = epub_zip.read("EPUB/content.opf").decode('utf-8')
+            self.assertNotIn("missing_", manifest)
+            self.assertNotIn("(missing)", epub_zip.read("EPUB/toc.ncx").decode('utf-8'))
+
+    def test_append_rejects_foreign_epub(self):
+        with zipfile.ZipFile(self.path, 'w') as epub_zip:
+            epub_zip.writestr('mimetype', 'application/epub+zip')
+            epub_zip.writestr('EPUB/content.opf', '<package/>')
+        with self.assertRaises(EpubUpdateError):
+            AppendingEpubWriter(self.path, NOVEL_INFO)
+
+if __name__ == '__main__':
+    unittest.main()
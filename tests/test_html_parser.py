@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+from source import html_parser
+from source.cleanup import clean_readingpia_chapter, parse_penguin_squad_chapter
+from source.NU_getchapterlink import parse_novel_info, parse_chapter_list, parse_post_id
+from source.html_parser import available_backends, parse_html
+from source.readingpia_site import ReadingPiaSite
+
+NU_PAGE = '''<html><head>
+<meta property="og:title" content="Some Novel"><meta property="og:image" content="https://example.com/c.jpg">
+<meta property="og:description" content="A &amp; B">
+</head><body>
+<input type="hidden" id="mypostid" value="4321">
+<a id="authtag">Author Name</a><a class="genre type">Web Novel</a><a class="genre">Not a type</a>
+<div id="editassociated">Other Name<br>Another Name</div>
+<div id="seriesgenre"><a class="genre" href="/g/1"> Action </a><a class="genre" href="/g/2">Fantasy</a></div>
+<div id="showtags"><a class="genre">Magic</a></div>
+<ol class="sp_chp">
+<li class="sp_li_chp"><a href="//www.novelupdates.com/nu_goto_chapter/"></a><a href="//www.novelupdates.com/extnu/2/">c2</a></li>
+<li class="sp_li_chp"><a href="//www.novelupdates.com/extnu/1/">c1</a></li>
+</ol></body></html>'''
+
+PENGUIN_PAGE = '''<html><body><h1 class="chapter__title"> Chapter 1 </h1>
+<section id="chapter-content"><p>Hello <b>there</b></p></section></body></html>'''
+
+class TestHtmlParserBackends(unittest.TestCase):
+    def tearDown(self):
+        html_parser.set_backend(available_backends()[0])
+
+    def test_backends_agree(self):
+        expected_info = {
+            'title': 'Some Novel', 'cover': 'https://example.com/c.jpg', 'author': 'Author Name',
+            'type': 'Web Novel', 'associated_names': ['Other NameAnother Name'], 'genre': 'Action, Fantasy',
+            'tags': 'Magic', 'description': 'A & B',
+        }
+        expected_links = ['https://www.novelupdates.com/extnu/1/', 'https://www.novelupdates.com/extnu/2/']
+        for backend in available_backends():
+            with self.subTest(backend=backend):
+                html_parser.set_backend(backend)
+                self.assertEqual(parse_novel_info(NU_PAGE), expected_info)
+                self.assertEqual(parse_chapter_list(NU_PAGE), expected_links)
+                self.assertEqual(parse_post_id(NU_PAGE), '4321')
+                self.assertEqual(parse_post_id('<link rel="shortlink" href="https://www.novelupdates.com/?p=99">'), '99')
+
+                document = parse_html(NU_PAGE)
+                self.assertIsNone(document.select_one('div#missing'))
+                self.assertEqual(document.select_one('a#authtag').get('href', 'none'), 'none')
+
+    def test_chapter_cleanup_is_backend_independent(self):
+        with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_output.html')) as f:
+            readingpia_page = f.read()
+
+        results = {}
+        for backend in available_backends():
+            html_parser.set_backend(backend)
+            results[backend] = (clean_readingpia_chapter(readingpia_page), parse_penguin_squad_chapter(PENGUIN_PAGE))
+
+        self.assertEqual(results['html.parser'][1], ("Chapter 1", "Hello there"))
+        self.assertIn("I was 11 years old", results['html.parser'][0][1])
+        for backend, result in results.items():
+            with self.subTest(backend=backend):
+                self.assertEqual(result, results['html.parser'])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            html_parser.set_backend('regex')
+
+class TestReadingPiaDocuments(unittest.TestCase):
+    def test_get_soup_keeps_the_beautifulsoup_api(self):
+        site = ReadingPiaSite(None, None)
+        site.fetch_html = lambda url: '<div class="chapter-list"><a href="/1">One</a></div>'
+        soup = site.get_soup("https://www.readingpia.me/novel")
+        self.assertEqual(soup.find('div', class_='chapter-list').find('a')['href'], "/1")
+        self.assertEqual(site.get_document("https://www.readingpia.me/novel").select_one('a')['href'], "/1")
+
+        site.fetch_html = lambda url: None
+        self.assertIsNone(site.get_soup("https://www.readingpia.me/novel"))
+
+if __name__ == '__main__':
+    unittest.main()
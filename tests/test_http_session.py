@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from fetch.http_session import HttpSession
+
+CHAPTER_HTML = """
+<html><body>
+<h1 class="chapter__title">Chapter 1: Local</h1>
+<section id="chapter-content">Served by the stand-in server.</section>
+</body></html>
+"""
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves chapter pages, redirects and challenges slowly, like a translation site."""
+    def do_GET(self):
+        time.sleep(0.1)
+        if self.path.startswith('/extnu/'):
+            self.send_response(302)
+            self.send_header('Location', f"/viewer/{self.path.rsplit('/', 2)[-2]}")
+            self.end_headers()
+        elif self.path.startswith('/challenge'):
+            self.send_response(403)
+            self.send_header('cf-mitigated', 'challenge')
+            self.end_headers()
+            self.wfile.write(b'<title>Just a moment...</title>')
+        else:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.end_headers()
+            self.wfile.write(CHAPTER_HTML.encode('utf-8'))
+
+    def do_HEAD(self):
+        # The chapter list page carries an ETag and honours conditional requests
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+        else:
+            self.send_response(200)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Content-Type', 'text/html')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class TestRedirectResolution(unittest.TestCase):
+    """Test case for resolving redirect links over the HTTP fast path."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.session = HttpSession()
+        self.session.ready = True
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_resolve_redirects(self):
+        links = [f"{self.base}/extnu/{i}/" for i in range(6)] + [f"{self.base}/chapter-1", f"{self.base}/challenge"]
+        start = time.perf_counter()
+        redirects = self.session.resolve_redirects(links, workers=6)
+
+        # Resolved side by side, without following the redirects
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(redirects, {f"{self.base}/extnu/{i}/": f"{self.base}/viewer/{i}" for i in range(6)})
+
+    def test_challenge_returns_none(self):
+        self.assertIsNone(self.session.get(f"{self.base}/challenge"))
+        self.assertIn("Chapter 1: Local", self.session.get(f"{self.base}/chapter-1"))
+
+    def test_not_ready(self):
+        self.session.ready = False
+        self.assertEqual(self.session.resolve_redirects([f"{self.base}/extnu/1/"]), {})
+        self.assertIsNone(self.session.probe(f"{self.base}/series/"))
+
+    def test_conditional_probe(self):
+        self.assertEqual(self.session.probe(f"{self.base}/series/"), (True, '"v1"', None))
+        self.assertEqual(self.session.probe(f"{self.base}/series/", etag='"v1"'), (False, '"v1"', None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import unittest
+import zipfile
+
+from conftest import GIF, NOVEL_INFO, FakeFetcher
+from export.epub_stream import StreamingEpubWriter, chapter_file_name
+from export.epub_update import AppendingEpubWriter
+from export.inline_images import ImageStage, image_href, image_urls, rewrite_image_sources
+
+class TestInlineImages(unittest.TestCase):
+    def test_collect_and_rewrite(self):
+        content = ('<p><img alt="a" src="/img/a.png" srcset="/img/a-2x.png 2x"/>'
+                   "<img src='https://cdn.test/b.gif?x=1&amp;y=2'><img src=\"data:image/png;base64,AA\"></p>")
+        urls = image_urls(content, "https://novel.test/chapter-1")
+        self.assertEqual(urls, ["https://novel.test/img/a.png", "https://cdn.test/b.gif?x=1&y=2"])
+
+        rewritten = rewrite_image_sources(content, {urls[0]: "images/a.png"}, "https://novel.test/chapter-1")
+        self.assertIn('<img alt="a" src="images/a.png"/>', rewritten)
+        self.assertIn("src='https://cdn.test/b.gif?x=1&amp;y=2'", rewritten)
+
+    def test_stage_fetches_each_image_once(self):
+        fetcher = FakeFetcher()
+        stage = ImageStage(fetcher, workers=4, lookahead=1)
+        shared = "https://cdn.test/shared.gif"
+        chapters = [
+            ("Chapter 1", f'<img src="{shared}"><img src="https://cdn.test/broken.gif">', "c1.xhtml", None),
+            ("Chapter 2", f'<img src="{shared}">', "c2.xhtml", None),
+            ("Chapter 3", None, "c3.xhtml", None),
+        ]
+        results = list(stage.embed(chapters))
+
+        self.assertEqual(sorted(fetcher.fetched), ["https://cdn.test/broken.gif", shared])
+        href = image_href(shared, 'image/gif')
+        self.assertEqual(results[0][3], [(href, GIF, 'image/gif')])
+        self.assertEqual(results[1][3], [])
+        self.assertIn(f'src="{href}"', results[1][1])
+        # An image that could not be fetched keeps its remote source
+        self.assertIn('src="https://cdn.test/broken.gif"', results[0][1])
+        self.assertEqual(results[2], ("Chapter 3", None, "c3.xhtml", []))
+        self.assertEqual((stage.embedded, stage.failed), (1, 1))
+
+    def test_update_keeps_images_already_in_book(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "novel.epub")
+            href = image_href("https://cdn.test/a.gif", 'image/gif')
+            with StreamingEpubWriter(path, NOVEL_INFO) as writer:
+                writer.add_info_page()
+                writer.add_item(href, GIF, 'image/gif')
+                writer.add_chapter("Chapter 1", f'<img src="{href}"/>', chapter_file_name("https://a.test/1"))
+
+            with AppendingEpubWriter(path, NOVEL_INFO) as writer:
+                writer.add_existing_chapter("Chapter 1", chapter_file_name("https://a.test/1"))
+                writer.add_item(href, GIF, 'image/gif')
+                writer.add_chapter("Chapter 2", f'<img src="{href}"/>', chapter_file_name("https://a.test/2"))
+
+            with zipfile.ZipFile(path) as epub_zip:
+                self.assertEqual(epub_zip.namelist().count(f"EPUB/{href}"), 1)
+                self.assertEqual(epub_zip.read("EPUB/content.opf").decode('utf-8').count(href), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+from fetch.lean_profile import LeanProfile, BLOCKED_RESOURCE_TYPES, TRACKER_URL_PATTERNS
+
+class FakeDriver:
+    def __init__(self):
+        self.listeners = {}
+
+    def set_listener(self, event, callback):
+        self.listeners[event] = callback
+
+class FakePage:
+    def __init__(self):
+        self.driver = FakeDriver()
+        self.commands = []
+
+    def run_cdp(self, cmd, **cmd_args):
+        self.commands.append((cmd, cmd_args))
+        return {}
+
+    def pause(self, url, resource_type):
+        self.driver.listeners['Fetch.requestPaused'](
+            requestId=f"id-{len(self.commands)}", request={'url': url}, resourceType=resource_type)
+        return self.commands[-1][0]
+
+class TestLeanProfile(unittest.TestCase):
+    def test_apply_enables_blocking(self):
+        page = FakePage()
+        LeanProfile().apply(page)
+        commands = dict(page.commands)
+        self.assertEqual(commands['Network.setBlockedURLs'], {'urls': TRACKER_URL_PATTERNS})
+        self.assertEqual([pattern['resourceType'] for pattern in commands['Fetch.enable']['patterns']],
+                         list(BLOCKED_RESOURCE_TYPES))
+
+    def test_paused_requests_are_failed_unless_allowed(self):
+        page = FakePage()
+        profile = LeanProfile()
+        profile.allow("https://cdn.example.com/cover.jpg")
+        profile.apply(page)
+
+        self.assertEqual(page.pause("https://cdn.example.com/banner.png", 'Image'), 'Fetch.failRequest')
+        self.assertEqual(page.pause("https://cdn.example.com/site.css", 'Stylesheet'), 'Fetch.failRequest')
+        self.assertEqual(page.pause("https://cdn.example.com/cover.jpg", 'Image'), 'Fetch.continueRequest')
+        self.assertEqual(page.pause("https://challenges.cloudflare.com/turnstile/v0/i.png", 'Image'),
+                         'Fetch.continueRequest')
+        self.assertEqual(page.pause("https://novel.example.com/cdn-cgi/images/trace.png", 'Image'),
+                         'Fetch.continueRequest')
+        self.assertEqual(profile.blocked, {'Image': 1, 'Stylesheet': 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+import tempfile
+import unittest
+
+from cache.library import Library
+from cache.novel_cache import NovelCache
+
+class TestLibrary(unittest.TestCase):
+    """Test case for the library database shared by every cached novel."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_identical_content_is_stored_once(self):
+        first = NovelCache("First Novel", cache_dir=self.tmp_dir.name)
+        mirror = NovelCache("Mirror Novel", cache_dir=self.tmp_dir.name)
+        first.cache_chapters([("https://a.com/1", 0, "Chapter 1", "<p>same</p>"),
+                              ("https://a.com/2", 1, "Chapter 2", "<p>only here</p>")])
+        mirror.cache_chapter("https://b.com/1", 0, "Chapter 1", "<p>same</p>")
+        first.cache_asset("https://a.com/cover.jpg", b"\xff\xd8cover")
+        mirror.cache_asset("https://b.com/cover.jpg", b"\xff\xd8cover")
+
+        self.assertEqual(mirror.get_cached_chapter("https://b.com/1"), ("Chapter 1", "<p>same</p>"))
+        self.assertEqual(mirror.get_asset("https://b.com/cover.jpg"), (b"\xff\xd8cover", None))
+        self.assertIsNone(first.get_cached_chapter("https://b.com/1"))
+        first.close()
+        mirror.close()
+
+        library = Library(self.tmp_dir.name)
+        self.assertEqual(library.storage()['blobs'], 3)
+        self.assertEqual([(novel['title'], novel['chapters']) for novel in library.novels()],
+                         [("First Novel", 2), ("Mirror Novel", 1)])
+        library.close()
+
+    def test_status_and_renamed_series(self):
+        cache = NovelCache("Old Title", cache_dir=self.tmp_dir.name, series_id=42)
+        links = [f"https://a.com/{i}" for i in range(3)]
+        cache.start_work(links)
+        cache.cache_chapter(links[0], 0, "Chapter 1", "<p>0</p>")
+        cache.mark_failed(links[1], "timed out")
+        cache.close()
+
+        # The post id finds the novel under its new title
+        cache = NovelCache("New Title", cache_dir=self.tmp_dir.name, series_id="42")
+        self.assertEqual(cache.get_cached_chapter(links[0]), ("Chapter 1", "<p>0</p>"))
+        cache.close()
+
+        library = Library(self.tmp_dir.name)
+        status = library.find(series_id=42)
+        self.assertEqual((status['title'], status['done'], status['failed'], status['pending']),
+                         ("New Title", 1, 1, 1))
+        library.close()
+
+    def test_per_title_databases_are_imported(self):
+        for title, content in (("Novel_A", "<p>a</p>"), ("Novel_B", "<p>a</p>")):
+            connection = sqlite3.connect(os.path.join(self.tmp_dir.name, f"{title}.db"))
+            connection.execute("CREATE TABLE novel_info (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute("INSERT INTO novel_info VALUES ('title', ?)", (title.replace("_", " "),))
+            connection.execute("CREATE TABLE chapters (url TEXT PRIMARY KEY, position INTEGER, title TEXT, "
+                               "content TEXT, content_hash TEXT, updated_at REAL)")
+            connection.execute("INSERT INTO chapters VALUES ('https://a.com/1', 0, 'Chapter 1', ?, 'x', 0)", (content,))
+            connection.commit()
+            connection.close()
+
+        library = Library(self.tmp_dir.name)
+        self.assertEqual([novel['title'] for novel in library.novels()], ["Novel A", "Novel B"])
+        self.assertEqual(library.storage()['blobs'], 1)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, "Novel_A.db.migrated")))
+        library.close()
+
+        cache = NovelCache("Novel B", cache_dir=self.tmp_dir.name)
+        self.assertEqual(cache.get_all_cached_chapters(), [(0, "Chapter 1", "<p>a</p>")])
+        cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import tempfile
+import unittest
+
+from report.metrics import (Metrics, build_report, host_of, metrics, prometheus_text, write_json_report,
+                            write_prometheus_textfile)
+from source.cleanup import extract_genesistudio_chapter
+from source.postprocess import ChapterPostProcessor
+
+GENESISTUDIO_HTML = '''<html><body><main><h1 class="sr-only">Read Some Novel - Chapter 1: Rain | Genesis</h1>
+<div class="break-words"><p>It rained.</p></div><div class="mb-48"></div></main></body></html>'''
+
+class TestMetrics(unittest.TestCase):
+    def test_spans_and_counters(self):
+        recorder = Metrics()
+        for elapsed in (0.1, 0.2, 0.3, 0.4):
+            recorder.record('navigation', 'example.com', elapsed)
+        with self.assertRaises(ValueError):
+            with recorder.span('parse', 'example.com'):
+                raise ValueError
+        recorder.count('bytes_fetched', 'example.com', 1000)
+        recorder.count('bytes_fetched', 'example.com', 500)
+
+        summary = recorder.summary()
+        navigation = summary['phases']['navigation']['example.com']
+        self.assertEqual((navigation['count'], navigation['p50'], navigation['max']), (4, 0.3, 0.4))
+        # A span is recorded even when the block raises
+        self.assertEqual(summary['phases']['parse']['example.com']['count'], 1)
+        self.assertEqual(summary['counters'], {'bytes_fetched': {'example.com': 1500}})
+
+    def test_host_of(self):
+        self.assertEqual(host_of("https://www.NovelUpdates.com/series/x/"), "novelupdates.com")
+        self.assertEqual(host_of(None), "unknown")
+
+    def test_parse_time_is_measured_in_worker(self):
+        metrics.reset()
+        with ChapterPostProcessor(workers=1) as processor:
+            title, _ = processor.submit(extract_genesistudio_chapter, GENESISTUDIO_HTML, 'genesistudio.com').result()
+        self.assertEqual(title, "Chapter 1: Rain")
+        self.assertEqual(metrics.summary()['phases']['parse']['genesistudio.com']['count'], 1)
+
+    def test_reports(self):
+        metrics.reset()
+        metrics.record('epub_build', None, 1.5)
+        metrics.count('retries', 'readingpia.me', 2)
+        report = build_report()
+
+        text = prometheus_text(report)
+        self.assertIn('novel_downloader_phase_seconds_count{phase="epub_build",site="all"} 1', text)
+        self.assertIn('novel_downloader_retries_total{site="readingpia.me"} 2', text)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'reports', 'run.json')
+            write_json_report(path, report)
+            with open(path) as file:
+                self.assertEqual(json.load(file)['counters'], {'retries': {'readingpia.me': 2}})
+            write_prometheus_textfile(os.path.join(directory, 'run.prom'), report)
+            self.assertEqual(sorted(os.listdir(directory)), ['reports', 'run.prom'])
+
+if __name__ == '__main__':
+    unittest.main()
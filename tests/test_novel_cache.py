@@ -0,0 +1,189 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from cache.novel_cache import NovelCache, _site_filter, content_hash
+
+class TestNovelCache(unittest.TestCase):
+    """Test case for the SQLite chapter cache."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = NovelCache("Test Novel", cache_dir=self.tmp_dir.name, batch_size=10, flush_interval=60)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_wal_mode(self):
+        self.cache.cursor.execute("PRAGMA journal_mode")
+        self.assertEqual(self.cache.cursor.fetchone()[0], "wal")
+
+    def test_queued_chapters_are_batched(self):
+        for i in range(5):
+            self.cache.queue_chapter(f"https://example.com/{i}", i, f"Chapter {i + 1}", f"<p>{i}</p>")
+
+        # Still buffered, but visible to readers of this cache
+        other = NovelCache("Test Novel", cache_dir=self.tmp_dir.name)
+        self.assertEqual(other.get_all_cached_chapters(), [])
+        self.assertEqual(self.cache.get_cached_chapter("https://example.com/3"), ("Chapter 4", "<p>3</p>"))
+
+        self.cache.flush()
+        self.assertEqual(len(other.get_all_cached_chapters()), 5)
+        other.close()
+
+    def test_state_changes_are_batched_and_counted(self):
+        links = [f"https://example.com/{i}" for i in range(6)]
+        self.cache.start_work(links, refetch=True)
+        counts = "SELECT chapters, cached, pending, in_flight, done, failed FROM novels WHERE novel_id = ?"
+
+        for link in links[:4]:
+            self.cache.mark_in_flight(link)
+        self.cache.mark_failed(links[3], "timed out")
+        self.cache.queue_chapter(links[0], 0, "Chapter 1", "<p>0</p>")
+        self.cache.queue_chapter(links[1], 1, "Chapter 2", "<p>1</p>")
+        # Nothing reaches the database before the batch is written
+        self.assertEqual(self.cache.cursor.execute(counts, (self.cache.novel_id,)).fetchone(), (0, 0, 6, 0, 0, 0))
+
+        self.cache.flush()
+        self.cache.cache_chapter("https://example.com/unlisted", None, "Extra", "<p>x</p>")
+        incremental = self.cache.cursor.execute(counts, (self.cache.novel_id,)).fetchone()
+        self.assertEqual(incremental, (2, 3, 2, 1, 2, 1))
+        with self.cache.connection:
+            self.cache._refresh_counts()
+        self.assertEqual(self.cache.cursor.execute(counts, (self.cache.novel_id,)).fetchone(), incremental)
+
+    def test_site_filter_matches_only_the_site(self):
+        self.cache.cache_chapters([("https://www.a_b.com/1", 0, "1", "<p>1</p>"), ("http://a_b.com/2", 1, "2", "<p>2</p>"),
+                                   ("https://aXb.com/3", 2, "3", "<p>3</p>"), ("https://a_b.com.evil/4", 3, "4", "<p>4</p>")])
+        where, patterns = _site_filter('url', "a_b.com")
+        self.cache.cursor.execute(f"SELECT url FROM chapters WHERE {where} ORDER BY url", patterns)
+        self.assertEqual([row[0] for row in self.cache.cursor.fetchall()], ["http://a_b.com/2", "https://www.a_b.com/1"])
+
+    def test_concurrent_workers(self):
+        def worker(offset):
+            for i in range(offset, offset + 100):
+                self.cache.queue_chapter(f"https://example.com/{i}", i, f"Chapter {i + 1}", "content")
+
+        threads = [threading.Thread(target=worker, args=(n * 100,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        chapters = self.cache.get_all_cached_chapters()
+        self.assertEqual([row[0] for row in chapters], list(range(400)))
+
+    def test_update_follows_urls(self):
+        links = [f"https://example.com/{i}" for i in range(5)]
+        for i, link in enumerate(links):
+            self.cache.cache_chapter(link, i, f"Chapter {i + 1}", f"<p>{i}</p>" if i != 4 else "")
+
+        # The translator inserts a chapter in the middle and removes the first one
+        links = links[1:3] + ["https://example.com/new"] + links[3:]
+        to_fetch = self.cache.start_work(links)
+
+        # Besides the new chapter, only the one cached without content is fetched again
+        self.assertEqual(to_fetch, [(2, "https://example.com/new"), (4, "https://example.com/4")])
+        self.assertEqual([row[1] for row in self.cache.get_all_cached_chapters()],
+                         ["Chapter 2", "Chapter 3", "Chapter 4"])
+
+    def test_legacy_cache_migration(self):
+        db_name = os.path.join(self.tmp_dir.name, "Old_Novel.db")
+        connection = sqlite3.connect(db_name)
+        connection.execute("CREATE TABLE chapters (chapter_number INTEGER PRIMARY KEY, title TEXT, content TEXT)")
+        connection.executemany("INSERT INTO chapters VALUES (?, ?, ?)", [(0, "Chapter 1", "a"), (1, "Chapter 2", "b")])
+        connection.commit()
+        connection.close()
+
+        cache = NovelCache("Old Novel", cache_dir=self.tmp_dir.name)
+        self.assertEqual(cache.count_cached_chapters(), 2)
+        to_fetch = cache.start_work(["https://example.com/1", "https://example.com/2", "https://example.com/3"])
+        self.assertEqual(to_fetch, [(2, "https://example.com/3")])
+        self.assertEqual(cache.get_cached_chapter("https://example.com/2"), ("Chapter 2", "b"))
+        cache.close()
+
+    def test_chapters_are_compressed(self):
+        content = "<p>Some chapter text.</p>" * 200
+        self.cache.cache_chapter("https://example.com/1", 0, "Chapter 1", content)
+
+        self.cache.cursor.execute("SELECT typeof(data), length(data) FROM blobs WHERE hash = ?", (content_hash(content),))
+        stored_type, stored_length = self.cache.cursor.fetchone()
+        self.assertEqual(stored_type, "blob")
+        self.assertLess(stored_length, len(content) // 10)
+        self.assertEqual(self.cache.get_cached_chapter("https://example.com/1"), ("Chapter 1", content))
+
+    def test_plain_text_cache_is_compressed_once(self):
+        db_name = os.path.join(self.tmp_dir.name, "Text_Novel.db")
+        connection = sqlite3.connect(db_name)
+        connection.execute("CREATE TABLE chapters (url TEXT PRIMARY KEY, position INTEGER, title TEXT, "
+                           "content TEXT, content_hash TEXT, updated_at REAL)")
+        connection.execute("INSERT INTO chapters VALUES ('https://example.com/1', 0, 'Chapter 1', '<p>a</p>', 'x', 0)")
+        connection.commit()
+        connection.close()
+
+        cache = NovelCache("Text Novel", cache_dir=self.tmp_dir.name)
+        cache.cursor.execute("SELECT typeof(data) FROM blobs WHERE hash = ?", (content_hash('<p>a</p>'),))
+        self.assertEqual(cache.cursor.fetchone()[0], "blob")
+        self.assertEqual(cache.get_all_cached_chapters(), [(0, "Chapter 1", "<p>a</p>")])
+        cache.close()
+
+    def test_chapter_list_ttl(self):
+        source_url = "https://www.novelupdates.com/series/test-novel/"
+        self.assertIsNone(self.cache.get_chapter_list(source_url, ttl=3600))
+
+        links = [f"https://example.com/{i}" for i in range(3)]
+        self.assertEqual(self.cache.cache_chapter_list(source_url, links), 3)
+        self.assertEqual(self.cache.get_chapter_list(source_url, ttl=3600), links)
+        self.assertIsNone(self.cache.get_chapter_list(source_url, ttl=0))
+
+        # Two chapters after the last one seen, wherever the list changed before it
+        updated = links[1:] + ["https://example.com/3", "https://example.com/4"]
+        self.assertEqual(self.cache.cache_chapter_list(source_url, updated), 2)
+        self.assertEqual(self.cache.get_chapter_list(source_url, ttl=3600), updated)
+
+    def test_redirects(self):
+        self.cache.cache_redirects([("https://nu/extnu/1/", "https://tl/1"), ("https://nu/extnu/2/", "https://tl/2")])
+        self.assertEqual(self.cache.get_redirects(["https://nu/extnu/2/", "https://nu/extnu/3/"]),
+                         {"https://nu/extnu/2/": "https://tl/2"})
+
+        # A None target forgets a stale redirect
+        self.cache.cache_redirects([("https://nu/extnu/1/", None)])
+        self.assertEqual(self.cache.get_redirects(), {"https://nu/extnu/2/": "https://tl/2"})
+
+    def test_work_queue_resumes_after_crash(self):
+        links = [f"https://example.com/{i}" for i in range(4)]
+        self.assertEqual(self.cache.start_work(links, refetch=True), list(enumerate(links)))
+
+        # Chapter 0 is written, chapter 1 fails, chapter 2 is being fetched when the process dies
+        for link in links[:3]:
+            self.cache.mark_in_flight(link)
+        self.cache.cache_chapter(links[0], 0, "Chapter 1", "<p>0</p>")
+        self.cache.mark_failed(links[1], "timed out")
+        self.cache.close()
+
+        self.cache = NovelCache("Test Novel", cache_dir=self.tmp_dir.name)
+        self.assertEqual(self.cache.missing_chapters(), [(1, links[1], 1, "timed out"), (2, links[2], 1, None),
+                                                         (3, links[3], 0, None)])
+        # Even when asked to fetch everything, the unfinished download resumes without redoing chapter 0
+        self.assertEqual(self.cache.start_work(links, refetch=True), list(enumerate(links))[1:])
+        for i, link in enumerate(links[1:], 1):
+            self.cache.cache_chapter(link, i, f"Chapter {i + 1}", f"<p>{i}</p>")
+        self.assertEqual(self.cache.work_summary(), {'done': 4})
+        self.assertEqual(self.cache.missing_chapters(), [])
+
+        # A finished download starts over on the next refetch
+        self.assertEqual(len(self.cache.start_work(links, refetch=True)), 4)
+        self.assertEqual(self.cache.start_work(links), [])
+
+    def test_novel_info(self):
+        self.cache.cache_novel_info({'title': "Test Novel", 'author': "Someone"})
+        self.assertEqual(self.cache.get_novel_info(), {'title': "Test Novel", 'author': "Someone"})
+
+if __name__ == '__main__':
+    unittest.main()
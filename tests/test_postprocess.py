@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+from source.cleanup import (PaywallException, PENGUIN_SQUAD_PAYWALL_MESSAGE, clean_readingpia_chapter,
+                            extract_genesistudio_chapter, parse_penguin_squad_chapter)
+from source import html_parser
+from source.postprocess import ChapterPostProcessor
+
+READINGPIA_HTML = '''<html><body><div class="chapter-body" data-theme="default" id="chapter-body" style="">
+<div style="text-align: center;"><strong>Chapter 3: The Thief</strong>
+<p>I was 11 years old, and... a thief.</p>
+<div class="m_ad_code">advert</div>
+<p>Join Discord https://discord.com/invite/abcdefghij</p>
+</div></div></body></html>'''
+
+GENESISTUDIO_HTML = '''<html><body><main><h1 class="sr-only">Read Some Novel - Chapter 12: Rain &amp; Ash | Genesis</h1>
+<div class="break-words"><p>It rained.</p></div><div class="mb-48"></div></main></body></html>'''
+
+def parse_with_backend(html):
+    return html_parser.get_backend(), html
+
+def penguin_html(content):
+    return f'''<html><body><h1 class="chapter__title"> Chapter 1 </h1>
+<section id="chapter-content"><p>{content}</p></section></body></html>'''
+
+class TestChapterCleanup(unittest.TestCase):
+    def test_readingpia_cleanup(self):
+        title, content = clean_readingpia_chapter(READINGPIA_HTML)
+        self.assertEqual(title, "Chapter 3: The Thief")
+        self.assertIn("a thief.", content)
+        self.assertNotIn("advert", content)
+        self.assertNotIn("Discord", content)
+        self.assertNotIn("discord.com", content)
+
+        self.assertEqual(clean_readingpia_chapter("<html></html>"), ("", ""))
+
+    def test_genesistudio_extraction(self):
+        title, content = extract_genesistudio_chapter(GENESISTUDIO_HTML)
+        self.assertEqual(title, "Chapter 12: Rain & Ash")
+        self.assertEqual(content, '<div class="break-words"><p>It rained.</p></div>')
+
+    def test_penguin_squad_paywall(self):
+        self.assertEqual(parse_penguin_squad_chapter(penguin_html("Hello")), ("Chapter 1", "Hello"))
+        with self.assertRaises(PaywallException):
+            parse_penguin_squad_chapter(penguin_html(PENGUIN_SQUAD_PAYWALL_MESSAGE))
+
+class TestChapterPostProcessor(unittest.TestCase):
+    def test_process_pool_matches_inline(self):
+        pages = [READINGPIA_HTML, GENESISTUDIO_HTML]
+        parsers = [clean_readingpia_chapter, extract_genesistudio_chapter]
+        with ChapterPostProcessor(0) as inline, ChapterPostProcessor(2) as pool:
+            expected = [inline.submit(parse, html).result() for parse, html in zip(parsers, pages)]
+            futures = [pool.submit(parse, html) for parse, html in zip(parsers, pages)]
+            self.assertEqual([future.result() for future in futures], expected)
+
+    def test_errors_are_raised_from_result(self):
+        html = penguin_html(PENGUIN_SQUAD_PAYWALL_MESSAGE)
+        for workers in (0, 1):
+            with ChapterPostProcessor(workers) as processor:
+                future = processor.submit(parse_penguin_squad_chapter, html)
+                with self.assertRaises(PaywallException):
+                    future.result()
+
+    def test_workers_use_the_selected_backend(self):
+        default = html_parser.get_backend()
+        html_parser.set_backend('html.parser')
+        try:
+            with ChapterPostProcessor(1) as processor:
+                self.assertEqual(processor.submit(parse_with_backend, "").result(), ('html.parser', ""))
+        finally:
+            html_parser.set_backend(default)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import unittest
+
+from fetch.readiness import PageReadiness, WaitStats
+
+class FakePage:
+    """Stand-in for a ChromiumPage whose URL changes and whose element appears after a delay."""
+
+    def __init__(self, delay):
+        self.ready_at = time.perf_counter() + delay
+        self.resources = 0
+
+    @property
+    def url(self):
+        return "https://genesistudio.com/viewer/1" if time.perf_counter() >= self.ready_at else "https://www.novelupdates.com/extnu/1/"
+
+    def ele(self, locator, timeout=None):
+        deadline = time.perf_counter() + (timeout or 0)
+        while time.perf_counter() < min(self.ready_at, deadline):
+            time.sleep(0.01)
+        return time.perf_counter() >= self.ready_at
+
+    def run_js(self, script):
+        if time.perf_counter() < self.ready_at:
+            self.resources += 1
+        return self.resources
+
+class TestPageReadiness(unittest.TestCase):
+    def setUp(self):
+        self.stats = WaitStats()
+
+    def test_waits_return_when_ready(self):
+        readiness = PageReadiness(FakePage(0.3), site='genesistudio', stats=self.stats)
+        start = time.perf_counter()
+        self.assertTrue(readiness.url_contains('genesistudio.com', timeout=5))
+        self.assertTrue(readiness.element('.break-words', timeout=5))
+        self.assertLess(time.perf_counter() - start, 1.5)
+
+        summary = self.stats.summary()
+        url_wait = summary[('genesistudio', 'url genesistudio.com')]
+        self.assertEqual((url_wait['count'], url_wait['timeouts']), (1, 0))
+        self.assertGreaterEqual(url_wait['max'], 0.25)
+
+    def test_timeouts_are_recorded(self):
+        readiness = PageReadiness(FakePage(10), stats=self.stats)
+        self.assertFalse(readiness.url_contains('genesistudio.com', timeout=0.2))
+        self.assertFalse(readiness.element('.break-words', timeout=0.2))
+
+        summary = self.stats.summary()
+        self.assertEqual(summary[('www.novelupdates.com', 'url genesistudio.com')]['timeouts'], 1)
+        self.assertEqual(summary[('www.novelupdates.com', 'element .break-words')]['timeouts'], 1)
+
+    def test_network_idle(self):
+        readiness = PageReadiness(FakePage(0.3), site='test', stats=self.stats)
+        start = time.perf_counter()
+        self.assertTrue(readiness.network_idle(idle_time=0.2, timeout=5))
+        self.assertGreaterEqual(time.perf_counter() - start, 0.3)
+
+if __name__ == '__main__':
+    unittest.main()
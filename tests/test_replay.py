@@ -0,0 +1,103 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from fetch.http_session import HttpSession, is_challenge_response
+from replay.archive import Archive
+from replay.server import StandInServer
+
+class OriginHandler(BaseHTTPRequestHandler):
+    """The real site, which is only reachable while recording."""
+
+    def do_GET(self):
+        if self.path.startswith('/extnu/'):
+            self.send_response(302)
+            self.send_header('Location', '/chapter-1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = f"<html><body>{self.path}</body></html>".encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Set-Cookie', 'a=1; Path=/')
+        self.send_header('Set-Cookie', 'b=2; Path=/')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestStandIn(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive_path = os.path.join(self.directory, 'run.db')
+        self.cert_dir = os.path.join(self.directory, 'certs')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def stand_in(self, **options):
+        stand_in = StandInServer(self.archive_path, cert_dir=self.cert_dir, **options).start()
+        self.addCleanup(stand_in.stop)
+        return stand_in
+
+    def test_record_then_replay_offline(self):
+        origin = ThreadingHTTPServer(('127.0.0.1', 0), OriginHandler)
+        threading.Thread(target=origin.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{origin.server_port}"
+
+        recorder = StandInServer(self.archive_path, record=True, cert_dir=self.cert_dir).start()
+        proxies = {'http': recorder.proxy_url}
+        self.assertEqual(requests.get(f"{base}/extnu/1/", proxies=proxies).text, "<html><body>/chapter-1</body></html>")
+        recorder.stop()
+        origin.shutdown()
+        origin.server_close()
+
+        archive = Archive(self.archive_path)
+        status, headers, _, challenge = archive.lookup('GET', f"{base}/extnu/1/")
+        self.assertEqual((status, challenge), (302, False))
+        self.assertEqual(archive.lookup('GET', f"{base}/chapter-1?nocache=1")[0], 200)
+        archive.close()
+
+        # The origin is gone, the redirect and the page still come back, cookies included
+        stand_in = self.stand_in()
+        response = requests.get(f"{base}/extnu/1/", proxies={'http': stand_in.proxy_url})
+        self.assertEqual(response.text, "<html><body>/chapter-1</body></html>")
+        self.assertEqual(response.history[0].status_code, 302)
+        self.assertEqual(response.cookies.get('b'), '2')
+        self.assertEqual(requests.get(f"{base}/unknown", proxies={'http': stand_in.proxy_url}).status_code, 404)
+        self.assertEqual(stand_in.summary()['misses'], 1)
+
+    def test_challenge_injection(self):
+        archive = Archive(self.archive_path)
+        archive.record('GET', 'https://novel.test/chapter-1', None, 200, [('Content-Type', 'text/html')],
+                       b'<html><body>Chapter 1</body></html>')
+        archive.close()
+        stand_in = self.stand_in(challenge_rate=1.0)
+        # HTTPS goes through the intercepting tunnel, as the browser and the HTTP fast path do
+        session = HttpSession(proxy=stand_in.proxy_url)
+        self.addCleanup(session.close)
+
+        url = 'https://novel.test/chapter-1'
+        response = session.session.get(url, headers={'Accept': 'text/html'})
+        self.assertTrue(is_challenge_response(response.status_code, response.headers, response.text))
+        self.assertIn('cf_clearance=stand-in-', response.text)
+
+        # The stand-in challenge clears the way a solved one does, with a fresh clearance cookie
+        session.session.cookies.set('cf_clearance', f"stand-in-{int(time.time())}", domain='novel.test')
+        response = session.session.get(url, headers={'Accept': 'text/html'})
+        self.assertEqual(response.text, '<html><body>Chapter 1</body></html>')
+        self.assertEqual(stand_in.summary()['challenges_injected'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import unittest
+
+from fetch.tab_pool import TabPool
+
+class TestTabPool(unittest.TestCase):
+    """Test case for handing out work to the tab pool."""
+
+    def test_results_in_order(self):
+        with TabPool(page=None, cf_bypasser=None) as pool:
+            self.assertEqual(list(pool.map(lambda slot, item: item * 2, range(10))), [i * 2 for i in range(10)])
+
+    def test_work_is_fed_lazily(self):
+        started = []
+        lock = threading.Lock()
+
+        def fetch(slot, item):
+            with lock:
+                started.append(item)
+            if item == 2:
+                raise RuntimeError("paywall")
+            return item
+
+        with TabPool(page=None, cf_bypasser=None) as pool:
+            results = pool.map(fetch, range(100))
+            self.assertEqual(next(results), 0)
+            self.assertEqual(next(results), 1)
+            with self.assertRaises(RuntimeError):
+                next(results)
+        # Only the window ahead of the failed chapter was handed out
+        self.assertLessEqual(len(started), 2 + TabPool.PREFETCH_PER_TAB)
+
+if __name__ == '__main__':
+    unittest.main()
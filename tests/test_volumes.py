@@ -0,0 +1,62 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import unittest
+import zipfile
+
+from cache.novel_cache import NovelCache
+from conftest import NOVEL_INFO
+from export.volumes import build_volumes, plan_volumes, volume_file_name
+
+LONG_NOVEL_INFO = dict(NOVEL_INFO, title="Long Novel")
+
+class TestVolumes(unittest.TestCase):
+    def test_plan_by_chapters_and_bytes(self):
+        self.assertEqual(plan_volumes(7, {}, max_chapters=3), [(0, 3), (3, 6), (6, 7)])
+        sizes = {0: 400, 1: 400, 2: 1500, 3: 100, 4: 100}
+        # A chapter larger than the budget gets a volume of its own
+        self.assertEqual(plan_volumes(5, sizes, max_bytes=1000), [(0, 2), (2, 3), (3, 5)])
+        self.assertEqual(plan_volumes(5, sizes, max_chapters=1, max_bytes=10 ** 6), [(i, i + 1) for i in range(5)])
+        self.assertEqual(plan_volumes(0, {}, max_chapters=3), [])
+
+    def test_file_names_sort_in_reading_order(self):
+        self.assertEqual(volume_file_name("A: B", 3, 12, 200, 300), "A_ B - Volume 03 - Chapters 201-300.epub")
+        self.assertEqual(volume_file_name("A", 7, 150, 0, 10), "A - Volume 007 - Chapters 1-10.epub")
+
+    def test_build_volumes_in_parallel(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = NovelCache(LONG_NOVEL_INFO['title'], cache_dir=tmp_dir)
+            cache.cache_chapters([(f"https://a.test/{i}", i, f"Chapter {i + 1}", f"<p>Text {i}</p>")
+                                  for i in range(5) if i != 3])
+            volumes = plan_volumes(5, cache.chapter_sizes(), max_chapters=2)
+            jobs = [{
+                'title': cache.title, 'cache_dir': tmp_dir, 'series_id': None, 'novel_info': LONG_NOVEL_INFO,
+                'volume_title': f"Long Novel - Volume {number}",
+                'path': os.path.join(tmp_dir, volume_file_name("Long Novel", number, len(volumes), start, end)),
+                'start': start, 'end': end,
+                'placeholders': {3: ("Chapter 4 (missing)", "<p>Missing</p>")} if start <= 3 < end else {},
+                'cover': (b"\xff\xd8fake jpeg", 'cover.jpg', 'image/jpeg'), 'image_workers': 0,
+                'image_size': None, 'image_quality': 85, 'image_budget': None, 'http_state': None,
+            } for number, (start, end) in enumerate(volumes, start=1)]
+            cache.close()
+
+            results = sorted(build_volumes(jobs, workers=2))
+            self.assertEqual([(os.path.basename(path), chapters) for path, chapters, _ in results], [
+                ("Long Novel - Volume 01 - Chapters 1-2.epub", 2),
+                ("Long Novel - Volume 02 - Chapters 3-4.epub", 2),
+                ("Long Novel - Volume 03 - Chapters 5-5.epub", 1),
+            ])
+
+            # Every volume has its own TOC, with only its chapters
+            with zipfile.ZipFile(results[1][0]) as epub_zip:
+                ncx = epub_zip.read("EPUB/toc.ncx").decode('utf-8')
+                self.assertIn("Long Novel - Volume 2", ncx)
+                self.assertIn("Chapter 3", ncx)
+                self.assertIn("Chapter 4 (missing)", ncx)
+                self.assertNotIn("Chapter 5", ncx)
+                self.assertIn("EPUB/cover.jpg", epub_zip.namelist())
+
+if __name__ == '__main__':
+    unittest.main()
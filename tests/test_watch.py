@@ -0,0 +1,74 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import unittest
+
+from batch.watch import Watcher, next_interval
+from cache.watch_state import WatchState
+
+HOUR = 3600
+
+class TestNextInterval(unittest.TestCase):
+    def test_backs_off_while_dormant(self):
+        interval, mean_gap = next_interval(HOUR, False, 0, None, None, 900, 24 * HOUR)
+        self.assertEqual((interval, mean_gap), (1.5 * HOUR, None))
+        interval, _ = next_interval(20 * HOUR, False, 0, None, None, 900, 24 * HOUR)
+        self.assertEqual(interval, 24 * HOUR)
+
+    def test_follows_release_gap(self):
+        # A release 8 hours after the previous one polls a few times per expected gap
+        interval, mean_gap = next_interval(24 * HOUR, True, 8 * HOUR, 1, None, 900, 24 * HOUR)
+        self.assertAlmostEqual(mean_gap, 8 * HOUR - 1)
+        self.assertAlmostEqual(interval, (8 * HOUR - 1) / 4)
+        interval, _ = next_interval(HOUR, True, 100, 90, None, 900, 24 * HOUR)
+        self.assertEqual(interval, 900)
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.state = WatchState(self.directory.name)
+        self.now = 0
+        self.checks = []
+        self.releases = {'https://nu/a': [3], 'https://nu/b': []}
+
+        def check_job(job, slot):
+            url = job['novelupdates_url']
+            self.checks.append((self.now, url))
+            count = 1 + sum(1 for release in self.releases[url] if release <= self.now / HOUR)
+            return {'changed': count != self.state.get(url).get('chapter_count'), 'chapter_count': count}
+
+        jobs = [{'site': 'Genesistudio', 'name': url, 'novelupdates_url': url} for url in self.releases]
+        self.watcher = Watcher(jobs, check_job, ['tab'], self.state, min_interval=HOUR, max_interval=12 * HOUR,
+                               clock=lambda: self.now, sleep=self.advance)
+
+    def tearDown(self):
+        self.state.close()
+        self.directory.cleanup()
+
+    def advance(self, delay):
+        self.now += delay
+
+    def test_only_due_novels_are_checked(self):
+        self.watcher.run(cycles=8)
+        checks_a = [now for now, url in self.checks if url == 'https://nu/a']
+        checks_b = [now for now, url in self.checks if url == 'https://nu/b']
+        # The dormant novel is polled less and less often
+        gaps_b = [later - earlier for earlier, later in zip(checks_b, checks_b[1:])]
+        self.assertEqual(gaps_b, sorted(gaps_b))
+        self.assertGreater(gaps_b[-1], gaps_b[0])
+        # The release is noticed and recorded
+        state = self.state.get('https://nu/a')
+        self.assertEqual(state['chapter_count'], 2)
+        self.assertIsNotNone(state['last_changed'])
+        self.assertEqual(len(checks_a) + len(checks_b), len(self.checks))
+
+    def test_failed_check_keeps_state(self):
+        self.watcher.check_job = lambda job, slot: 1 / 0
+        self.watcher.run_once()
+        state = self.state.get('https://nu/a')
+        self.assertEqual((state['next_check'], state['chapter_count']), (HOUR, None))
+
+if __name__ == '__main__':
+    unittest.main()